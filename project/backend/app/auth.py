@@ -8,19 +8,28 @@ from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy.orm import Session
+import logging
 import os
+import time
 from dotenv import load_dotenv
 
 from . import models, schemas
-from .database import get_db
+from .database import SessionLocal, get_db
+from .metrics import observe_password_hash
+from .tasks import task_queue
 
 # 加载环境变量
 load_dotenv()
 
+logger = logging.getLogger("app.auth")
+
 # JWT配置
 SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key-change-this-in-production")
 ALGORITHM = os.getenv("ALGORITHM", "HS256")
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "30"))
+# 事件流票据有效期(秒): 只用于建立SSE连接,放在URL中也不会泄露长期有效的访问令牌
+EVENT_TICKET_EXPIRE_SECONDS = int(os.getenv("EVENT_TICKET_EXPIRE_SECONDS", "60"))
+EVENT_TICKET_SCOPE = "events"
 
 # 密码加密上下文 - 使用Argon2id (最新最安全的密码哈希算法)
 # 支持从bcrypt自动迁移
@@ -43,12 +52,15 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
     支持Argon2、bcrypt和明文(测试数据兼容)
     用户下次登录时会自动从bcrypt升级到Argon2
     """
+    started = time.perf_counter()
     try:
         # passlib会自动识别哈希类型并验证
         return pwd_context.verify(plain_password, hashed_password)
     except Exception:
         # 如果验证失败,尝试明文比较(仅用于测试环境的旧数据)
         return plain_password == hashed_password
+    finally:
+        observe_password_hash("verify", time.perf_counter() - started)
 
 
 def get_password_hash(password: str) -> str:
@@ -60,22 +72,42 @@ def get_password_hash(password: str) -> str:
     - 内存密集型设计
     - 2015年密码哈希竞赛冠军
     """
-    return pwd_context.hash(password)
+    started = time.perf_counter()
+    try:
+        return pwd_context.hash(password)
+    finally:
+        observe_password_hash("hash", time.perf_counter() - started)
 
 
-def authenticate_student(db: Session, student_id: str, password: str) -> Optional[models.Student]:
+@task_queue.task("upgrade_password_hash", durable=False, max_retries=2)
+def upgrade_password_hash(user_type: str, username: str, password: str, old_hash: str) -> None:
     """
-    验证学生身份并自动升级密码哈希
-    如果用户使用的是bcrypt或明文密码,验证成功后会自动升级到Argon2
+    后台把bcrypt或明文密码升级为Argon2
+    按旧哈希条件更新: 期间密码已被修改时放弃升级
+    参数含明文密码,注册为非持久任务
     """
-    student = db.query(models.Student).filter(models.Student.student_id == student_id).first()
-    if not student:
-        return None
-    if not verify_password(password, student.password):
-        return None
+    if user_type == "student":
+        model, key, label = models.Student, models.Student.student_id, "学生"
+    else:
+        model, key, label = models.Administrator, models.Administrator.username, "管理员"
     
-    # 检查是否需要升级密码哈希(从bcrypt或明文升级到Argon2)
-    current_hash = str(student.password)
+    new_hash = get_password_hash(password)
+    db = SessionLocal()
+    try:
+        updated = db.query(model).filter(key == username, model.password == old_hash).update(
+            {model.password: new_hash}, synchronize_session=False
+        )
+        db.commit()
+    finally:
+        db.close()
+    
+    if updated:
+        old_format = "明文" if not old_hash.startswith("$") else "bcrypt"
+        logger.info("%s %s 的密码已自动从%s升级到Argon2", label, username, old_format)
+
+
+def _schedule_password_upgrade(user_type: str, username: str, password: str, current_hash: str) -> None:
+    """检查是否需要升级密码哈希(从bcrypt或明文升级到Argon2),需要时交给后台任务,不占用登录请求的时间"""
     try:
         needs_upgrade = pwd_context.needs_update(current_hash)
     except Exception:
@@ -83,11 +115,24 @@ def authenticate_student(db: Session, student_id: str, password: str) -> Optiona
         needs_upgrade = True
     
     if needs_upgrade:
-        old_format = "明文" if not current_hash.startswith("$") else "bcrypt"
-        student.password = get_password_hash(password)
-        db.commit()
-        print(f"✅ 学生 {student_id} 的密码已自动从{old_format}升级到Argon2")
+        task_queue.enqueue(
+            "upgrade_password_hash",
+            user_type=user_type, username=username, password=password, old_hash=current_hash
+        )
+
+
+def authenticate_student(db: Session, student_id: str, password: str) -> Optional[models.Student]:
+    """
+    验证学生身份并自动升级密码哈希
+    如果用户使用的是bcrypt或明文密码,验证成功后在后台升级到Argon2
+    """
+    student = db.query(models.Student).filter(models.Student.student_id == student_id).first()
+    if not student:
+        return None
+    if not verify_password(password, student.password):
+        return None
     
+    _schedule_password_upgrade("student", student.student_id, password, str(student.password))
     return student
 
 
@@ -104,20 +149,27 @@ def authenticate_admin(db: Session, username: str, password: str) -> Optional[mo
     if not verify_password(password, admin.password):
         return None
     
-    # 如果密码需要更新(从bcrypt/明文升级到Argon2),自动升级
-    current_hash = str(admin.password)
+    # 如果密码需要更新(从bcrypt/明文升级到Argon2),在后台自动升级
+    _schedule_password_upgrade("admin", admin.username, password, str(admin.password))
+    return admin
+
+
+@task_queue.task("record_admin_login")
+def record_admin_login(admin_id: int, at: str) -> None:
+    """
+    记录管理员最后登录时间(持久任务,参数为ISO格式时间)
+    只向后更新,任务重复执行或乱序执行时结果不变
+    """
+    login_at = datetime.fromisoformat(at)
+    db = SessionLocal()
     try:
-        needs_upgrade = pwd_context.needs_update(current_hash)
-    except Exception:
-        needs_upgrade = True
-    
-    if needs_upgrade:
-        old_format = "明文" if not current_hash.startswith("$") else "bcrypt"
-        admin.password = get_password_hash(password)
+        db.query(models.Administrator).filter(
+            models.Administrator.admin_id == admin_id,
+            (models.Administrator.last_login == None) | (models.Administrator.last_login < login_at)
+        ).update({models.Administrator.last_login: login_at}, synchronize_session=False)
         db.commit()
-        print(f"✅ 管理员 {username} 的密码已自动从{old_format}升级到Argon2")
-    
-    return admin
+    finally:
+        db.close()
 
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
@@ -144,7 +196,8 @@ def decode_token(token: str) -> schemas.TokenData:
         username: str = payload.get("sub")
         user_type: str = payload.get("user_type")
         
-        if username is None or user_type is None:
+        # 带scope的票据只能用于对应的用途,不能当作访问令牌
+        if username is None or user_type is None or payload.get("scope") is not None:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="无效的认证凭据",
@@ -160,6 +213,33 @@ def decode_token(token: str) -> schemas.TokenData:
         )
 
 
+def create_event_ticket(student_id: str) -> str:
+    """
+    为学生创建事件流票据(短期有效,只能用于订阅状态推送)
+    """
+    return create_access_token(
+        data={"sub": student_id, "user_type": "student", "scope": EVENT_TICKET_SCOPE},
+        expires_delta=timedelta(seconds=EVENT_TICKET_EXPIRE_SECONDS)
+    )
+
+
+def decode_event_ticket(ticket: str) -> str:
+    """
+    校验事件流票据,返回学号
+    """
+    try:
+        payload = jwt.decode(ticket, SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError:
+        payload = {}
+    student_id = payload.get("sub")
+    if student_id is None or payload.get("user_type") != "student" or payload.get("scope") != EVENT_TICKET_SCOPE:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="无效或已过期的事件流票据"
+        )
+    return student_id
+
+
 def get_current_user(
     token: str = Depends(oauth2_scheme),
     db: Session = Depends(get_db)
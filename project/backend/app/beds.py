@@ -0,0 +1,281 @@
+"""
+床位计数模块
+统一维护宿舍已占用床位数以及按(楼栋, 性别)汇总的入住计数
+所有床位变化都应通过本模块完成,保证汇总表与宿舍表在同一事务内更新
+
+加锁顺序约定(所有写事务一致,避免死锁):
+    调换申请 -> 学生 -> 宿舍(按dorm_id升序) -> 入住汇总(按楼栋、性别升序)
+单间宿舍的床位变化使用条件UPDATE,"检查是否有空位"与"占用床位"在同一条语句中完成,
+并发请求不会超额分配,也不需要在应用层重试
+"""
+from collections import defaultdict
+from typing import Dict, List, Optional
+
+from sqlalchemy import bindparam, func, inspect, select, update, delete
+from sqlalchemy.orm import Session, identity_key
+from sqlalchemy.orm.attributes import set_committed_value
+
+from . import models
+from .vacancy import schedule_update
+
+
+class BedUnavailableError(ValueError):
+    """目标宿舍没有空床位"""
+
+    def __init__(self, dorm_id: int):
+        super().__init__("目标宿舍已满")
+        self.dorm_id = dorm_id
+
+
+def _sync_session_dorms(db: Session, rows) -> None:
+    """把条件更新后的床位数写回会话中已加载的宿舍实例(不标记为脏),提交后同步空床位索引"""
+    for row in rows:
+        dorm = db.identity_map.get(identity_key(models.Dormitory, row.dorm_id))
+        if dorm is not None:
+            set_committed_value(dorm, "occupied_beds", row.occupied_beds)
+        schedule_update(db, row)
+
+
+def adjust_beds(db: Session, deltas: Dict[int, int]) -> None:
+    """
+    原子地调整多间宿舍的已占用床位数
+    每间宿舍一条条件UPDATE:
+        增加: SET occupied_beds = occupied_beds + n WHERE dorm_id = ? AND occupied_beds + n <= total_beds
+        减少: SET occupied_beds = occupied_beds - n WHERE dorm_id = ? AND occupied_beds >= n
+    校验和修改在同一条语句内完成,无需先读后写;语句按dorm_id顺序执行,
+    汇总表按(楼栋, 性别)顺序更新,与其他事务的加锁顺序一致,不会互相死锁
+    增加失败(已住满)时抛出BedUnavailableError,调用方应回滚事务;减少时床位数不足则忽略
+    调用方负责提交事务
+    """
+    deltas = {dorm_id: delta for dorm_id, delta in deltas.items() if delta}
+    if not deltas:
+        return
+
+    dorm_table = models.Dormitory.__table__
+    changed = {}
+    for dorm_id in sorted(deltas):
+        delta = deltas[dorm_id]
+        condition = (
+            dorm_table.c.occupied_beds + delta <= dorm_table.c.total_beds
+            if delta > 0 else dorm_table.c.occupied_beds >= -delta
+        )
+        rowcount = db.execute(
+            update(dorm_table)
+            .where(dorm_table.c.dorm_id == dorm_id, condition)
+            .values(occupied_beds=dorm_table.c.occupied_beds + delta)
+        ).rowcount
+        if rowcount:
+            changed[dorm_id] = delta
+        elif delta > 0:
+            raise BedUnavailableError(dorm_id)
+    if not changed:
+        return
+
+    # 本事务已持有这些行的行锁,读到的是更新后的值
+    rows = db.execute(
+        select(
+            dorm_table.c.dorm_id,
+            dorm_table.c.building_no,
+            dorm_table.c.gender_type,
+            dorm_table.c.occupied_beds,
+            dorm_table.c.total_beds
+        ).where(dorm_table.c.dorm_id.in_(list(changed)))
+    ).all()
+    summary_deltas = defaultdict(int)
+    for row in rows:
+        summary_deltas[(row.building_no, row.gender_type)] += changed[row.dorm_id]
+    _update_summary(db, summary_deltas)
+    _sync_session_dorms(db, rows)
+
+
+def change_occupied_beds(db: Session, dorm: models.Dormitory, delta: int) -> None:
+    """
+    调整宿舍已占用床位数,并在同一事务内同步更新入住汇总表和空床位索引
+    调用方负责提交事务
+    """
+    adjust_beds(db, {dorm.dorm_id: delta})
+
+
+def occupy_bed(db: Session, dorm: models.Dormitory) -> None:
+    """占用宿舍的一个床位,宿舍已满时抛出BedUnavailableError"""
+    change_occupied_beds(db, dorm, 1)
+
+
+def release_bed(db: Session, dorm: models.Dormitory) -> None:
+    """释放宿舍的一个床位(已占用床位为0时忽略)"""
+    change_occupied_beds(db, dorm, -1)
+
+
+def move_student(db: Session, student: models.Student, new_dorm_id: Optional[int], gender: Optional[str] = None) -> None:
+    """
+    把学生从当前宿舍移到new_dorm_id(None表示退宿),原宿舍释放床位、新宿舍占用床位
+    调用方应已对学生行加锁(SELECT ... FOR UPDATE);gender为学生更新后的性别,默认取学生当前性别
+    宿舍不变但性别改变时,同样校验当前宿舍的性别类型
+    目标宿舍不存在或性别不匹配时抛出ValueError,已满时抛出BedUnavailableError
+    调用方负责提交事务,失败时回滚
+    """
+    old_dorm_id = student.dorm_id
+    gender = gender or student.gender
+    if new_dorm_id == old_dorm_id and gender == student.gender:
+        return
+
+    if new_dorm_id is not None:
+        target_gender = db.scalar(
+            select(models.Dormitory.gender_type).where(models.Dormitory.dorm_id == new_dorm_id)
+        )
+        if target_gender is None:
+            raise ValueError("目标宿舍不存在")
+        if target_gender != gender:
+            raise ValueError(f"目标宿舍性别类型({target_gender})与学生性别({gender})不匹配")
+    if new_dorm_id == old_dorm_id:
+        return
+
+    deltas: Dict[int, int] = defaultdict(int)
+    if old_dorm_id is not None:
+        deltas[old_dorm_id] -= 1
+    if new_dorm_id is not None:
+        deltas[new_dorm_id] += 1
+    adjust_beds(db, deltas)
+    student.dorm_id = new_dorm_id
+
+
+def _update_summary(db: Session, summary_deltas: Dict[tuple, int]) -> None:
+    """按(楼栋, 性别)顺序更新入住汇总表"""
+    summary_params = [
+        {"b_building_no": building_no, "b_gender_type": gender_type, "b_delta": delta}
+        for (building_no, gender_type), delta in sorted(summary_deltas.items())
+        if delta
+    ]
+    if summary_params:
+        occupancy_table = models.DormitoryOccupancy.__table__
+        db.execute(
+            update(occupancy_table)
+            .where(
+                occupancy_table.c.building_no == bindparam("b_building_no"),
+                occupancy_table.c.gender_type == bindparam("b_gender_type")
+            )
+            .values(occupied_beds=occupancy_table.c.occupied_beds + bindparam("b_delta")),
+            summary_params
+        )
+
+
+def apply_bed_deltas(db: Session, dorms: Dict[int, object], deltas: Dict[int, int]) -> None:
+    """
+    批量应用多间宿舍的床位变化,用于批量分配、批量审批等场景
+    dorms为 {dorm_id: 宿舍对象},宿舍对象可以是ORM实例,也可以是带有
+    dorm_id/building_no/gender_type/total_beds/occupied_beds属性的普通对象
+    宿舍表和汇总表各用一条executemany语句更新(按主键顺序),调用方负责按dorm_id顺序加锁和提交事务
+    """
+    deltas = {dorm_id: delta for dorm_id, delta in deltas.items() if delta}
+    if not deltas:
+        return
+
+    dorm_table = models.Dormitory.__table__
+    db.execute(
+        update(dorm_table)
+        .where(dorm_table.c.dorm_id == bindparam("b_dorm_id"))
+        .values(occupied_beds=dorm_table.c.occupied_beds + bindparam("b_delta")),
+        [{"b_dorm_id": dorm_id, "b_delta": delta} for dorm_id, delta in sorted(deltas.items())]
+    )
+
+    summary_deltas = defaultdict(int)
+    for dorm_id, delta in deltas.items():
+        dorm = dorms[dorm_id]
+        summary_deltas[(dorm.building_no, dorm.gender_type)] += delta
+
+    _update_summary(db, summary_deltas)
+
+    # 同步内存中的宿舍对象(ORM实例不标记为脏,避免重复写入),空床位索引在提交后同步
+    for dorm_id, delta in deltas.items():
+        dorm = dorms[dorm_id]
+        new_value = dorm.occupied_beds + delta
+        if inspect(dorm, raiseerr=False) is not None:
+            set_committed_value(dorm, "occupied_beds", new_value)
+        else:
+            dorm.occupied_beds = new_value
+        schedule_update(db, dorm)
+
+
+def get_occupancy(db: Session) -> List[dict]:
+    """
+    读取各楼栋入住汇总
+    只读取汇总表,复杂度与楼栋数成正比,不扫描宿舍表
+    """
+    rows = db.query(models.DormitoryOccupancy).order_by(
+        models.DormitoryOccupancy.building_no,
+        models.DormitoryOccupancy.gender_type
+    ).all()
+
+    return [
+        {
+            "building_no": row.building_no,
+            "gender_type": row.gender_type,
+            "total_rooms": row.total_rooms,
+            "total_beds": row.total_beds,
+            "occupied_beds": row.occupied_beds,
+            "available_beds": row.total_beds - row.occupied_beds,
+            "occupancy_rate": round(row.occupied_beds / row.total_beds * 100, 2) if row.total_beds else 0.0
+        }
+        for row in rows
+    ]
+
+
+def reconcile_occupancy(db: Session, repair: bool = True) -> List[dict]:
+    """
+    一致性校验: 将入住汇总表与宿舍表的实际聚合结果逐项比对
+    repair为True时按宿舍表修正汇总表(插入缺失项、删除多余项)并提交
+    返回不一致项列表
+    """
+    dorm = models.Dormitory
+    occupancy = models.DormitoryOccupancy
+
+    actual = {
+        (row.building_no, row.gender_type): row
+        for row in db.execute(
+            select(
+                dorm.building_no,
+                dorm.gender_type,
+                func.count(dorm.dorm_id).label("total_rooms"),
+                func.sum(dorm.total_beds).label("total_beds"),
+                func.sum(dorm.occupied_beds).label("occupied_beds")
+            ).group_by(dorm.building_no, dorm.gender_type)
+        )
+    }
+    recorded = {
+        (row.building_no, row.gender_type): row
+        for row in db.query(occupancy).all()
+    }
+
+    fields = ("total_rooms", "total_beds", "occupied_beds")
+    mismatches = []
+    for key in sorted(set(actual) | set(recorded)):
+        expected_row = actual.get(key)
+        recorded_row = recorded.get(key)
+        expected = {f: int(getattr(expected_row, f)) if expected_row else 0 for f in fields}
+        current = {f: getattr(recorded_row, f) if recorded_row else None for f in fields}
+        if expected != current:
+            mismatches.append({
+                "building_no": key[0],
+                "gender_type": key[1],
+                "expected": expected,
+                "recorded": current
+            })
+
+    if repair and mismatches:
+        for item in mismatches:
+            key = (item["building_no"], item["gender_type"])
+            if key not in actual:
+                db.execute(
+                    delete(occupancy).where(
+                        occupancy.building_no == key[0],
+                        occupancy.gender_type == key[1]
+                    )
+                )
+            elif key not in recorded:
+                db.add(occupancy(building_no=key[0], gender_type=key[1], **item["expected"]))
+            else:
+                for field, value in item["expected"].items():
+                    setattr(recorded[key], field, value)
+        db.commit()
+
+    return mismatches
@@ -0,0 +1,309 @@
+"""
+账单批处理模块
+- 月度账单生成: 按月为全部(或筛选后的)宿舍生成账单,每种账单类型一条
+  INSERT ... SELECT 语句,在一个事务内完成;同一 (宿舍, 账单月份, 账单类型)
+  只会生成一张账单(唯一键 uk_dorm_month_type),重复执行只补齐缺少的账单
+- 逾期账单扫描: 后台定时把已过截止日期的未支付账单标记为逾期,
+  沿 (status, due_date) 索引分块UPDATE,每块单独提交,避免长时间持有行锁
+
+命令行用法:
+    python -m app.billing 2024-12 --rate 电费=50 --rate 水费=30 --rate 住宿费=120/bed
+    python -m app.billing 2024-12 --rate 电费=50 --building MA --building MB --dry-run
+    python -m app.billing --sweep-overdue
+"""
+import argparse
+import asyncio
+import logging
+import os
+import re
+import threading
+import time
+from datetime import date, datetime
+from decimal import Decimal
+from typing import List, Optional
+
+from sqlalchemy import Date, Numeric, String, exists, func, insert, literal, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from . import models, schemas
+
+BILLING_MONTH_PATTERN = re.compile(r"^\d{4}-(0[1-9]|1[0-2])$")
+
+# 逾期扫描间隔(秒),0表示不启动后台扫描
+OVERDUE_SWEEP_INTERVAL = int(os.getenv("OVERDUE_SWEEP_INTERVAL", "3600"))
+# 每块最多更新的账单数
+OVERDUE_CHUNK_SIZE = int(os.getenv("OVERDUE_CHUNK_SIZE", "500"))
+
+logger = logging.getLogger("app.billing")
+
+
+def default_due_date(billing_month: str) -> date:
+    """默认截止日期为账单月份的下个月1日(与现有账单数据一致)"""
+    year, month = (int(part) for part in billing_month.split("-"))
+    return date(year + month // 12, month % 12 + 1, 1)
+
+
+def _eligible_dorms(buildings: Optional[List[str]], include_empty: bool):
+    dorm = models.Dormitory
+    conditions = []
+    if buildings:
+        conditions.append(dorm.building_no.in_(buildings))
+    if not include_empty:
+        conditions.append(dorm.occupied_beds > 0)
+    return conditions
+
+
+def _missing_bill_select(rate: schemas.BillingRate, billing_month: str, due_date: date, conditions: list):
+    """选出尚未生成该类型账单的宿舍,并计算金额"""
+    dorm = models.Dormitory
+    bill = models.Bill
+    amount = literal(rate.amount, Numeric(10, 2))
+    if rate.per_bed:
+        amount = amount * dorm.occupied_beds
+
+    already_billed = exists().where(
+        bill.dorm_id == dorm.dorm_id,
+        bill.billing_month == billing_month,
+        bill.bill_type == rate.bill_type
+    )
+    return select(
+        dorm.dorm_id,
+        literal(rate.bill_type, String(50)).label("bill_type"),
+        amount.label("amount"),
+        literal(billing_month, String(7)).label("billing_month"),
+        literal(due_date, Date).label("due_date"),
+        literal("unpaid", String(20)).label("status")
+    ).where(*conditions, ~already_billed)
+
+
+def run_billing(db: Session, run: schemas.BillingRunRequest) -> dict:
+    """
+    生成一个月的账单
+    返回每种账单类型新生成的数量、已存在而跳过的数量和金额合计
+    dry_run为True时只统计,不写入
+    """
+    if not BILLING_MONTH_PATTERN.match(run.billing_month):
+        raise ValueError("账单月份格式必须是YYYY-MM")
+    bill_types = [rate.bill_type for rate in run.rates]
+    if len(set(bill_types)) != len(bill_types):
+        raise ValueError("计费标准中的账单类型不能重复")
+
+    started = time.perf_counter()
+    due_date = run.due_date or default_due_date(run.billing_month)
+    conditions = _eligible_dorms(run.buildings, run.include_empty)
+    eligible = db.scalar(select(func.count()).select_from(models.Dormitory).where(*conditions))
+
+    bill_table = models.Bill.__table__
+    columns = ["dorm_id", "bill_type", "amount", "billing_month", "due_date", "status"]
+    results = []
+    try:
+        for rate in run.rates:
+            missing = _missing_bill_select(rate, run.billing_month, due_date, conditions).subquery()
+            created, total_amount = db.execute(
+                select(func.count(), func.coalesce(func.sum(missing.c.amount), 0)).select_from(missing)
+            ).one()
+            if created and not run.dry_run:
+                result = db.execute(
+                    insert(bill_table).from_select(
+                        columns,
+                        _missing_bill_select(rate, run.billing_month, due_date, conditions)
+                    )
+                )
+                created = result.rowcount
+            results.append({
+                "bill_type": rate.bill_type,
+                "created": created,
+                "skipped": eligible - created,
+                "total_amount": float(total_amount)
+            })
+
+        if run.dry_run:
+            db.rollback()
+        else:
+            db.commit()
+    except IntegrityError:
+        db.rollback()
+        raise ValueError(f"{run.billing_month} 的账单正在由其他任务生成,请稍后重试")
+
+    elapsed = time.perf_counter() - started
+    return {
+        "billing_month": run.billing_month,
+        "due_date": due_date.isoformat(),
+        "dry_run": run.dry_run,
+        "eligible_dorms": eligible,
+        "created": sum(item["created"] for item in results),
+        "by_type": results,
+        "elapsed_seconds": round(elapsed, 3)
+    }
+
+
+# ============================================================================
+# 逾期账单扫描
+# ============================================================================
+
+class SweepStats:
+    """逾期扫描的运行指标"""
+
+    def __init__(self):
+        self.runs = 0
+        self.failures = 0
+        self.total_marked = 0
+        self.last_run_at: Optional[datetime] = None
+        self.last_marked = 0
+        self.last_chunks = 0
+        self.last_duration = 0.0
+        self.last_error: Optional[str] = None
+        self._lock = threading.Lock()
+
+    def record(self, marked: int, chunks: int, duration: float, error: Optional[str] = None) -> None:
+        with self._lock:
+            self.runs += 1
+            self.failures += error is not None
+            self.total_marked += marked
+            self.last_run_at = datetime.now()
+            self.last_marked = marked
+            self.last_chunks = chunks
+            self.last_duration = duration
+            self.last_error = error
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            return {
+                "runs": self.runs,
+                "failures": self.failures,
+                "total_marked": self.total_marked,
+                "last_run_at": self.last_run_at.isoformat() if self.last_run_at else None,
+                "last_marked": self.last_marked,
+                "last_chunks": self.last_chunks,
+                "last_duration_seconds": round(self.last_duration, 3),
+                "last_error": self.last_error,
+                "interval_seconds": OVERDUE_SWEEP_INTERVAL,
+                "chunk_size": OVERDUE_CHUNK_SIZE
+            }
+
+
+sweep_stats = SweepStats()
+
+
+def mark_overdue_bills(db: Session, today: Optional[date] = None, chunk_size: int = OVERDUE_CHUNK_SIZE) -> dict:
+    """
+    将截止日期早于today的未支付账单标记为逾期
+    UPDATE ... WHERE status = 'unpaid' AND due_date < ? LIMIT n 沿(status, due_date)索引范围扫描,
+    每块提交一次,直到没有剩余账单
+    返回 {"marked": 标记数量, "chunks": 块数}
+    """
+    today = today or date.today()
+    bill_table = models.Bill.__table__
+    statement = update(bill_table).where(
+        bill_table.c.status == "unpaid",
+        bill_table.c.due_date < today
+    ).values(status="overdue").with_dialect_options(mysql_limit=chunk_size)
+
+    marked = 0
+    chunks = 0
+    while True:
+        rowcount = db.execute(statement).rowcount
+        db.commit()
+        if rowcount:
+            chunks += 1
+            marked += rowcount
+        if rowcount < chunk_size:
+            break
+    return {"marked": marked, "chunks": chunks}
+
+
+def sweep_overdue_bills() -> dict:
+    """执行一次逾期扫描(使用独立会话),记录指标并在有账单变化时清除统计缓存"""
+    from .cache import invalidate_statistics
+    from .database import SessionLocal
+
+    started = time.perf_counter()
+    db = SessionLocal()
+    try:
+        result = mark_overdue_bills(db)
+    except Exception as e:
+        db.rollback()
+        sweep_stats.record(0, 0, time.perf_counter() - started, error=str(e)[:200])
+        raise
+    finally:
+        db.close()
+
+    sweep_stats.record(result["marked"], result["chunks"], time.perf_counter() - started)
+    if result["marked"]:
+        invalidate_statistics()
+    return result
+
+
+async def run_overdue_sweeper(interval: int = OVERDUE_SWEEP_INTERVAL) -> None:
+    """
+    后台循环: 启动后立即扫描一次,之后每interval秒扫描一次
+    扫描在线程池中执行,不阻塞事件循环;单次失败记录日志和指标,不终止循环
+    """
+    while True:
+        try:
+            await asyncio.to_thread(sweep_overdue_bills)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("逾期账单扫描失败")
+        await asyncio.sleep(interval)
+
+
+def _parse_rate(text: str) -> schemas.BillingRate:
+    """解析 类型=金额 或 类型=金额/bed"""
+    try:
+        bill_type, value = text.split("=", 1)
+        per_bed = value.endswith("/bed")
+        amount = Decimal(value[:-len("/bed")] if per_bed else value)
+    except Exception:
+        raise argparse.ArgumentTypeError(f"计费标准格式错误: {text} (应为 类型=金额 或 类型=金额/bed)")
+    return schemas.BillingRate(bill_type=bill_type.strip(), amount=amount, per_bed=per_bed)
+
+
+def main():
+    from .database import SessionLocal
+
+    parser = argparse.ArgumentParser(description="批量生成月度账单 / 扫描逾期账单")
+    parser.add_argument("billing_month", nargs="?", help="账单月份(YYYY-MM)")
+    parser.add_argument("--rate", type=_parse_rate, action="append",
+                        help="计费标准: 类型=金额 或 类型=金额/bed(按床位计费),可重复")
+    parser.add_argument("--due-date", type=date.fromisoformat, help="截止日期(YYYY-MM-DD),默认下月1日")
+    parser.add_argument("--building", action="append", dest="buildings", help="限定楼栋,可重复")
+    parser.add_argument("--include-empty", action="store_true", help="为无人入住的宿舍也生成账单")
+    parser.add_argument("--dry-run", action="store_true", help="只统计,不写入数据库")
+    parser.add_argument("--sweep-overdue", action="store_true", help="将已过截止日期的未支付账单标记为逾期")
+    args = parser.parse_args()
+
+    if args.sweep_overdue:
+        result = sweep_overdue_bills()
+        print(f"标记逾期账单 {result['marked']} 张, 共 {result['chunks']} 块, "
+              f"耗时 {sweep_stats.last_duration:.3f} 秒")
+        return
+    if not args.billing_month or not args.rate:
+        parser.error("生成账单需要提供账单月份和至少一个--rate")
+
+    run = schemas.BillingRunRequest(
+        billing_month=args.billing_month,
+        due_date=args.due_date,
+        rates=args.rate,
+        buildings=args.buildings,
+        include_empty=args.include_empty,
+        dry_run=args.dry_run
+    )
+    db = SessionLocal()
+    try:
+        report = run_billing(db, run)
+    finally:
+        db.close()
+
+    print(f"{report['billing_month']} 账单{'(试运行)' if report['dry_run'] else ''}, 截止日期 {report['due_date']}")
+    print(f"符合条件的宿舍 {report['eligible_dorms']} 间")
+    for item in report["by_type"]:
+        print(f"  {item['bill_type']}: 新生成 {item['created']} 张, 已存在 {item['skipped']} 张, "
+              f"金额合计 {item['total_amount']:.2f}")
+    print(f"耗时 {report['elapsed_seconds']} 秒")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,370 @@
+"""
+新生批量分配宿舍模块
+整批读入新生名单(xlsx/csv),在内存中按性别、楼栋和学院分组计算宿舍分配,
+再在一个事务内用批量语句写回学生记录和床位计数
+
+命令行用法:
+    python -m app.bulk_assign ../data/students.xlsx [--building MA --building MB] [--no-college-grouping] [--dry-run]
+"""
+import argparse
+import os
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from pydantic import ValidationError
+from sqlalchemy import insert, select
+from sqlalchemy.orm import Session
+
+from . import auth, models, schemas
+from .beds import apply_bed_deltas
+from .spreadsheet import coerce_strings
+
+VALID_GENDERS = ("男", "女")
+VALID_COLLEGES = ("SSE", "SME", "MED", "HSS", "SAI", "SDS", "MUS")
+
+# 名单未提供密码时使用的初始密码
+DEFAULT_PASSWORD = os.getenv("BULK_DEFAULT_PASSWORD", "123456")
+# 并行计算Argon2哈希的线程数(argon2-cffi计算时释放GIL)
+HASH_WORKERS = int(os.getenv("BULK_HASH_WORKERS", str(os.cpu_count() or 4)))
+# 每条INSERT语句写入的学生数
+INSERT_BATCH_SIZE = 1000
+# 报告中最多列出的错误/未分配记录数
+REPORT_LIMIT = 100
+
+
+@dataclass
+class Room:
+    """内存中的宿舍房间"""
+    dorm_id: int
+    building_no: str
+    floor_no: int
+    room_no: str
+    gender_type: str
+    total_beds: int
+    occupied_beds: int
+    planned: int = 0
+    deferred: bool = False
+
+    @property
+    def free_beds(self) -> int:
+        return self.total_beds - self.occupied_beds - self.planned
+
+
+class _RoomPool:
+    """
+    按优先顺序提供有空位的房间
+    完全空置的房间优先,便于同一分组的学生同住;
+    分组结束时剩余床位的房间被推迟到最后再使用
+    """
+
+    def __init__(self, rooms: Iterable[Room]):
+        ordered = sorted(rooms, key=lambda r: (r.occupied_beds > 0, r.building_no, r.floor_no, r.dorm_id))
+        self._rooms = [room for room in ordered if not room.deferred]
+        self._leftovers = [room for room in ordered if room.deferred]
+        self._position = 0
+
+    def defer(self, room: Room) -> None:
+        self._leftovers.append(room)
+
+    def next_room(self) -> Optional[Room]:
+        while self._position < len(self._rooms):
+            room = self._rooms[self._position]
+            if room.free_beds > 0 and not room.deferred:
+                return room
+            self._position += 1
+        while self._leftovers:
+            room = self._leftovers[-1]
+            if room.free_beds > 0:
+                return room
+            self._leftovers.pop()
+        return None
+
+
+def plan_assignments(
+    students: Sequence[schemas.CohortStudent],
+    rooms: Sequence[Room],
+    group_by_college: bool = True
+) -> Tuple[List[Tuple[schemas.CohortStudent, Room]], List[Tuple[schemas.CohortStudent, str]]]:
+    """
+    在内存中计算分配方案
+    约束: 宿舍性别与学生一致; 学生指定楼栋时只分配该楼栋;
+    group_by_college为True时同学院学生连续分配到同一房间
+    返回 (分配结果, 未分配学生及原因)
+    """
+    rooms_by_key: Dict[Tuple[str, Optional[str]], List[Room]] = {}
+    for room in rooms:
+        rooms_by_key.setdefault((room.gender_type, None), []).append(room)
+        rooms_by_key.setdefault((room.gender_type, room.building_no), []).append(room)
+
+    pools: Dict[Tuple[str, Optional[str]], _RoomPool] = {}
+
+    def pool_for(gender: str, building_no: Optional[str]) -> _RoomPool:
+        key = (gender, building_no)
+        if key not in pools:
+            pools[key] = _RoomPool(rooms_by_key.get(key, []))
+        return pools[key]
+
+    def close_group(room: Optional[Room]) -> None:
+        if room is not None and room.free_beds > 0 and not room.deferred:
+            room.deferred = True
+            for key in ((room.gender_type, None), (room.gender_type, room.building_no)):
+                if key in pools:
+                    pools[key].defer(room)
+
+    ordered = sorted(
+        students,
+        key=lambda s: (s.gender, s.building_no or "", s.college.upper() if group_by_college else "", s.student_id)
+    )
+
+    assignments: List[Tuple[schemas.CohortStudent, Room]] = []
+    unassigned: List[Tuple[schemas.CohortStudent, str]] = []
+    current_key = None
+    current_room: Optional[Room] = None
+
+    for student in ordered:
+        group_key = (student.gender, student.building_no, student.college.upper() if group_by_college else None)
+        if group_key != current_key:
+            close_group(current_room)
+            current_key = group_key
+            current_room = None
+
+        if current_room is None or current_room.free_beds <= 0:
+            current_room = pool_for(student.gender, student.building_no).next_room()
+
+        if current_room is None:
+            location = f"{student.building_no}楼" if student.building_no else ""
+            unassigned.append((student, f"{location}没有可用的{student.gender}生床位"))
+            continue
+
+        current_room.planned += 1
+        assignments.append((student, current_room))
+
+    return assignments, unassigned
+
+
+def _validate_records(records: Iterable[dict]) -> Tuple[List[schemas.CohortStudent], List[dict], int, Dict[str, int]]:
+    """校验名单记录,返回 (有效记录, 错误列表, 总行数, 学号 -> 表格行号)"""
+    students: List[schemas.CohortStudent] = []
+    row_numbers: Dict[str, int] = {}
+    errors: List[dict] = []
+    seen_ids = set()
+    seen_emails = set()
+    total = 0
+
+    for row_number, record in enumerate(records, start=2):
+        total += 1
+        data = coerce_strings(record, schemas.CohortStudent)
+        try:
+            student = schemas.CohortStudent(**data)
+        except ValidationError as e:
+            errors.append({"row": row_number, "student_id": data.get("student_id"), "error": str(e.errors()[0]["msg"])})
+            continue
+
+        if student.gender not in VALID_GENDERS:
+            message = "性别必须是'男'或'女'"
+        elif student.college.upper() not in VALID_COLLEGES:
+            message = f"学院代码必须是以下之一: {', '.join(VALID_COLLEGES)}"
+        elif student.student_id in seen_ids:
+            message = "名单内学号重复"
+        elif student.email in seen_emails:
+            message = "名单内邮箱重复"
+        else:
+            message = None
+
+        if message:
+            errors.append({"row": row_number, "student_id": student.student_id, "error": message})
+            continue
+
+        seen_ids.add(student.student_id)
+        seen_emails.add(student.email)
+        row_numbers[student.student_id] = row_number
+        students.append(student)
+
+    return students, errors, total, row_numbers
+
+
+def _find_existing(db: Session, column, values: Sequence[str]) -> set:
+    """分批查询数据库中已存在的学号/邮箱"""
+    existing = set()
+    for start in range(0, len(values), INSERT_BATCH_SIZE):
+        chunk = values[start:start + INSERT_BATCH_SIZE]
+        existing.update(db.execute(select(column).where(column.in_(chunk))).scalars())
+    return existing
+
+
+def _load_rooms(db: Session, genders: Iterable[str], buildings: Optional[Sequence[str]]) -> List[Room]:
+    """
+    读取有空位的宿舍并加行锁(按dorm_id顺序加锁,避免死锁)
+    分配结果写回前其他事务无法修改这些宿舍的床位数
+    """
+    dorm = models.Dormitory
+    query = select(
+        dorm.dorm_id, dorm.building_no, dorm.floor_no, dorm.room_no,
+        dorm.gender_type, dorm.total_beds, dorm.occupied_beds
+    ).where(
+        dorm.gender_type.in_(list(genders)),
+        dorm.occupied_beds < dorm.total_beds
+    )
+    if buildings:
+        query = query.where(dorm.building_no.in_(list(buildings)))
+    query = query.order_by(dorm.dorm_id).with_for_update()
+
+    return [Room(*row) for row in db.execute(query)]
+
+
+def run_bulk_assignment(
+    db: Session,
+    records: Iterable[dict],
+    buildings: Optional[Sequence[str]] = None,
+    group_by_college: bool = True,
+    dry_run: bool = False
+) -> dict:
+    """
+    批量分配宿舍并写入学生记录
+    records为表格逐行读出的字典(见spreadsheet.iter_rows)
+    buildings限定可分配的楼栋; dry_run为True时只计算方案不写库
+    所有写入在一个事务内完成,任何错误都会整体回滚
+    """
+    timings = {}
+    started = time.perf_counter()
+
+    # 1. 解析与校验
+    students, errors, total_rows, row_numbers = _validate_records(records)
+    if students:
+        existing_ids = _find_existing(db, models.Student.student_id, [s.student_id for s in students])
+        existing_emails = _find_existing(db, models.Student.email, [s.email for s in students])
+        fresh = []
+        for student in students:
+            row_number = row_numbers[student.student_id]
+            if student.student_id in existing_ids:
+                errors.append({"row": row_number, "student_id": student.student_id, "error": "该学号已被注册"})
+            elif student.email in existing_emails:
+                errors.append({"row": row_number, "student_id": student.student_id, "error": "该邮箱已被使用"})
+            else:
+                fresh.append(student)
+        students = fresh
+    timings["parse"] = time.perf_counter() - started
+
+    # 2. 加锁之前并行计算密码哈希: Argon2耗时较长,不能在持有宿舍行锁期间计算
+    timings["hash"] = 0.0
+    hashes: Dict[str, str] = {}
+    if students and not dry_run:
+        step = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=HASH_WORKERS) as pool:
+            hashes = dict(zip(
+                (student.student_id for student in students),
+                pool.map(auth.get_password_hash, [student.password or DEFAULT_PASSWORD for student in students])
+            ))
+        timings["hash"] = time.perf_counter() - step
+
+    # 3. 锁定有空位的宿舍,在内存中计算分配方案
+    step = time.perf_counter()
+    rooms = _load_rooms(db, {s.gender for s in students}, buildings) if students else []
+    assignments, unassigned = plan_assignments(students, rooms, group_by_college)
+    timings["assign"] = time.perf_counter() - step
+
+    # 4. 批量写回
+    timings["write"] = 0.0
+    if assignments and not dry_run:
+        step = time.perf_counter()
+        rows = [
+            {
+                "student_id": student.student_id,
+                "password": hashes[student.student_id],
+                "name": student.name,
+                "gender": student.gender,
+                "nationality": student.nationality,
+                "college": student.college,
+                "enrollment_year": student.enrollment_year,
+                "email": student.email,
+                "dorm_id": room.dorm_id
+            }
+            for student, room in assignments
+        ]
+        try:
+            student_table = models.Student.__table__
+            for start in range(0, len(rows), INSERT_BATCH_SIZE):
+                db.execute(insert(student_table), rows[start:start + INSERT_BATCH_SIZE])
+
+            changed = {room.dorm_id: room for _, room in assignments}
+            apply_bed_deltas(db, changed, {dorm_id: room.planned for dorm_id, room in changed.items()})
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        timings["write"] = time.perf_counter() - step
+    else:
+        # 只计算方案时释放行锁
+        db.rollback()
+
+    timings["total"] = time.perf_counter() - started
+    assigned = len(assignments)
+
+    return {
+        "dry_run": dry_run,
+        "total_rows": total_rows,
+        "assigned": assigned,
+        "unassigned_count": len(unassigned),
+        "error_count": len(errors),
+        "rooms_used": len({room.dorm_id for _, room in assignments}),
+        "by_building": dict(Counter(room.building_no for _, room in assignments)),
+        "assignments": [
+            {"student_id": student.student_id, "dorm_id": room.dorm_id, "room_no": room.room_no}
+            for student, room in assignments[:REPORT_LIMIT]
+        ],
+        "unassigned": [
+            {"student_id": student.student_id, "reason": reason}
+            for student, reason in unassigned[:REPORT_LIMIT]
+        ],
+        "errors": errors[:REPORT_LIMIT],
+        "timings": {key: round(value, 4) for key, value in timings.items()},
+        "throughput": {
+            "students_per_second": round(assigned / timings["total"], 1) if timings["total"] else None,
+            "assign_per_second": round(assigned / timings["assign"], 1) if timings["assign"] else None,
+            "write_per_second": round(assigned / timings["write"], 1) if timings["write"] else None
+        }
+    }
+
+
+def main():
+    from .database import SessionLocal
+    from .spreadsheet import iter_rows
+
+    parser = argparse.ArgumentParser(description="新生批量分配宿舍")
+    parser.add_argument("file", help="新生名单文件(xlsx/csv)")
+    parser.add_argument("--building", action="append", dest="buildings", help="限定可分配的楼栋,可重复指定")
+    parser.add_argument("--no-college-grouping", action="store_true", help="不按学院分组同住")
+    parser.add_argument("--dry-run", action="store_true", help="只计算分配方案,不写入数据库")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        with open(args.file, "rb") as f:
+            report = run_bulk_assignment(
+                db,
+                iter_rows(f, args.file),
+                buildings=args.buildings,
+                group_by_college=not args.no_college_grouping,
+                dry_run=args.dry_run
+            )
+    finally:
+        db.close()
+
+    print(f"名单行数: {report['total_rows']}")
+    print(f"成功分配: {report['assigned']} 人, 使用房间 {report['rooms_used']} 间")
+    print(f"未分配: {report['unassigned_count']} 人, 校验失败: {report['error_count']} 条")
+    for building_no, count in sorted(report["by_building"].items()):
+        print(f"  {building_no}: {count} 人")
+    for error in report["errors"][:10]:
+        print(f"  ⚠️  第{error['row']}行 {error['student_id']}: {error['error']}")
+    print(f"耗时: {report['timings']}")
+    print(f"吞吐量: {report['throughput']['students_per_second']} 人/秒")
+    if report["dry_run"]:
+        print("(dry-run模式,未写入数据库)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,397 @@
+"""
+缓存模块
+为读多写少的接口(统计面板、宿舍列表等)提供缓存,后端可插拔:
+- local: 进程内LRU缓存,条目带TTL,超过CACHE_MAX_ENTRIES时淘汰最久未使用的条目
+- redis: 多个工作进程共享的Redis(或兼容Redis协议的服务,如KeyDB、Dragonfly);
+  CACHE_URL=fakeredis:// 时使用进程内的fakeredis替身,便于本地调试
+
+失效方式为标签版本: 每个条目写入时记录所依赖标签的版本号,读取时版本不一致即视为未命中,
+失效一个标签只需递增其版本号,不需要找出并删除相关条目
+- 会话提交后,本次事务写过的表名自动作为标签失效(install_write_tracking)
+- 写接口也可以调用invalidate_tags / invalidate_statistics主动失效
+
+命中率等指标通过metrics模块导出(cache_requests_total{cache, result})
+
+配置(环境变量):
+    CACHE_BACKEND=local|redis  CACHE_URL=redis://localhost:6379/0
+    CACHE_MAX_ENTRIES=10000    CACHE_DEFAULT_TTL=60
+"""
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Optional, Sequence, Set, Tuple
+
+from dotenv import load_dotenv
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from .metrics import Counter, registry
+from .responses import dumps
+
+# 加载环境变量
+load_dotenv()
+
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "local")
+CACHE_URL = os.getenv("CACHE_URL", "redis://localhost:6379/0")
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "10000"))
+CACHE_DEFAULT_TTL = float(os.getenv("CACHE_DEFAULT_TTL", "60"))
+# 统计数据缓存时间(秒)
+STATISTICS_CACHE_TTL = float(os.getenv("STATISTICS_CACHE_TTL", "30"))
+
+# 统计面板依赖的标签(表名) 及 主动失效使用的标签
+STATISTICS_TAGS = ("statistics", "students", "dormitory_occupancy", "dorm_change_requests", "maintenance_requests", "bills")
+
+_MISSING = object()
+
+cache_requests = registry.register(Counter(
+    "cache_requests_total", "缓存读取次数(result: hit/miss/error)", ("cache", "result")
+))
+cache_evictions = registry.register(Counter(
+    "cache_evictions_total", "因容量不足被淘汰的缓存条目数", ("backend",)
+))
+
+
+class TTLCache:
+    """
+    线程安全的TTL缓存
+    条目在ttl秒后过期,过期条目在下次读取时清除
+    设置maxsize后,条目数超过上限时先清除过期条目,仍超出则淘汰最早写入的条目
+    """
+
+    def __init__(self, ttl: float, maxsize: Optional[int] = None):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._data: Dict[Hashable, Tuple[float, Any]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return default
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self._data[key]
+                return default
+            return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        with self._lock:
+            now = time.monotonic()
+            self._data.pop(key, None)
+            self._data[key] = (now + self.ttl, value)
+            if self.maxsize is not None and len(self._data) > self.maxsize:
+                self._evict(now)
+
+    def _evict(self, now: float) -> None:
+        """调用方持有锁"""
+        expired = [key for key, (expires_at, _) in self._data.items() if expires_at <= now]
+        for key in expired:
+            del self._data[key]
+        while len(self._data) > self.maxsize:
+            del self._data[next(iter(self._data))]
+
+    def get_or_set(self, key: Hashable, factory: Callable[[], Any]) -> Any:
+        """
+        命中则直接返回缓存值,否则调用factory计算并写入缓存
+        """
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            value = factory()
+            self.set(key, value)
+        return value
+
+    def invalidate(self, *keys: Hashable) -> None:
+        with self._lock:
+            for key in keys:
+                self._data.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+
+# ============================================================================
+# 缓存后端
+# ============================================================================
+
+class LocalBackend:
+    """进程内LRU缓存,条目带过期时间"""
+    name = "local"
+
+    def __init__(self, max_entries: int = CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._data: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._tags: Dict[str, Tuple[int, float]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Any:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return _MISSING
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self._data[key]
+                return _MISSING
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Any, ttl: float) -> None:
+        evicted = 0
+        with self._lock:
+            self._data[key] = (time.monotonic() + ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                evicted += 1
+        if evicted:
+            cache_evictions.inc(self.name, amount=evicted)
+
+    def delete(self, *keys: str) -> None:
+        with self._lock:
+            for key in keys:
+                self._data.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def bump_tags(self, tags: Iterable[str]) -> None:
+        now = time.time()
+        with self._lock:
+            for tag in tags:
+                version, _ = self._tags.get(tag, (0, now))
+                self._tags[tag] = (version + 1, now)
+
+    def tag_versions(self, tags: Sequence[str]) -> List[Tuple[int, Optional[float]]]:
+        with self._lock:
+            return [self._tags.get(tag, (0, None)) for tag in tags]
+
+    def size(self) -> int:
+        return len(self._data)
+
+
+class RedisBackend:
+    """
+    Redis共享缓存,值序列化为JSON(与接口响应相同: 元组变为列表,Decimal变为浮点数,日期变为ISO字符串)
+    标签版本保存在 <prefix>tag:<标签>,最近失效时间保存在 <prefix>tagtime:<标签>
+    """
+    name = "redis"
+
+    def __init__(self, url: str = CACHE_URL, prefix: str = "dorm:"):
+        if url.startswith("fakeredis://"):
+            import fakeredis
+            self.client = fakeredis.FakeStrictRedis()
+        else:
+            import redis
+            self.client = redis.Redis.from_url(url, socket_timeout=0.5, socket_connect_timeout=0.5)
+        self.prefix = prefix
+
+    def get(self, key: str) -> Any:
+        raw = self.client.get(self.prefix + key)
+        return _MISSING if raw is None else json.loads(raw)
+
+    def set(self, key: str, value: Any, ttl: float) -> None:
+        self.client.set(self.prefix + key, dumps(value), px=max(1, int(ttl * 1000)))
+
+    def delete(self, *keys: str) -> None:
+        if keys:
+            self.client.delete(*(self.prefix + key for key in keys))
+
+    def clear(self) -> None:
+        # 保留标签版本: 版本号回退会让客户端手中旧的ETag重新生效
+        tag_prefix = (self.prefix + "tag").encode()
+        batch = []
+        for key in self.client.scan_iter(match=self.prefix + "*", count=500):
+            if key.startswith(tag_prefix):
+                continue
+            batch.append(key)
+            if len(batch) >= 500:
+                self.client.delete(*batch)
+                batch.clear()
+        if batch:
+            self.client.delete(*batch)
+
+    def bump_tags(self, tags: Iterable[str]) -> None:
+        now = time.time()
+        pipeline = self.client.pipeline(transaction=False)
+        for tag in tags:
+            pipeline.incr(f"{self.prefix}tag:{tag}")
+            pipeline.set(f"{self.prefix}tagtime:{tag}", now)
+        pipeline.execute()
+
+    def tag_versions(self, tags: Sequence[str]) -> List[Tuple[int, Optional[float]]]:
+        if not tags:
+            return []
+        values = self.client.mget(
+            [f"{self.prefix}tag:{tag}" for tag in tags] + [f"{self.prefix}tagtime:{tag}" for tag in tags]
+        )
+        versions, times = values[:len(tags)], values[len(tags):]
+        return [
+            (int(version) if version is not None else 0, float(at) if at is not None else None)
+            for version, at in zip(versions, times)
+        ]
+
+    def size(self) -> Optional[int]:
+        # 数据库可能与其他应用共享,dbsize不代表本缓存的条目数;逐个扫描前缀代价太高,不导出该指标
+        return None
+
+
+def create_backend(kind: str = CACHE_BACKEND):
+    if kind == "local":
+        return LocalBackend()
+    if kind == "redis":
+        return RedisBackend()
+    raise ValueError(f"未知的缓存后端: {kind}(可选 local / redis)")
+
+
+# ============================================================================
+# 缓存门面
+# ============================================================================
+
+def _key_text(key: Hashable) -> str:
+    return key if isinstance(key, str) else repr(key)
+
+
+class Cache:
+    """
+    路由使用的缓存接口
+    get_or_set的name用于区分指标(如 statistics、admin_dormitories),tags为条目依赖的标签
+    共享后端不可用时按未命中处理,直接计算结果,不影响接口可用性
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+        self._errors = 0
+        self._last_error: Optional[str] = None
+
+    def _record_error(self, name: str, error: Exception) -> None:
+        self._errors += 1
+        self._last_error = str(error)[:200]
+        cache_requests.inc(name, "error")
+
+    def get_or_set(
+        self,
+        name: str,
+        key: Hashable,
+        factory: Callable[[], Any],
+        ttl: Optional[float] = None,
+        tags: Sequence[str] = ()
+    ) -> Any:
+        full_key = f"{name}:{_key_text(key)}"
+        try:
+            # 版本在计算之前读取: 计算期间发生的写入会使本次写入的条目立即过时
+            versions = tuple(version for version, _ in self.backend.tag_versions(tags))
+            entry = self.backend.get(full_key)
+        except Exception as e:
+            self._record_error(name, e)
+            return factory()
+
+        # 经JSON序列化的后端返回的版本是列表
+        if entry is not _MISSING and tuple(entry[0]) == versions:
+            cache_requests.inc(name, "hit")
+            return entry[1]
+
+        cache_requests.inc(name, "miss")
+        value = factory()
+        try:
+            self.backend.set(full_key, (versions, value), ttl if ttl is not None else CACHE_DEFAULT_TTL)
+        except Exception as e:
+            self._record_error(name, e)
+        return value
+
+    def invalidate_tags(self, *tags: str) -> None:
+        if not tags:
+            return
+        try:
+            self.backend.bump_tags(tags)
+        except Exception as e:
+            self._record_error("tags", e)
+
+    def tag_versions(self, tags: Sequence[str]) -> List[Tuple[int, Optional[float]]]:
+        return self.backend.tag_versions(tags)
+
+    def clear(self) -> None:
+        self.backend.clear()
+
+    def stats(self) -> dict:
+        try:
+            size = self.backend.size()
+        except Exception:
+            size = None
+        return {"backend": self.backend.name, "entries": size, "errors": self._errors, "last_error": self._last_error}
+
+
+# 全局缓存
+cache = Cache(create_backend())
+
+
+def _cache_metrics():
+    stats = cache.stats()
+    yield "# TYPE cache_entries gauge"
+    if stats["entries"] is not None:
+        yield f'cache_entries{{backend="{stats["backend"]}"}} {stats["entries"]}'
+
+
+registry.register_collector(_cache_metrics)
+
+
+def invalidate_statistics() -> None:
+    """
+    失效统计数据缓存
+    所有会改变学生数、床位数、待处理申请数或未付账单数的写接口在提交后调用
+    """
+    cache.invalidate_tags("statistics")
+
+
+# ============================================================================
+# 写入跟踪: 提交后按表名失效标签
+# ============================================================================
+
+_TOUCHED_KEY = "cache_touched_tables"
+
+
+def _touched(session: Session) -> Set[str]:
+    return session.info.setdefault(_TOUCHED_KEY, set())
+
+
+def _after_flush(session: Session, flush_context) -> None:
+    touched = _touched(session)
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        table = getattr(obj, "__table__", None)
+        if table is not None:
+            touched.add(table.name)
+
+
+def _do_orm_execute(orm_execute_state) -> None:
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        table = getattr(orm_execute_state.statement, "table", None)
+        name = getattr(table, "name", None)
+        if name:
+            _touched(orm_execute_state.session).add(name)
+
+
+def _after_commit(session: Session) -> None:
+    tables = session.info.pop(_TOUCHED_KEY, None)
+    if tables:
+        cache.invalidate_tags(*sorted(tables))
+
+
+def _after_rollback(session: Session) -> None:
+    session.info.pop(_TOUCHED_KEY, None)
+
+
+def install_write_tracking() -> None:
+    """
+    为所有会话注册写入跟踪(重复调用无副作用)
+    事务中写过的表(ORM flush 和 insert/update/delete 语句)在提交后作为标签失效
+    """
+    if event.contains(Session, "after_commit", _after_commit):
+        return
+    event.listen(Session, "after_flush", _after_flush)
+    event.listen(Session, "do_orm_execute", _do_orm_execute)
+    event.listen(Session, "after_commit", _after_commit)
+    event.listen(Session, "after_rollback", _after_rollback)
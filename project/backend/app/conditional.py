@@ -0,0 +1,160 @@
+"""
+条件请求(ETag / 304)模块
+学生端的只读接口被前端频繁轮询,而数据很少变化。本模块:
+- 表版本使用缓存模块的标签版本: 会话提交后,本次事务写过的表名作为标签递增版本(cache.install_write_tracking)
+- ConditionalGetMiddleware: 对配置的GET接口,用 (学生, 路径, 相关表的版本) 计算ETag,
+  If-None-Match 命中时直接返回304;未命中但该学生已有同版本的响应时返回缓存的响应体;
+  两种情况都不解析用户、不查询数据库
+- 响应附带 ETag、Last-Modified(相关表最近一次写入的时间)和 Cache-Control: private, no-cache,
+  浏览器会自动发送条件请求,前端代码无需修改
+
+使用redis缓存后端时各工作进程共享版本号;使用local后端时其他进程的写入不会递增本进程的版本,
+因此ETag中还包含按RESPONSE_CACHE_MAX_AGE划分的时间段,陈旧响应最多保留该时长
+"""
+import hashlib
+import os
+import time
+import uuid
+from email.utils import formatdate
+from typing import Dict, Optional, Sequence, Tuple
+
+from jose import JWTError, jwt
+
+from .auth import ALGORITHM, SECRET_KEY
+from .cache import TTLCache, cache
+
+# 缓存响应的最长有效期(秒)
+RESPONSE_CACHE_MAX_AGE = float(os.getenv("RESPONSE_CACHE_MAX_AGE", "300"))
+# 缓存的响应体数量上限
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "10000"))
+# 单个响应体超过该大小(字节)时不缓存
+MAX_CACHED_BODY = 1024 * 1024
+
+# 路径 -> 响应依赖的表(都包含students: 学生被删除或修改后旧令牌的ETag随之失效)
+CONDITIONAL_ROUTES: Dict[str, Tuple[str, ...]] = {
+    "/api/students/dormitory": ("students", "dormitories"),
+    "/api/students/roommates": ("students",),
+    "/api/students/bills": ("students", "dormitories", "bills"),
+    "/api/students/dorm-change": ("students", "dorm_change_requests"),
+    "/api/students/maintenance": ("students", "maintenance_requests"),
+}
+
+
+# local后端的版本号在重启后归零,用进程标识区分;共享后端的版本号跨进程一致,各进程生成相同的ETag
+_EPOCH = uuid.uuid4().hex[:8] if cache.backend.name == "local" else "shared"
+_STARTED_AT = time.time()
+
+
+# ============================================================================
+# ASGI中间件
+# ============================================================================
+
+def _header(scope, name: bytes) -> Optional[str]:
+    for key, value in scope.get("headers", []):
+        if key == name:
+            return value.decode("latin-1")
+    return None
+
+
+def _student_principal(scope) -> Optional[str]:
+    """从Bearer令牌中取出学生学号(只校验签名和有效期,不查询数据库;带scope的票据不是访问令牌)"""
+    authorization = _header(scope, b"authorization") or ""
+    scheme, _, token = authorization.partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        return None
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError:
+        return None
+    if payload.get("user_type") != "student" or not payload.get("sub") or payload.get("scope") is not None:
+        return None
+    return payload["sub"]
+
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    candidates = {tag.strip() for tag in if_none_match.split(",")}
+    bare = etag[2:] if etag.startswith("W/") else etag
+    return etag in candidates or bare in candidates or f"W/{bare}" in candidates
+
+
+class ConditionalGetMiddleware:
+    """对CONDITIONAL_ROUTES中的学生端GET接口提供ETag、304和按学生缓存的响应体"""
+
+    def __init__(self, app, routes: Optional[Dict[str, Tuple[str, ...]]] = None):
+        self.app = app
+        self.routes = routes if routes is not None else CONDITIONAL_ROUTES
+        self.responses = TTLCache(ttl=RESPONSE_CACHE_MAX_AGE, maxsize=RESPONSE_CACHE_SIZE)
+
+    def _etag(self, principal: str, path: str, query: bytes, tables: Sequence[str]) -> Tuple[str, float]:
+        snapshot = cache.tag_versions(tables)
+        versions = tuple(version for version, _ in snapshot)
+        modified = max((at for _, at in snapshot if at is not None), default=_STARTED_AT)
+        period = int(time.time() // RESPONSE_CACHE_MAX_AGE) if RESPONSE_CACHE_MAX_AGE > 0 else 0
+        raw = f"{_EPOCH}|{principal}|{path}?{query.decode('latin-1')}|{versions}|{period}"
+        return f'W/"{hashlib.sha1(raw.encode()).hexdigest()[:20]}"', modified
+
+    async def __call__(self, scope, receive, send):
+        tables = self.routes.get(scope.get("path")) if scope["type"] == "http" else None
+        if tables is None or scope.get("method") != "GET":
+            await self.app(scope, receive, send)
+            return
+        principal = _student_principal(scope)
+        if principal is None:
+            await self.app(scope, receive, send)
+            return
+
+        # 版本在执行接口之前读取: 执行期间发生的写入会递增版本,本次缓存的响应不会被再次使用
+        try:
+            etag, modified = self._etag(principal, scope["path"], scope.get("query_string", b""), tables)
+        except Exception:
+            # 共享缓存不可用时退化为普通请求
+            await self.app(scope, receive, send)
+            return
+        validators = [
+            (b"etag", etag.encode()),
+            (b"last-modified", formatdate(modified, usegmt=True).encode()),
+            (b"cache-control", b"private, no-cache"),
+            (b"vary", b"Authorization"),
+        ]
+
+        if _etag_matches(_header(scope, b"if-none-match"), etag):
+            await send({"type": "http.response.start", "status": 304, "headers": validators})
+            await send({"type": "http.response.body", "body": b""})
+            return
+
+        cache_key = (principal, scope["path"], scope.get("query_string", b""))
+        cached = self.responses.get(cache_key)
+        if cached is not None and cached[0] == etag:
+            _, headers, body = cached
+            await send({"type": "http.response.start", "status": 200, "headers": headers})
+            await send({"type": "http.response.body", "body": body})
+            return
+
+        start_message = None
+        chunks = []
+        cacheable = True
+
+        async def send_wrapper(message):
+            nonlocal start_message, cacheable
+            if message["type"] == "http.response.start":
+                start_message = message
+                cacheable = message["status"] == 200
+                if cacheable:
+                    message["headers"] = [
+                        (key, value) for key, value in message.get("headers", [])
+                        if key.lower() not in (b"etag", b"last-modified", b"cache-control", b"vary")
+                    ] + validators
+            elif message["type"] == "http.response.body" and cacheable:
+                chunks.append(message.get("body", b""))
+                if sum(len(chunk) for chunk in chunks) > MAX_CACHED_BODY:
+                    cacheable = False
+                    chunks.clear()
+                if not message.get("more_body", False) and cacheable:
+                    self.responses.set(cache_key, (etag, list(start_message["headers"]), b"".join(chunks)))
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
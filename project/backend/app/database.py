@@ -7,6 +7,8 @@ from sqlalchemy.orm import sessionmaker
 import os
 from dotenv import load_dotenv
 
+from .profiler import install_profiler
+
 # 加载环境变量
 load_dotenv()
 
@@ -21,6 +23,9 @@ engine = create_engine(
     echo=False           # 生产环境设为False
 )
 
+# SQL性能分析(慢查询日志、按路由统计)
+install_profiler(engine)
+
 # 创建会话工厂
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
@@ -0,0 +1,260 @@
+"""
+宿舍调换申请批量处理模块
+一次审批或拒绝多条调换申请:
+- 申请、学生、宿舍行按主键顺序加锁,避免并发批次之间死锁
+- 容量按整批的净变化校验(迁入减迁出),互换或链式调换即使涉及满员宿舍也能同时通过
+- 床位计数通过beds.apply_bed_deltas批量更新,整批只提交一次
+未能通过的申请保持pending状态,并在结果中说明原因
+
+单条审批(decide_request)同样按 申请 -> 学生 -> 宿舍 的顺序加锁,床位变化通过beds.move_student原子完成
+"""
+import time
+from collections import defaultdict, deque
+from typing import Dict, Hashable, Iterable, List, Optional, Sequence, Tuple
+
+from sqlalchemy import bindparam, update
+from sqlalchemy.orm import Session
+
+from . import models
+from .beds import apply_bed_deltas, move_student
+
+VALID_ACTIONS = ("approve", "reject")
+# 单个批次最多处理的申请数
+MAX_BATCH_SIZE = 1000
+
+
+def select_feasible_moves(
+    moves: Sequence[Tuple[Hashable, Optional[int], int]],
+    dorms: Dict[int, object]
+) -> Tuple[List[Hashable], List[Hashable]]:
+    """
+    从一组调换中选出可以同时执行的子集
+    moves为 (键, 原宿舍ID或None, 目标宿舍ID) 列表,顺序即优先级(越靠前越优先)
+    dorms为 {宿舍ID: 宿舍对象},宿舍对象需有occupied_beds和total_beds属性
+    任一宿舍满足 已占用 + 迁入 - 迁出 > 总床位 时,撤销迁入该宿舍的优先级最低的调换,
+    撤销会使其原宿舍的迁出减少,必要时继续检查原宿舍;每次撤销一条调换,总复杂度O(n)
+    返回 (可执行的键列表(保持原顺序), 因容量不足被撤销的键列表)
+    """
+    net: Dict[int, int] = defaultdict(int)
+    incoming: Dict[int, List[Hashable]] = defaultdict(list)
+    active: Dict[Hashable, Tuple[Optional[int], int]] = {}
+    for key, old_dorm_id, target_dorm_id in moves:
+        active[key] = (old_dorm_id, target_dorm_id)
+        net[target_dorm_id] += 1
+        incoming[target_dorm_id].append(key)
+        if old_dorm_id is not None:
+            net[old_dorm_id] -= 1
+
+    def overflowing(dorm_id: int) -> bool:
+        dorm = dorms[dorm_id]
+        return dorm.occupied_beds + net[dorm_id] > dorm.total_beds
+
+    queue = deque(dorm_id for dorm_id in list(net) if overflowing(dorm_id))
+    rejected: List[Hashable] = []
+    while queue:
+        dorm_id = queue.popleft()
+        while overflowing(dorm_id) and incoming[dorm_id]:
+            key = incoming[dorm_id].pop()
+            if key not in active:
+                continue
+            old_dorm_id, target_dorm_id = active.pop(key)
+            rejected.append(key)
+            net[target_dorm_id] -= 1
+            if old_dorm_id is not None:
+                net[old_dorm_id] += 1
+                if overflowing(old_dorm_id):
+                    queue.append(old_dorm_id)
+
+    accepted = [key for key, _, _ in moves if key in active]
+    return accepted, rejected
+
+
+def _lock_dorms(db: Session, dorm_ids: Iterable[int]) -> Dict[int, models.Dormitory]:
+    dorm_ids = sorted(set(dorm_ids))
+    if not dorm_ids:
+        return {}
+    dorms = db.query(models.Dormitory).filter(
+        models.Dormitory.dorm_id.in_(dorm_ids)
+    ).order_by(models.Dormitory.dorm_id).with_for_update().all()
+    return {dorm.dorm_id: dorm for dorm in dorms}
+
+
+def _approve(db: Session, pending: List[models.DormChangeRequest], results: Dict[int, dict]) -> List[models.DormChangeRequest]:
+    """校验并执行调换,返回实际通过的申请"""
+    student_ids = sorted({request.student_id for request in pending})
+    students = {
+        student.student_id: student
+        for student in db.query(models.Student).filter(
+            models.Student.student_id.in_(student_ids)
+        ).order_by(models.Student.student_id).with_for_update().all()
+    } if student_ids else {}
+
+    candidates = []
+    seen_students = set()
+    for request in pending:
+        student = students.get(request.student_id)
+        if student is None:
+            results[request.request_id] = {"status": "failed", "detail": "学生不存在"}
+        elif student.student_id in seen_students:
+            results[request.request_id] = {"status": "failed", "detail": "同一学生在本批次中有多条申请"}
+        elif student.dorm_id == request.target_dorm_id:
+            results[request.request_id] = {"status": "failed", "detail": "学生已在目标宿舍"}
+        else:
+            seen_students.add(student.student_id)
+            candidates.append((request, student))
+
+    dorms = _lock_dorms(
+        db,
+        [request.target_dorm_id for request, _ in candidates]
+        + [student.dorm_id for _, student in candidates if student.dorm_id is not None]
+    )
+
+    moves = []
+    by_id = {}
+    for request, student in candidates:
+        target = dorms.get(request.target_dorm_id)
+        if target is None:
+            results[request.request_id] = {"status": "failed", "detail": "目标宿舍不存在"}
+            continue
+        if target.gender_type != student.gender:
+            results[request.request_id] = {"status": "failed", "detail": "目标宿舍性别类型不匹配"}
+            continue
+        old_dorm_id = student.dorm_id if student.dorm_id in dorms else None
+        moves.append((request.request_id, old_dorm_id, request.target_dorm_id))
+        by_id[request.request_id] = (request, student, old_dorm_id)
+
+    accepted, rejected = select_feasible_moves(moves, dorms)
+    for request_id in rejected:
+        results[request_id] = {"status": "failed", "detail": "目标宿舍已满,无法批准"}
+    if not accepted:
+        return []
+
+    deltas: Dict[int, int] = defaultdict(int)
+    student_params = []
+    for request_id in accepted:
+        request, student, old_dorm_id = by_id[request_id]
+        deltas[request.target_dorm_id] += 1
+        if old_dorm_id is not None:
+            deltas[old_dorm_id] -= 1
+        student_params.append({"b_student_id": student.student_id, "b_dorm_id": request.target_dorm_id})
+
+    student_table = models.Student.__table__
+    db.execute(
+        update(student_table)
+        .where(student_table.c.student_id == bindparam("b_student_id"))
+        .values(dorm_id=bindparam("b_dorm_id")),
+        student_params
+    )
+    apply_bed_deltas(db, dorms, deltas)
+    return [by_id[request_id][0] for request_id in accepted]
+
+
+def decide_request(
+    db: Session,
+    request_id: int,
+    action: str,
+    admin_id: int,
+    admin_comment: Optional[str] = None
+) -> Optional[models.DormChangeRequest]:
+    """
+    审批或拒绝单条调换申请并提交
+    申请行和学生行加锁后再校验状态,同一申请被并发处理时只有一次生效
+    申请不存在时返回None;状态不是pending、目标宿舍不存在、性别不符或已满时回滚并抛出ValueError
+    """
+    if action not in VALID_ACTIONS:
+        raise ValueError("操作必须是'approve'或'reject'")
+
+    try:
+        request = db.query(models.DormChangeRequest).filter(
+            models.DormChangeRequest.request_id == request_id
+        ).with_for_update().first()
+        if request is None:
+            db.rollback()
+            return None
+        if request.status != "pending":
+            raise ValueError(f"该申请当前状态为'{request.status}',无法处理")
+
+        if action == "approve":
+            student = db.query(models.Student).filter(
+                models.Student.student_id == request.student_id
+            ).with_for_update().first()
+            if student is None:
+                raise ValueError("学生不存在")
+            move_student(db, student, request.target_dorm_id)
+
+        request.status = "approved" if action == "approve" else "rejected"
+        request.admin_id = admin_id
+        request.admin_comment = admin_comment
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    return request
+
+
+def process_batch(
+    db: Session,
+    request_ids: Sequence[int],
+    action: str,
+    admin_id: int,
+    admin_comment: Optional[str] = None,
+    max_batch_size: Optional[int] = MAX_BATCH_SIZE
+) -> dict:
+    """
+    批量审批或拒绝调换申请,整批在一个事务内完成
+    request_ids的顺序即审批优先级,容量不足时优先保留靠前的申请
+    max_batch_size为None时不限制数量(供调换撮合等内部调用)
+    返回每条申请的处理结果
+    """
+    if action not in VALID_ACTIONS:
+        raise ValueError("操作必须是'approve'或'reject'")
+    ids = list(dict.fromkeys(request_ids))
+    if not ids:
+        raise ValueError("请至少选择一条申请")
+    if max_batch_size is not None and len(ids) > max_batch_size:
+        raise ValueError(f"单次最多处理{max_batch_size}条申请")
+
+    started = time.perf_counter()
+    requests = db.query(models.DormChangeRequest).filter(
+        models.DormChangeRequest.request_id.in_(ids)
+    ).order_by(models.DormChangeRequest.request_id).with_for_update().all()
+    found = {request.request_id: request for request in requests}
+
+    results: Dict[int, dict] = {}
+    pending = []
+    for request_id in ids:
+        request = found.get(request_id)
+        if request is None:
+            results[request_id] = {"status": "failed", "detail": "申请不存在"}
+        elif request.status != "pending":
+            results[request_id] = {"status": "failed", "detail": f"该申请当前状态为'{request.status}',无法处理"}
+        else:
+            pending.append(request)
+
+    try:
+        decided = pending if action == "reject" else _approve(db, pending, results)
+        new_status = "approved" if action == "approve" else "rejected"
+        if decided:
+            db.execute(
+                update(models.DormChangeRequest.__table__)
+                .where(models.DormChangeRequest.__table__.c.request_id.in_([r.request_id for r in decided]))
+                .values(status=new_status, admin_id=admin_id, admin_comment=admin_comment)
+            )
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+
+    for request in decided:
+        results[request.request_id] = {"status": new_status, "detail": None}
+
+    items = [{"request_id": request_id, **results[request_id]} for request_id in ids]
+    processed = len(decided)
+    return {
+        "action": action,
+        "total": len(ids),
+        "processed": processed,
+        "failed": len(ids) - processed,
+        "items": items,
+        "elapsed_seconds": round(time.perf_counter() - started, 3)
+    }
@@ -0,0 +1,260 @@
+"""
+事件推送模块
+学生通过 Server-Sent Events 接收维修申请、调换申请和账单的状态变化,不再轮询列表接口:
+- EventBus: 进程内的发布/订阅总线,按学号投递;管理员写接口在提交后调用publish
+- 每个学号保留最近EVENT_HISTORY条事件,客户端断线重连时按Last-Event-ID补发;
+  无法确定是否漏掉事件时(进程重启、事件已被淘汰、连接积压过多)发送resync,客户端重新拉取一次列表
+- stream: 生成SSE响应体,空闲时每EVENT_HEARTBEAT秒发送一行注释,防止代理断开空闲连接
+
+总线只在本进程内投递。多个工作进程部署时,连接在其他进程上的客户端收不到推送;
+客户端每次(重新)连接后都会重新拉取列表,配合ETag这次拉取通常只返回304
+
+配置(环境变量):
+    EVENT_HISTORY=50  EVENT_HEARTBEAT=15  EVENT_MAX_CONNECTIONS=5
+"""
+import asyncio
+import json
+import os
+import threading
+import uuid
+from collections import OrderedDict, deque
+from typing import AsyncIterator, Deque, Dict, Iterable, List, NamedTuple, Optional, Set
+
+from . import models
+from .database import SessionLocal
+from .metrics import Counter, Gauge, registry
+from .tasks import task_queue
+
+# 每个学号保留的事件数
+EVENT_HISTORY = int(os.getenv("EVENT_HISTORY", "50"))
+# 心跳间隔(秒)
+EVENT_HEARTBEAT = float(os.getenv("EVENT_HEARTBEAT", "15"))
+# 每个学号同时保持的连接数上限
+EVENT_MAX_CONNECTIONS = int(os.getenv("EVENT_MAX_CONNECTIONS", "5"))
+# 保留历史的学号数上限,超出后淘汰最久没有事件的学号
+MAX_TRACKED_STUDENTS = 10000
+# 单个连接积压的事件数上限,超出后清空积压并发送resync
+QUEUE_SIZE = 100
+# 客户端断线后的重连间隔(毫秒)
+RETRY_MS = 5000
+
+RESYNC = "resync"
+
+events_published = registry.register(Counter(
+    "events_published_total", "发布的推送事件数", ("event",)
+))
+event_streams = registry.register(Gauge(
+    "event_stream_connections", "当前的SSE连接数"
+))
+
+
+class Event(NamedTuple):
+    seq: int
+    event: str
+    data: dict
+
+    def encode(self, epoch: str) -> bytes:
+        payload = json.dumps(self.data, ensure_ascii=False, default=str, separators=(",", ":"))
+        return f"id: {epoch}-{self.seq}\nevent: {self.event}\ndata: {payload}\n\n".encode()
+
+
+class TooManyConnections(Exception):
+    pass
+
+
+class Subscription:
+    """一个SSE连接,事件经所属事件循环投递到队列"""
+
+    def __init__(self, student_id: str, loop: asyncio.AbstractEventLoop):
+        self.student_id = student_id
+        self.loop = loop
+        self.queue: "asyncio.Queue[Event]" = asyncio.Queue(QUEUE_SIZE)
+
+    def offer(self, event: Event) -> None:
+        """只在self.loop中调用"""
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # 客户端读取太慢: 丢弃积压,让客户端整体刷新
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(Event(event.seq, RESYNC, {}))
+
+
+class EventBus:
+    """
+    进程内发布/订阅
+    publish可以在任意线程调用(同步端点在线程池中执行),投递通过call_soon_threadsafe交给订阅者的事件循环
+    """
+
+    def __init__(self, history: int = EVENT_HISTORY):
+        # 事件ID为 <epoch>-<序号>,进程重启后epoch变化,旧ID一律按无法补发处理
+        self.epoch = uuid.uuid4().hex[:8]
+        self.history = history
+        self._seq = 0
+        self._subscribers: Dict[str, Set[Subscription]] = {}
+        self._history: "OrderedDict[str, Deque[Event]]" = OrderedDict()
+        # 学号 -> 已从历史中淘汰的最大序号
+        self._dropped: Dict[str, int] = {}
+        # 被整体淘汰的学号历史中的最大序号
+        self._evicted_through = 0
+        self._lock = threading.Lock()
+
+    def publish(self, student_ids: Iterable[str], event: str, data: dict) -> None:
+        """向若干学生发布事件(应在数据库提交之后调用)"""
+        deliveries = []
+        with self._lock:
+            for student_id in dict.fromkeys(student_ids):
+                self._seq += 1
+                item = Event(self._seq, event, data)
+                self._remember(student_id, item)
+                for subscription in self._subscribers.get(student_id, ()):
+                    deliveries.append((subscription, item))
+        events_published.inc(event)
+        for subscription, item in deliveries:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.offer, item)
+            except RuntimeError:
+                # 事件循环已关闭(应用正在退出)
+                pass
+
+    def _remember(self, student_id: str, item: Event) -> None:
+        events = self._history.get(student_id)
+        if events is None:
+            events = self._history[student_id] = deque()
+            if len(self._history) > MAX_TRACKED_STUDENTS:
+                evicted_id, evicted = self._history.popitem(last=False)
+                self._dropped.pop(evicted_id, None)
+                if evicted:
+                    self._evicted_through = max(self._evicted_through, evicted[-1].seq)
+        else:
+            self._history.move_to_end(student_id)
+        events.append(item)
+        if len(events) > self.history:
+            self._dropped[student_id] = events.popleft().seq
+
+    def subscribe(self, student_id: str, last_event_id: Optional[str] = None):
+        """
+        注册连接,返回 (订阅, 需要补发的事件)
+        注册和读取历史在同一把锁内完成,补发的事件和之后投递到队列的事件既不重复也不遗漏
+        """
+        subscription = Subscription(student_id, asyncio.get_running_loop())
+        with self._lock:
+            subscribers = self._subscribers.setdefault(student_id, set())
+            if len(subscribers) >= EVENT_MAX_CONNECTIONS:
+                raise TooManyConnections(student_id)
+            subscribers.add(subscription)
+            backlog = self._replay(student_id, last_event_id)
+        event_streams.add()
+        return subscription, backlog
+
+    def _replay(self, student_id: str, last_event_id: Optional[str]) -> List[Event]:
+        if not last_event_id:
+            return []
+        epoch, _, seq = last_event_id.partition("-")
+        if epoch != self.epoch or not seq.isdigit():
+            return [Event(self._seq, RESYNC, {})]
+        last_seq = int(seq)
+        events = self._history.get(student_id)
+        if events is None:
+            missed = last_seq < self._evicted_through
+            return [Event(self._seq, RESYNC, {})] if missed else []
+        if last_seq < self._dropped.get(student_id, 0):
+            return [Event(self._seq, RESYNC, {})]
+        return [item for item in events if item.seq > last_seq]
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.student_id)
+            if subscribers is None or subscription not in subscribers:
+                return
+            subscribers.discard(subscription)
+            if not subscribers:
+                del self._subscribers[subscription.student_id]
+        event_streams.add(amount=-1)
+
+    def connections(self) -> int:
+        with self._lock:
+            return sum(len(subscribers) for subscribers in self._subscribers.values())
+
+
+# 全局事件总线
+event_bus = EventBus()
+
+
+async def stream(bus: EventBus, subscription: Subscription, backlog: List[Event]) -> AsyncIterator[bytes]:
+    """SSE响应体: 先补发backlog,之后逐条发送新事件,空闲时发送心跳;连接断开时注销订阅"""
+    try:
+        yield f"retry: {RETRY_MS}\n\n".encode()
+        for item in backlog:
+            yield item.encode(bus.epoch)
+        while True:
+            try:
+                item = await asyncio.wait_for(subscription.queue.get(), EVENT_HEARTBEAT)
+            except asyncio.TimeoutError:
+                yield b": ping\n\n"
+                continue
+            yield item.encode(bus.epoch)
+    finally:
+        bus.unsubscribe(subscription)
+
+
+# ============================================================================
+# 业务事件
+# ============================================================================
+
+def publish_maintenance(request: models.MaintenanceRequest) -> None:
+    event_bus.publish([request.student_id], "maintenance", {
+        "request_id": request.request_id,
+        "status": request.status
+    })
+
+
+def publish_dorm_change(student_id: str, request_id: int, status: str) -> None:
+    event_bus.publish([student_id], "dorm_change", {
+        "request_id": request_id,
+        "status": status
+    })
+
+
+def publish_dorm_change_report(report: dict) -> None:
+    """批量审批或撮合后,向已处理申请的学生推送(查询申请人在后台任务中完成)"""
+    decided = {item["request_id"]: item["status"] for item in report["items"] if item["status"] in ("approved", "rejected")}
+    if decided:
+        task_queue.enqueue("notify_dorm_changes", decided=decided)
+
+
+def publish_bill(bill: models.Bill) -> None:
+    """账单属于宿舍,推送给该宿舍的全部住户(查询住户在后台任务中完成)"""
+    task_queue.enqueue("notify_bill", bill_id=bill.bill_id, dorm_id=bill.dorm_id, status=bill.status)
+
+
+# 推送只对当前连接有意义,不需要持久化
+@task_queue.task("notify_dorm_changes", durable=False, max_retries=1)
+def _notify_dorm_changes(decided: Dict[int, str]) -> None:
+    db = SessionLocal()
+    try:
+        rows = db.query(models.DormChangeRequest.request_id, models.DormChangeRequest.student_id).filter(
+            models.DormChangeRequest.request_id.in_(list(decided))
+        ).all()
+    finally:
+        db.close()
+    for request_id, student_id in rows:
+        publish_dorm_change(student_id, request_id, decided[request_id])
+
+
+@task_queue.task("notify_bill", durable=False, max_retries=1)
+def _notify_bill(bill_id: int, dorm_id: int, status: str) -> None:
+    db = SessionLocal()
+    try:
+        residents = [
+            student_id for (student_id,) in db.query(models.Student.student_id).filter(
+                models.Student.dorm_id == dorm_id
+            )
+        ]
+    finally:
+        db.close()
+    event_bus.publish(residents, "bill", {
+        "bill_id": bill_id,
+        "status": status
+    })
@@ -0,0 +1,408 @@
+"""
+学生/宿舍数据流式导入模块
+按固定大小的块从xlsx/csv读取数据,每块用Pydantic模型批量校验后以
+INSERT ... ON DUPLICATE KEY UPDATE 批量写入并单独提交,
+内存占用只与块大小和宿舍数量有关,与名单总行数无关
+
+命令行用法:
+    python -m app.importer students ../data/students.xlsx [--chunk-size 1000]
+    python -m app.importer dormitories ../data/dormitories.xlsx
+"""
+import argparse
+import os
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Dict, Iterable, List, Tuple, Type
+
+from pydantic import BaseModel, TypeAdapter, ValidationError
+from sqlalchemy import or_, select
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.orm import Session
+
+from . import auth, models, schemas
+from .beds import apply_bed_deltas, reconcile_occupancy
+from .rooms import room_directory
+from .spreadsheet import coerce_strings, iter_chunks
+from .vacancy import vacancy_index
+
+# 默认每块行数
+DEFAULT_CHUNK_SIZE = int(os.getenv("IMPORT_CHUNK_SIZE", "1000"))
+# 新学生未提供密码时使用的初始密码
+DEFAULT_PASSWORD = os.getenv("IMPORT_DEFAULT_PASSWORD", "123456")
+# 并行计算Argon2哈希的线程数(argon2-cffi计算时释放GIL)
+HASH_WORKERS = int(os.getenv("IMPORT_HASH_WORKERS", str(os.cpu_count() or 4)))
+# 报告中最多列出的错误数
+REPORT_LIMIT = 100
+
+VALID_GENDERS = ("男", "女")
+
+
+@dataclass
+class _Dorm:
+    """内存中的宿舍容量信息"""
+    dorm_id: int
+    building_no: str
+    gender_type: str
+    total_beds: int
+    occupied_beds: int
+
+
+class ImportReport:
+    """导入过程统计"""
+
+    def __init__(self, kind: str):
+        self.kind = kind
+        self.total_rows = 0
+        self.written = 0
+        self.chunks = 0
+        self.failed_chunks = 0
+        self.error_count = 0
+        self.errors: List[dict] = []
+        self.started = time.perf_counter()
+
+    def add_error(self, row, error: str, key=None) -> None:
+        self.error_count += 1
+        if len(self.errors) < REPORT_LIMIT:
+            self.errors.append({"row": row, "key": key, "error": error})
+
+    def to_dict(self) -> dict:
+        elapsed = time.perf_counter() - self.started
+        return {
+            "kind": self.kind,
+            "total_rows": self.total_rows,
+            "written": self.written,
+            "chunks": self.chunks,
+            "failed_chunks": self.failed_chunks,
+            "error_count": self.error_count,
+            "errors": self.errors,
+            "elapsed_seconds": round(elapsed, 3),
+            "rows_per_second": round(self.total_rows / elapsed, 1) if elapsed else None
+        }
+
+
+@lru_cache(maxsize=None)
+def _list_adapter(model: Type[BaseModel]) -> TypeAdapter:
+    return TypeAdapter(List[model])
+
+
+def validate_chunk(
+    chunk: List[dict],
+    model: Type[BaseModel],
+    first_row: int
+) -> Tuple[List[Tuple[int, BaseModel]], List[Tuple[int, str]]]:
+    """
+    用模型批量校验一块数据
+    返回 (通过校验的 (行号, 模型实例), 未通过的 (行号, 错误信息))
+    """
+    adapter = _list_adapter(model)
+    data = [coerce_strings(record, model) for record in chunk]
+    try:
+        validated = adapter.validate_python(data)
+        return [(first_row + i, item) for i, item in enumerate(validated)], []
+    except ValidationError as e:
+        invalid: Dict[int, str] = {}
+        for error in e.errors():
+            index = error["loc"][0]
+            field = ".".join(str(part) for part in error["loc"][1:])
+            invalid.setdefault(index, f"{field}: {error['msg']}")
+
+    valid_indexes = [i for i in range(len(data)) if i not in invalid]
+    validated = adapter.validate_python([data[i] for i in valid_indexes]) if valid_indexes else []
+    return (
+        [(first_row + i, item) for i, item in zip(valid_indexes, validated)],
+        [(first_row + i, message) for i, message in sorted(invalid.items())]
+    )
+
+
+def _dorm_query():
+    return select(
+        models.Dormitory.dorm_id,
+        models.Dormitory.building_no,
+        models.Dormitory.gender_type,
+        models.Dormitory.total_beds,
+        models.Dormitory.occupied_beds
+    )
+
+
+def _load_dorms(db: Session) -> Dict[int, _Dorm]:
+    return {row.dorm_id: _Dorm(*row) for row in db.execute(_dorm_query())}
+
+
+def _lock_dorms(db: Session, dorms: Dict[int, _Dorm], dorm_ids) -> None:
+    """按ID顺序锁定本块涉及的宿舍,并用最新床位数刷新内存中的宿舍信息"""
+    if not dorm_ids:
+        return
+    rows = db.execute(
+        _dorm_query()
+        .where(models.Dormitory.dorm_id.in_(sorted(dorm_ids)))
+        .order_by(models.Dormitory.dorm_id)
+        .with_for_update()
+    )
+    for row in rows:
+        dorms[row.dorm_id] = _Dorm(*row)
+
+
+def import_students(db: Session, rows: Iterable[dict], chunk_size: int = DEFAULT_CHUNK_SIZE) -> dict:
+    """
+    流式导入学生: 按学号插入新学生或更新已有学生
+    宿舍分配变化时同步调整床位计数,超出容量或性别不符的行被拒绝
+    已有学生的宿舍列留空时保持原宿舍不变,密码不会被覆盖
+    """
+    report = ImportReport("students")
+    dorms = _load_dorms(db)
+    default_hash = None
+
+    student_table = models.Student.__table__
+    upsert = mysql_insert(student_table)
+    upsert = upsert.on_duplicate_key_update(
+        name=upsert.inserted.name,
+        gender=upsert.inserted.gender,
+        nationality=upsert.inserted.nationality,
+        college=upsert.inserted.college,
+        enrollment_year=upsert.inserted.enrollment_year,
+        email=upsert.inserted.email,
+        dorm_id=upsert.inserted.dorm_id
+    )
+
+    first_row = 2
+    for chunk in iter_chunks(rows, chunk_size):
+        report.chunks += 1
+        report.total_rows += len(chunk)
+        valid, invalid = validate_chunk(chunk, schemas.StudentImport, first_row)
+        first_row += len(chunk)
+        for row_number, message in invalid:
+            report.add_error(row_number, message)
+
+        ids = [student.student_id for _, student in valid]
+        emails = [student.email for _, student in valid]
+        existing_dorms = dict(db.execute(
+            select(models.Student.student_id, models.Student.dorm_id).where(models.Student.student_id.in_(ids))
+        ).all()) if ids else {}
+        email_owners = dict(db.execute(
+            select(models.Student.email, models.Student.student_id).where(models.Student.email.in_(emails))
+        ).all()) if emails else {}
+
+        # 加锁之前并行计算新学生的密码哈希(按行号索引),已有学生的密码不会被写入
+        new_students = [(row_number, student) for row_number, student in valid if student.student_id not in existing_dorms]
+        if default_hash is None and any(not student.password for _, student in new_students):
+            # 默认密码对所有新学生相同,只计算一次哈希
+            default_hash = auth.get_password_hash(DEFAULT_PASSWORD)
+        with_password = [(row_number, student.password) for row_number, student in new_students if student.password]
+        hashes: Dict[int, str] = {}
+        if with_password:
+            with ThreadPoolExecutor(max_workers=HASH_WORKERS) as pool:
+                hashes = dict(zip(
+                    (row_number for row_number, _ in with_password),
+                    pool.map(auth.get_password_hash, [password for _, password in with_password])
+                ))
+
+        _lock_dorms(
+            db, dorms,
+            {student.dorm_id for _, student in valid if student.dorm_id is not None}
+            | {dorm_id for dorm_id in existing_dorms.values() if dorm_id is not None}
+        )
+
+        deltas: Dict[int, int] = defaultdict(int)
+        accepted = []
+        seen_ids = set()
+        for row_number, student in valid:
+            if student.gender not in VALID_GENDERS:
+                report.add_error(row_number, "性别必须是'男'或'女'", student.student_id)
+                continue
+            if student.student_id in seen_ids:
+                report.add_error(row_number, "同一批次内学号重复", student.student_id)
+                continue
+            owner = email_owners.get(student.email)
+            if owner is not None and owner != student.student_id:
+                report.add_error(row_number, "该邮箱已被其他学生使用", student.student_id)
+                continue
+
+            is_new = student.student_id not in existing_dorms
+            old_dorm_id = existing_dorms.get(student.student_id)
+            # 已有学生的宿舍列留空表示不修改,而不是退宿
+            new_dorm_id = student.dorm_id if is_new or student.dorm_id is not None else old_dorm_id
+            if new_dorm_id is not None:
+                dorm = dorms.get(new_dorm_id)
+                if dorm is None:
+                    report.add_error(row_number, f"宿舍{new_dorm_id}不存在", student.student_id)
+                    continue
+                if dorm.gender_type != student.gender:
+                    report.add_error(row_number, f"宿舍{new_dorm_id}性别类型不匹配", student.student_id)
+                    continue
+                if new_dorm_id != old_dorm_id and dorm.occupied_beds + deltas[new_dorm_id] >= dorm.total_beds:
+                    report.add_error(row_number, f"宿舍{new_dorm_id}已满", student.student_id)
+                    continue
+
+            if new_dorm_id != old_dorm_id:
+                if new_dorm_id is not None:
+                    deltas[new_dorm_id] += 1
+                if old_dorm_id is not None and old_dorm_id in dorms:
+                    deltas[old_dorm_id] -= 1
+
+            seen_ids.add(student.student_id)
+            email_owners[student.email] = student.student_id
+            accepted.append({
+                "student_id": student.student_id,
+                "password": hashes.get(row_number, default_hash) if is_new else "",
+                "name": student.name,
+                "gender": student.gender,
+                "nationality": student.nationality,
+                "college": student.college,
+                "enrollment_year": student.enrollment_year,
+                "email": student.email,
+                "dorm_id": new_dorm_id
+            })
+
+        if not accepted:
+            # 释放本块加的行锁
+            db.rollback()
+            continue
+
+        try:
+            db.execute(upsert, accepted)
+            apply_bed_deltas(db, dorms, deltas)
+            db.commit()
+            report.written += len(accepted)
+        except Exception as e:
+            db.rollback()
+            report.failed_chunks += 1
+            report.add_error(None, f"第{report.chunks}块写入失败: {str(e)[:200]}")
+            # 内存中的床位计数可能已被修改,按数据库重新加载
+            dorms = _load_dorms(db)
+
+    return report.to_dict()
+
+
+def import_dormitories(db: Session, rows: Iterable[dict], chunk_size: int = DEFAULT_CHUNK_SIZE) -> dict:
+    """
+    流式导入宿舍: 按宿舍ID(或房间号)插入新宿舍或更新已有宿舍
+    已占用床位数由学生分配决定,不从文件导入;房间号不能通过导入修改;
+    导入完成后重新校准入住汇总表并重建空床位索引和房间目录
+    """
+    report = ImportReport("dormitories")
+    dorm = models.Dormitory
+
+    dorm_table = dorm.__table__
+    upsert = mysql_insert(dorm_table)
+    upsert = upsert.on_duplicate_key_update(
+        building_no=upsert.inserted.building_no,
+        floor_no=upsert.inserted.floor_no,
+        gender_type=upsert.inserted.gender_type,
+        total_beds=upsert.inserted.total_beds
+    )
+
+    first_row = 2
+    for chunk in iter_chunks(rows, chunk_size):
+        report.chunks += 1
+        report.total_rows += len(chunk)
+        valid, invalid = validate_chunk(chunk, schemas.DormitoryImport, first_row)
+        first_row += len(chunk)
+        for row_number, message in invalid:
+            report.add_error(row_number, message)
+
+        # 已有宿舍按房间号和指定的宿舍ID两种方式查找: 按主键upsert时,校验必须针对该ID对应的行
+        room_nos = [item.room_no for _, item in valid]
+        dorm_ids = [item.dorm_id for _, item in valid if item.dorm_id is not None]
+        conditions = [dorm.room_no.in_(room_nos)] if room_nos else []
+        if dorm_ids:
+            conditions.append(dorm.dorm_id.in_(dorm_ids))
+        rows = db.execute(
+            select(dorm.dorm_id, dorm.room_no, dorm.gender_type, dorm.occupied_beds).where(or_(*conditions))
+        ).all() if conditions else []
+        by_room = {row.room_no: row for row in rows}
+        by_id = {row.dorm_id: row for row in rows}
+
+        accepted = []
+        seen_rooms = set()
+        seen_ids = set()
+        for row_number, item in valid:
+            owner = by_room.get(item.room_no)
+            current = by_id.get(item.dorm_id) if item.dorm_id is not None else owner
+            if item.gender_type not in VALID_GENDERS:
+                message = "性别类型必须是'男'或'女'"
+            elif item.room_no in seen_rooms:
+                message = "同一批次内房间号重复"
+            elif item.dorm_id is not None and item.dorm_id in seen_ids:
+                message = "同一批次内宿舍ID重复"
+            elif current is not None and current.room_no != item.room_no:
+                message = f"宿舍{current.dorm_id}的房间号是{current.room_no},不能通过导入修改房间号"
+            elif owner is not None and owner.dorm_id != (current.dorm_id if current is not None else item.dorm_id):
+                message = f"房间号已属于宿舍{owner.dorm_id}"
+            elif current is not None and current.occupied_beds > item.total_beds:
+                message = f"总床位数不能少于已占用床位数({current.occupied_beds})"
+            elif current is not None and current.occupied_beds and current.gender_type != item.gender_type:
+                message = "宿舍已有学生入住,不能修改性别类型"
+            else:
+                message = None
+
+            if message:
+                report.add_error(row_number, message, item.room_no)
+                continue
+
+            seen_rooms.add(item.room_no)
+            if item.dorm_id is not None:
+                seen_ids.add(item.dorm_id)
+            values = item.model_dump()
+            if values["dorm_id"] is None:
+                values["dorm_id"] = current.dorm_id if current is not None else None
+            accepted.append(values)
+
+        # dorm_id为空的新宿舍依赖自增主键,与指定了dorm_id的行分开写入
+        with_id = [values for values in accepted if values["dorm_id"] is not None]
+        without_id = [{k: v for k, v in values.items() if k != "dorm_id"} for values in accepted if values["dorm_id"] is None]
+
+        try:
+            if with_id:
+                db.execute(upsert, with_id)
+            if without_id:
+                db.execute(upsert, without_id)
+            db.commit()
+            report.written += len(accepted)
+        except Exception as e:
+            db.rollback()
+            report.failed_chunks += 1
+            report.add_error(None, f"第{report.chunks}块写入失败: {str(e)[:200]}")
+
+    if report.written:
+        reconcile_occupancy(db, repair=True)
+        vacancy_index.load(db)
+        room_directory.load(db)
+
+    return report.to_dict()
+
+
+IMPORTERS = {
+    "students": import_students,
+    "dormitories": import_dormitories,
+}
+
+
+def main():
+    from .database import SessionLocal
+    from .spreadsheet import iter_rows
+
+    parser = argparse.ArgumentParser(description="从xlsx/csv流式导入学生或宿舍数据")
+    parser.add_argument("kind", choices=sorted(IMPORTERS), help="导入的数据类型")
+    parser.add_argument("file", help="数据文件(xlsx/csv)")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE, help="每块行数")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        with open(args.file, "rb") as f:
+            report = IMPORTERS[args.kind](db, iter_rows(f, args.file), chunk_size=args.chunk_size)
+    finally:
+        db.close()
+
+    print(f"读取 {report['total_rows']} 行, 写入 {report['written']} 行, 共 {report['chunks']} 块")
+    print(f"错误 {report['error_count']} 条, 写入失败 {report['failed_chunks']} 块")
+    for error in report["errors"][:10]:
+        print(f"  ⚠️  第{error['row']}行 {error['key'] or ''}: {error['error']}")
+    print(f"耗时 {report['elapsed_seconds']} 秒 ({report['rows_per_second']} 行/秒)")
+
+
+if __name__ == "__main__":
+    main()
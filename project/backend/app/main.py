@@ -4,10 +4,19 @@ FastAPI主应用
 """
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
+import asyncio
 import os
 from dotenv import load_dotenv
 
-from .routers import auth, students, admin
+from .routers import auth, students, admin, export
+from .database import SessionLocal, engine
+from . import metrics
+from .cache import install_write_tracking
+from .conditional import ConditionalGetMiddleware
+from .rooms import room_directory
+from .tasks import task_queue
+from .billing import OVERDUE_SWEEP_INTERVAL, run_overdue_sweeper, sweep_stats
 
 # 加载环境变量
 load_dotenv()
@@ -21,6 +30,11 @@ app = FastAPI(
     redoc_url="/redoc"  # ReDoc文档地址
 )
 
+# 学生端只读接口的ETag / 304(位于CORS之内,304和缓存响应同样带有CORS头)
+app.add_middleware(ConditionalGetMiddleware)
+# 提交后按写过的表失效缓存标签(缓存条目和ETag共用)
+install_write_tracking()
+
 # 配置CORS（跨域资源共享）
 app.add_middleware(
     CORSMiddleware,
@@ -30,10 +44,66 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# 请求指标(最后添加,位于中间件最外层,耗时包含CORS处理)
+app.add_middleware(metrics.MetricsMiddleware)
+metrics.install_engine_hooks(engine)
+
+
+def _sweep_metrics():
+    """导出逾期账单扫描的运行指标"""
+    stats = sweep_stats.to_dict()
+    yield "# TYPE overdue_sweep_runs_total counter"
+    yield f"overdue_sweep_runs_total {stats['runs']}"
+    yield "# TYPE overdue_sweep_failures_total counter"
+    yield f"overdue_sweep_failures_total {stats['failures']}"
+    yield "# TYPE overdue_sweep_marked_total counter"
+    yield f"overdue_sweep_marked_total {stats['total_marked']}"
+    yield "# TYPE overdue_sweep_last_duration_seconds gauge"
+    yield f"overdue_sweep_last_duration_seconds {stats['last_duration_seconds']}"
+
+
+metrics.registry.register_collector(_sweep_metrics)
+
 # 注册路由
 app.include_router(auth.router)
 app.include_router(students.router)
 app.include_router(admin.router)
+app.include_router(export.router)
+
+# 启动时预先构建内存索引
+@app.on_event("startup")
+def build_indexes():
+    """构建房间目录,避免第一次查询时才加载;失败时留待首次查询再加载"""
+    db = SessionLocal()
+    try:
+        room_directory.load(db)
+    except Exception as e:
+        print(f"⚠️  房间目录构建失败,将在首次查询时重试: {e}")
+    finally:
+        db.close()
+
+
+# 后台任务
+background_tasks = []
+
+
+@app.on_event("startup")
+async def start_background_tasks():
+    """启动后台任务队列和逾期账单定时扫描(OVERDUE_SWEEP_INTERVAL=0时不启动扫描)"""
+    task_queue.start()
+    if OVERDUE_SWEEP_INTERVAL > 0:
+        background_tasks.append(asyncio.create_task(run_overdue_sweeper(OVERDUE_SWEEP_INTERVAL)))
+
+
+@app.on_event("shutdown")
+async def stop_background_tasks():
+    for task in background_tasks:
+        task.cancel()
+    await asyncio.gather(*background_tasks, return_exceptions=True)
+    background_tasks.clear()
+    # 等待队列中已就绪的任务执行完(在线程中等待,不阻塞事件循环)
+    await asyncio.to_thread(task_queue.stop)
+
 
 # 根路径
 @app.get("/", tags=["根路径"])
@@ -58,6 +128,16 @@ async def health_check():
     return {"status": "healthy"}
 
 
+# 运行指标
+@app.get("/metrics", tags=["健康检查"], response_class=PlainTextResponse)
+async def get_metrics():
+    """
+    Prometheus文本格式的运行指标
+    按路由模板统计请求数、延迟直方图、SQL条数和耗时,以及密码哈希耗时
+    """
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000, reload=True)
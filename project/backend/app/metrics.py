@@ -0,0 +1,360 @@
+"""
+运行指标模块
+- MetricsMiddleware: 纯ASGI中间件,按 (方法, 路由模板) 记录请求数、延迟直方图、进行中请求数,
+  以及每个请求执行的SQL条数和SQL耗时;路由模板(如 /api/admin/students/{student_id})作为标签,
+  避免路径参数导致标签数量无限增长
+- install_engine_hooks: 通过SQLAlchemy事件统计每条SQL的耗时,并计入当前请求;
+  add_query_observer注册的观察者(如SQL分析器)共用同一对游标事件
+- observe_password_hash: 记录Argon2哈希/校验耗时
+- render: 输出Prometheus文本格式,由 /metrics 端点返回
+
+请求内的统计通过contextvar传递,同步端点在线程池中执行时同样生效
+"""
+import bisect
+import threading
+import time
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# 请求延迟(秒)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# 单条SQL耗时(秒)
+QUERY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+# 每个请求的SQL条数
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 200)
+# 密码哈希耗时(秒)
+HASH_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+UNMATCHED_ROUTE = "<unmatched>"
+# 不计入指标的路径
+EXCLUDED_PATHS = {"/metrics"}
+
+
+# ============================================================================
+# 指标类型
+# ============================================================================
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+
+    def _header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        super().__init__(name, documentation, labels)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, *label_values: str, amount: float = 1) -> None:
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return self._header() + [
+            f"{self.name}{_format_labels(self.labels, key)} {_format_number(value)}"
+            for key, value in items
+        ]
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        super().__init__(name, documentation, labels)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def add(self, *label_values: str, amount: float = 1) -> None:
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def set(self, *label_values: str, value: float) -> None:
+        with self._lock:
+            self._values[label_values] = value
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return self._header() + [
+            f"{self.name}{_format_labels(self.labels, key)} {_format_number(value)}"
+            for key, value in items
+        ]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets))
+        # 标签 -> [各桶计数(非累计,最后一项为+Inf), 总和, 总数]
+        self._values: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, *label_values: str) -> None:
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(label_values)
+            if entry is None:
+                entry = self._values[label_values] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][index] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted((key, (list(counts), total, count)) for key, (counts, total, count) in self._values.items())
+        lines = self._header()
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = f'le="{_format_number(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labels, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labels, key)} {_format_number(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.labels, key)} {count}")
+        return lines
+
+
+class Registry:
+    """指标注册表,collectors为输出时调用的回调(用于导出其他模块已有的统计)"""
+
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+        self._collectors: List[Callable[[], Iterable[str]]] = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def register_collector(self, collector: Callable[[], Iterable[str]]) -> None:
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for collector in self._collectors:
+            try:
+                lines.extend(collector())
+            except Exception as e:
+                lines.append(f"# collector {getattr(collector, '__name__', collector)} failed: {_escape(e)}")
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+http_requests_total = registry.register(Counter(
+    "http_requests_total", "HTTP请求总数", ("method", "route", "status")
+))
+http_request_duration = registry.register(Histogram(
+    "http_request_duration_seconds", "HTTP请求处理耗时", ("method", "route"), LATENCY_BUCKETS
+))
+http_requests_in_flight = registry.register(Gauge(
+    "http_requests_in_flight", "正在处理的HTTP请求数", ("method",)
+))
+http_request_db_queries = registry.register(Histogram(
+    "http_request_db_queries", "每个HTTP请求执行的SQL条数", ("method", "route"), QUERY_COUNT_BUCKETS
+))
+http_request_db_duration = registry.register(Histogram(
+    "http_request_db_duration_seconds", "每个HTTP请求的SQL总耗时", ("method", "route"), LATENCY_BUCKETS
+))
+db_query_duration = registry.register(Histogram(
+    "db_query_duration_seconds", "单条SQL执行耗时(含后台任务)", (), QUERY_BUCKETS
+))
+password_hash_duration = registry.register(Histogram(
+    "password_hash_duration_seconds", "密码哈希(Argon2)耗时", ("operation",), HASH_BUCKETS
+))
+
+
+def render() -> str:
+    return registry.render()
+
+
+# ============================================================================
+# 请求上下文
+# ============================================================================
+
+class RequestStats:
+    """单个请求内累计的SQL和密码哈希统计"""
+    __slots__ = ("scope", "db_queries", "db_seconds", "hash_seconds")
+
+    def __init__(self, scope=None):
+        self.scope = scope
+        self.db_queries = 0
+        self.db_seconds = 0.0
+        self.hash_seconds = 0.0
+
+
+_current_request: ContextVar[Optional[RequestStats]] = ContextVar("metrics_request", default=None)
+# 应用 -> {端点函数: 路由模板}
+_route_paths: Dict[int, Dict[object, str]] = {}
+
+
+def current_request_stats() -> Optional[RequestStats]:
+    return _current_request.get()
+
+
+def route_template(scope) -> str:
+    """返回请求匹配到的路由模板,未匹配(404)时返回UNMATCHED_ROUTE"""
+    route = scope.get("route")
+    if route is not None and getattr(route, "path", None):
+        return route.path
+    endpoint = scope.get("endpoint")
+    if endpoint is None:
+        return UNMATCHED_ROUTE
+    application = scope.get("app")
+    paths = _route_paths.get(id(application))
+    if paths is None:
+        routes = getattr(getattr(application, "router", None), "routes", [])
+        paths = _route_paths[id(application)] = {
+            getattr(route, "endpoint", None): route.path
+            for route in routes if getattr(route, "path", None)
+        }
+    return paths.get(endpoint, UNMATCHED_ROUTE)
+
+
+def current_route() -> Optional[str]:
+    """当前请求的路由模板,不在请求中(后台任务、命令行)时返回None"""
+    stats = _current_request.get()
+    if stats is None or stats.scope is None:
+        return None
+    return route_template(stats.scope)
+
+
+def observe_password_hash(operation: str, seconds: float) -> None:
+    """记录一次密码哈希(operation: hash/verify)"""
+    password_hash_duration.observe(seconds, operation)
+    stats = _current_request.get()
+    if stats is not None:
+        stats.hash_seconds += seconds
+
+
+# ============================================================================
+# SQLAlchemy事件
+# ============================================================================
+
+_hooked_engines = set()
+# 每条SQL执行完成后调用: observer(statement, seconds)
+_query_observers: List[Callable[[str, float], None]] = []
+
+
+def add_query_observer(observer: Callable[[str, float], None]) -> None:
+    """注册SQL耗时观察者,复用install_engine_hooks的计时(重复注册无副作用)"""
+    if observer not in _query_observers:
+        _query_observers.append(observer)
+
+
+def install_engine_hooks(engine: Engine) -> None:
+    """为引擎注册SQL计时事件(重复调用无副作用)"""
+    if id(engine) in _hooked_engines:
+        return
+    _hooked_engines.add(id(engine))
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("metrics_query_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        starts = conn.info.get("metrics_query_start")
+        if not starts:
+            return
+        elapsed = time.perf_counter() - starts.pop()
+        db_query_duration.observe(elapsed)
+        stats = _current_request.get()
+        if stats is not None:
+            stats.db_queries += 1
+            stats.db_seconds += elapsed
+        for observer in _query_observers:
+            observer(statement, elapsed)
+
+    @event.listens_for(engine, "handle_error")
+    def _handle_error(exception_context):
+        connection = exception_context.connection
+        if connection is not None:
+            starts = connection.info.get("metrics_query_start")
+            if starts:
+                starts.pop()
+
+
+# ============================================================================
+# ASGI中间件
+# ============================================================================
+
+class MetricsMiddleware:
+    """
+    请求指标中间件(纯ASGI实现,不缓冲响应体,对流式导出同样适用)
+    响应头附带Server-Timing: app(到响应头发出时的耗时)、db(SQL耗时)、hash(密码哈希耗时)
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope.get("path") in EXCLUDED_PATHS:
+            await self.app(scope, receive, send)
+            return
+
+        method = scope.get("method", "GET")
+        stats = RequestStats(scope)
+        token = _current_request.set(stats)
+        started = time.perf_counter()
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                timing = (
+                    f"app;dur={(time.perf_counter() - started) * 1000:.1f}, "
+                    f"db;dur={stats.db_seconds * 1000:.1f};desc=\"{stats.db_queries} queries\""
+                )
+                if stats.hash_seconds:
+                    timing += f", hash;dur={stats.hash_seconds * 1000:.1f}"
+                message.setdefault("headers", [])
+                message["headers"] = list(message["headers"]) + [(b"server-timing", timing.encode())]
+            await send(message)
+
+        http_requests_in_flight.add(method)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            http_requests_in_flight.add(method, amount=-1)
+            _current_request.reset(token)
+
+            route = route_template(scope)
+            http_requests_total.inc(method, route, str(status_code))
+            http_request_duration.observe(elapsed, method, route)
+            http_request_db_queries.observe(stats.db_queries, method, route)
+            http_request_db_duration.observe(stats.db_seconds, method, route)
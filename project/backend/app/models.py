@@ -1,6 +1,6 @@
 """
 SQLAlchemy ORM模型定义
-对应数据库中的6张表
+对应数据库中的7张表
 """
 from sqlalchemy import Column, Integer, String, DECIMAL, Boolean, DateTime, Text, Enum, ForeignKey, Date
 from sqlalchemy.orm import relationship
@@ -104,6 +104,18 @@ class Dormitory(Base):
     bills = relationship("Bill", back_populates="dormitory")
 
 
+class DormitoryOccupancy(Base):
+    """宿舍入住汇总表(按楼栋和性别维护床位计数)"""
+    __tablename__ = "dormitory_occupancy"
+
+    building_no = Column(String(10), primary_key=True, comment="楼栋号")
+    gender_type = Column(String(10), primary_key=True, comment="性别类型")
+    total_rooms = Column(Integer, nullable=False, default=0, comment="总房间数")
+    total_beds = Column(Integer, nullable=False, default=0, comment="总床位数")
+    occupied_beds = Column(Integer, nullable=False, default=0, comment="已占用床位数")
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now(), comment="更新时间")
+
+
 class DormChangeRequest(Base):
     """宿舍调换申请表"""
     __tablename__ = "dorm_change_requests"
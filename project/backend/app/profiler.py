@@ -0,0 +1,193 @@
+"""
+SQL性能分析模块
+复用metrics模块注册的 before_cursor_execute / after_cursor_execute 事件记录每条SQL的耗时:
+- 语句归一化为指纹(字面量替换为?,IN列表合并),按 (指纹, 来源路由) 汇总调用次数、总耗时、最大耗时和p99
+- 超过阈值的语句写入慢查询日志,并在内存中保留最近的若干条;
+  日志只记录指纹,不记录参数(参数中可能有密码和密码哈希)
+
+p99按每个指纹最近 SAMPLE_SIZE 次调用计算;不在请求中执行的语句(后台任务、命令行)的路由记为<background>
+
+配置(环境变量):
+    SQL_PROFILER=0              关闭分析
+    SLOW_QUERY_THRESHOLD_MS=200 慢查询阈值(毫秒)
+    SLOW_QUERY_LOG=slow_query.log 慢查询日志文件,为空时输出到标准错误
+"""
+import logging
+import math
+import os
+import re
+import threading
+from collections import deque
+from datetime import datetime
+from functools import lru_cache
+from typing import Deque, Dict, Optional, Tuple
+
+from sqlalchemy.engine import Engine
+
+from .metrics import add_query_observer, current_route, install_engine_hooks
+
+PROFILER_ENABLED = os.getenv("SQL_PROFILER", "1") != "0"
+SLOW_QUERY_THRESHOLD_MS = float(os.getenv("SLOW_QUERY_THRESHOLD_MS", "200"))
+SLOW_QUERY_LOG = os.getenv("SLOW_QUERY_LOG", "slow_query.log")
+
+# 每个指纹保留的耗时样本数(用于计算p99)
+SAMPLE_SIZE = 1000
+# 最多跟踪的 (指纹, 路由) 组合数,超出后新组合只计入dropped
+MAX_ENTRIES = 5000
+# 内存中保留的慢查询条数
+RECENT_SLOW_QUERIES = 100
+
+BACKGROUND_ROUTE = "<background>"
+SORT_KEYS = ("total", "p99", "count", "mean", "max")
+
+_STRING_LITERAL = re.compile(r"'(?:[^'\\]|\\.|'')*'")
+_NUMBER_LITERAL = re.compile(r"(?<![\w.])-?\d+(?:\.\d+)?\b")
+_IN_LIST = re.compile(r"\bIN\s*\(\s*(?:\?|%s|%\(\w+\)s)(?:\s*,\s*(?:\?|%s|%\(\w+\)s))*\s*\)", re.IGNORECASE)
+_VALUES_LIST = re.compile(r"\bVALUES\s*(\([^()]*\))(?:\s*,\s*\([^()]*\))+", re.IGNORECASE)
+_WHITESPACE = re.compile(r"\s+")
+
+slow_query_logger = logging.getLogger("app.slow_query")
+
+
+@lru_cache(maxsize=4096)
+def fingerprint(statement: str) -> str:
+    """
+    归一化SQL语句: 合并空白,字面量和占位符统一为?,IN (...) 和多行VALUES合并为一项
+    同一查询不同参数、不同IN列表长度得到相同的指纹
+    """
+    text = _WHITESPACE.sub(" ", statement).strip()
+    text = _STRING_LITERAL.sub("?", text)
+    text = _NUMBER_LITERAL.sub("?", text)
+    text = re.sub(r"%\(\w+\)s|%s", "?", text)
+    text = _IN_LIST.sub("IN (...)", text)
+    text = _VALUES_LIST.sub(r"VALUES \1, ...", text)
+    return text
+
+
+def _percentile(samples, fraction: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)]
+
+
+class _Entry:
+    __slots__ = ("count", "total", "max", "samples", "slow")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.samples: Deque[float] = deque(maxlen=SAMPLE_SIZE)
+        self.slow = 0
+
+
+class SQLProfiler:
+    """SQL执行统计,按 (指纹, 路由) 汇总"""
+
+    def __init__(self, threshold_ms: float = SLOW_QUERY_THRESHOLD_MS):
+        self.threshold = threshold_ms / 1000
+        self.started_at = datetime.now()
+        self.dropped = 0
+        self._entries: Dict[Tuple[str, str], _Entry] = {}
+        self._recent_slow: Deque[dict] = deque(maxlen=RECENT_SLOW_QUERIES)
+        self._lock = threading.Lock()
+
+    def record(self, statement: str, seconds: float, route: Optional[str]) -> None:
+        route = route or BACKGROUND_ROUTE
+        key = (fingerprint(statement), route)
+        slow = seconds >= self.threshold
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                if len(self._entries) >= MAX_ENTRIES:
+                    self.dropped += 1
+                else:
+                    entry = self._entries[key] = _Entry()
+            if entry is not None:
+                entry.count += 1
+                entry.total += seconds
+                entry.max = max(entry.max, seconds)
+                entry.samples.append(seconds)
+                entry.slow += slow
+            if slow:
+                self._recent_slow.append({
+                    "at": datetime.now().isoformat(timespec="seconds"),
+                    "route": route,
+                    "duration_ms": round(seconds * 1000, 1),
+                    "fingerprint": key[0]
+                })
+        if slow:
+            slow_query_logger.warning("%.1fms route=%s sql=%s", seconds * 1000, route, key[0])
+
+    def observe(self, statement: str, seconds: float) -> None:
+        """metrics的SQL耗时观察者,按当前请求的路由记录"""
+        self.record(statement, seconds, current_route())
+
+    def report(self, top: int = 20, sort: str = "total", route: Optional[str] = None) -> dict:
+        """按sort排序返回前top项;route用于只看某个路由"""
+        if sort not in SORT_KEYS:
+            raise ValueError(f"排序字段必须是: {', '.join(SORT_KEYS)}")
+        with self._lock:
+            snapshot = [
+                (fp, entry_route, entry.count, entry.total, entry.max, list(entry.samples), entry.slow)
+                for (fp, entry_route), entry in self._entries.items()
+                if route is None or entry_route == route
+            ]
+            recent_slow = list(self._recent_slow)
+            dropped = self.dropped
+
+        items = []
+        for fp, entry_route, count, total, maximum, samples, slow in snapshot:
+            items.append({
+                "fingerprint": fp,
+                "route": entry_route,
+                "count": count,
+                "total_ms": round(total * 1000, 2),
+                "mean_ms": round(total / count * 1000, 3),
+                "p99_ms": round(_percentile(samples, 0.99) * 1000, 3),
+                "max_ms": round(maximum * 1000, 3),
+                "slow_count": slow
+            })
+        sort_field = {"total": "total_ms", "p99": "p99_ms", "count": "count", "mean": "mean_ms", "max": "max_ms"}[sort]
+        items.sort(key=lambda item: item[sort_field], reverse=True)
+
+        return {
+            "since": self.started_at.isoformat(timespec="seconds"),
+            "slow_threshold_ms": self.threshold * 1000,
+            "tracked": len(snapshot),
+            "dropped": dropped,
+            "total_ms": round(sum(item["total_ms"] for item in items), 2),
+            "items": items[:top],
+            "recent_slow_queries": recent_slow[::-1]
+        }
+
+    def reset(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._recent_slow.clear()
+            self.dropped = 0
+            self.started_at = datetime.now()
+
+
+# 全局分析器
+sql_profiler = SQLProfiler()
+
+
+def _configure_logger() -> None:
+    if slow_query_logger.handlers:
+        return
+    handler = logging.FileHandler(SLOW_QUERY_LOG, encoding="utf-8", delay=True) if SLOW_QUERY_LOG else logging.StreamHandler()
+    handler.setFormatter(logging.Formatter("%(asctime)s %(message)s"))
+    slow_query_logger.addHandler(handler)
+    slow_query_logger.setLevel(logging.WARNING)
+    slow_query_logger.propagate = False
+
+
+def install_profiler(engine: Engine, profiler: SQLProfiler = sql_profiler) -> None:
+    """为引擎启用分析(SQL_PROFILER=0时不启用,重复调用无副作用)"""
+    if not PROFILER_ENABLED:
+        return
+    _configure_logger()
+    install_engine_hooks(engine)
+    add_query_observer(profiler.observe)
@@ -0,0 +1,38 @@
+"""
+列投影模块
+根据响应模型(schemas.py)的字段自动确定需要查询的列,
+列表接口只读取这些列并返回元组,不加载完整的ORM实体
+(不读取密码哈希等无关字段,也不经过identity map和关系属性)
+"""
+from functools import lru_cache
+from typing import List, Tuple, Type
+
+from pydantic import BaseModel
+from sqlalchemy.orm import Session, Query
+
+
+@lru_cache(maxsize=None)
+def _projection(schema: Type[BaseModel], models: Tuple[type, ...]) -> tuple:
+    columns = []
+    for name in schema.model_fields:
+        for model in models:
+            column = model.__table__.c.get(name)
+            if column is not None:
+                columns.append(getattr(model, name))
+                break
+        else:
+            raise ValueError(f"{schema.__name__}.{name} 在 {', '.join(m.__name__ for m in models)} 中没有对应的列")
+    return tuple(columns)
+
+
+def columns_for(schema: Type[BaseModel], *models: type) -> List:
+    """
+    返回响应模型各字段对应的模型列(按字段顺序)
+    传入多个模型时(用于联表查询),字段按模型顺序依次查找,取第一个匹配的列
+    """
+    return list(_projection(schema, models))
+
+
+def project(db: Session, schema: Type[BaseModel], *models: type) -> Query:
+    """构造只查询响应模型所需列的查询,结果行可直接用rows_to_dicts转换"""
+    return db.query(*_projection(schema, models))
@@ -0,0 +1,102 @@
+"""
+SQL查询计数工具
+用于在测试中断言接口的查询次数,防止接口退化为N+1查询模式
+
+用法示例:
+    with assert_max_queries(3):
+        client.get("/api/admin/dorm-change?limit=200", headers=headers)
+
+    # 分页大小变化时查询次数必须保持不变
+    assert_constant_queries(
+        lambda limit: client.get(f"/api/admin/dorm-change?limit={limit}", headers=headers),
+        1, 200
+    )
+"""
+from contextlib import contextmanager
+from typing import Any, Callable, Iterator, List, Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from .database import engine as default_engine
+
+
+class QueryCounter:
+    """记录一段代码执行期间发出的SQL语句"""
+
+    def __init__(self):
+        self.statements: List[str] = []
+        # 与statements一一对应的绑定参数
+        self.parameters: List[Any] = []
+
+    @property
+    def count(self) -> int:
+        return len(self.statements)
+
+    def report(self) -> str:
+        """格式化输出已执行的语句,便于定位多余的查询"""
+        return "\n".join(
+            f"  {i}. {' '.join(statement.split())}"
+            for i, statement in enumerate(self.statements, 1)
+        )
+
+
+@contextmanager
+def count_queries(engine: Optional[Engine] = None) -> Iterator[QueryCounter]:
+    """
+    统计上下文内通过指定引擎执行的SQL语句数量
+    默认监听应用使用的全局引擎
+    """
+    target = engine or default_engine
+    counter = QueryCounter()
+
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        counter.statements.append(statement)
+        counter.parameters.append(None if executemany else parameters)
+
+    event.listen(target, "before_cursor_execute", _before_cursor_execute)
+    try:
+        yield counter
+    finally:
+        event.remove(target, "before_cursor_execute", _before_cursor_execute)
+
+
+@contextmanager
+def assert_max_queries(limit: int, engine: Optional[Engine] = None) -> Iterator[QueryCounter]:
+    """
+    断言上下文内执行的SQL语句不超过limit条
+    超出时抛出AssertionError并列出全部语句
+    """
+    with count_queries(engine) as counter:
+        yield counter
+
+    if counter.count > limit:
+        raise AssertionError(
+            f"预期最多执行 {limit} 条SQL语句,实际执行了 {counter.count} 条:\n{counter.report()}"
+        )
+
+
+def assert_constant_queries(
+    call: Callable[[int], object],
+    *sizes: int,
+    engine: Optional[Engine] = None
+) -> int:
+    """
+    用不同的规模参数(如分页大小)调用同一接口,断言查询次数与规模无关
+    查询次数随结果行数增长即说明存在N+1查询
+    返回每次调用的查询次数
+    """
+    if len(sizes) < 2:
+        raise ValueError("至少需要提供两个不同的规模参数")
+
+    counts = []
+    for size in sizes:
+        with count_queries(engine) as counter:
+            call(size)
+        counts.append(counter.count)
+
+    if len(set(counts)) != 1:
+        detail = ", ".join(f"规模{size}: {count}条" for size, count in zip(sizes, counts))
+        raise AssertionError(f"查询次数随结果规模变化,疑似N+1查询 ({detail})")
+
+    return counts[0]
@@ -0,0 +1,267 @@
+"""
+执行计划检查工具
+直接调用各路由的端点函数,捕获实际执行的SQL并逐条EXPLAIN,
+发现对大表的全表扫描(type=ALL)时以非零状态退出,可在修改查询或索引后、或在CI中运行
+
+所有用例在同一个外层事务中执行,结束后整体回滚,写操作(注册、提交申请等)不会留下数据
+
+用法(在backend目录下运行,需要已导入数据的数据库):
+    python -m app.query_plans            # 只输出有问题的查询
+    python -m app.query_plans -v         # 输出全部执行计划
+    python -m app.query_plans --min-rows 500
+
+tests/test_query_plans.py 在pytest中运行同样的检查
+"""
+import argparse
+import asyncio
+import inspect
+import random
+import sys
+from dataclasses import dataclass
+from typing import Any, Callable, List, Optional, Tuple
+
+from fastapi import HTTPException
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session
+
+from . import models, schemas
+from .database import engine
+from .query_counter import count_queries
+from .routers import admin, auth as auth_routes, students
+
+# 行数固定且很少的表,全表扫描不视为问题
+SMALL_TABLES = {"administrators", "dormitory_occupancy"}
+# 预估扫描行数不超过该值的全表扫描不视为问题
+DEFAULT_MIN_ROWS = 1000
+
+
+@dataclass
+class Context:
+    """用例执行所需的样本数据"""
+    admin: models.Administrator
+    student: models.Student
+    dorm_id: int
+    target_dorm_id: int
+
+
+@dataclass
+class PlanCase:
+    name: str
+    call: Callable[[Session, Context], Any]
+    # 本用例允许全表扫描的表(如没有筛选条件的分页列表)
+    allow_full_scan: Tuple[str, ...] = ()
+
+
+def _call(func, **kwargs):
+    """调用端点函数,async端点在新的事件循环中执行;业务校验失败(HTTPException)忽略"""
+    try:
+        result = func(**kwargs)
+        if inspect.iscoroutine(result):
+            result = asyncio.run(result)
+        return result
+    except HTTPException:
+        return None
+
+
+def _admin_case(name: str, func, allow_full_scan: Tuple[str, ...] = (), **kwargs) -> PlanCase:
+    return PlanCase(
+        name,
+        lambda db, ctx: _call(func, current_admin=ctx.admin, db=db, **kwargs),
+        allow_full_scan
+    )
+
+
+def _student_case(name: str, func, **kwargs) -> PlanCase:
+    return PlanCase(name, lambda db, ctx: _call(func, current_student=ctx.student, db=db, **kwargs))
+
+
+def _register(db: Session, ctx: Context):
+    student_id = f"9{random.randrange(10 ** 8):08d}"
+    return _call(
+        auth_routes.register,
+        student_data=schemas.StudentRegister(
+            student_id=student_id,
+            password="plan-check",
+            name="计划检查",
+            gender=ctx.student.gender,
+            nationality="China",
+            college=ctx.student.college,
+            enrollment_year=2024,
+            email=f"{student_id}@link.cuhk.edu.cn"
+        ),
+        db=db
+    )
+
+
+def build_cases() -> List[PlanCase]:
+    page = {"skip": 0, "limit": 50}
+    return [
+        # 管理员列表
+        _admin_case(
+            "admin.get_all_dormitories(gender_type, has_vacancy)", admin.get_all_dormitories,
+            building=None, room_no=None, gender_type="男", has_vacancy=True, **page
+        ),
+        _admin_case(
+            "admin.get_all_dormitories(building)", admin.get_all_dormitories,
+            building="MA", room_no=None, gender_type=None, has_vacancy=None, **page
+        ),
+        PlanCase(
+            "admin.get_dormitory_students",
+            lambda db, ctx: _call(admin.get_dormitory_students, dorm_id=ctx.dorm_id, current_admin=ctx.admin, db=db)
+        ),
+        PlanCase(
+            "admin.get_all_students(search=学号前缀)",
+            lambda db, ctx: _call(
+                admin.get_all_students, search=ctx.student.student_id[:5], college=None, gender=None,
+                enrollment_year=None, current_admin=ctx.admin, db=db, **page
+            )
+        ),
+        PlanCase(
+            "admin.get_all_students(search=姓名)",
+            lambda db, ctx: _call(
+                admin.get_all_students, search=ctx.student.name, college=None, gender=None,
+                enrollment_year=None, current_admin=ctx.admin, db=db, **page
+            )
+        ),
+        _admin_case(
+            "admin.get_dorm_change_requests(pending)", admin.get_dorm_change_requests,
+            status_filter="pending", **page
+        ),
+        _admin_case(
+            "admin.get_maintenance_requests(pending)", admin.get_maintenance_requests,
+            status_filter="pending", priority=None, **page
+        ),
+        _admin_case(
+            "admin.get_all_bills(unpaid)", admin.get_all_bills,
+            dorm_id=None, status_filter="unpaid", bill_type=None, **page
+        ),
+        PlanCase(
+            "admin.get_all_bills(dorm_id)",
+            lambda db, ctx: _call(
+                admin.get_all_bills, dorm_id=ctx.dorm_id, status_filter=None, bill_type=None,
+                current_admin=ctx.admin, db=db, **page
+            )
+        ),
+        # 学生端
+        _student_case("students.get_roommates", students.get_roommates),
+        _student_case("students.get_student_bills", students.get_student_bills),
+        _student_case("students.get_dorm_change_requests", students.get_dorm_change_requests),
+        _student_case("students.get_maintenance_requests", students.get_maintenance_requests),
+        PlanCase(
+            "students.query_dormitories",
+            lambda db, ctx: _call(
+                students.query_dormitories, building_no=None, room_no="101", exact=False, limit=20,
+                current_student=ctx.student, db=db
+            )
+        ),
+        # 写操作中的查询(外层事务最终回滚)
+        PlanCase(
+            "students.create_dorm_change_request",
+            lambda db, ctx: _call(
+                students.create_dorm_change_request,
+                request_data=schemas.DormChangeRequestCreate(target_dorm_id=ctx.target_dorm_id, reason="执行计划检查"),
+                current_student=ctx.student,
+                db=db
+            )
+        ),
+        PlanCase("auth.register", _register),
+    ]
+
+
+def _load_context(db: Session) -> Context:
+    admin_user = db.query(models.Administrator).first()
+    student = db.query(models.Student).filter(models.Student.dorm_id.isnot(None)).first()
+    if admin_user is None or student is None:
+        raise RuntimeError("数据库中缺少管理员或已分配宿舍的学生,请先导入测试数据")
+
+    target = db.query(models.Dormitory.dorm_id).filter(
+        models.Dormitory.gender_type == student.gender,
+        models.Dormitory.dorm_id != student.dorm_id,
+        models.Dormitory.occupied_beds < models.Dormitory.total_beds
+    ).first()
+    return Context(
+        admin=admin_user,
+        student=student,
+        dorm_id=student.dorm_id,
+        target_dorm_id=target.dorm_id if target else student.dorm_id
+    )
+
+
+def explain(connection: Connection, statement: str, parameters) -> List[dict]:
+    result = connection.exec_driver_sql("EXPLAIN " + statement, parameters or ())
+    return [dict(row._mapping) for row in result]
+
+
+def find_full_scans(plan: List[dict], case: PlanCase, min_rows: int) -> List[dict]:
+    """返回执行计划中需要关注的全表扫描行"""
+    problems = []
+    for row in plan:
+        table = row.get("table") or ""
+        if row.get("type") != "ALL" or table.startswith("<"):
+            continue
+        if table in SMALL_TABLES or table in case.allow_full_scan:
+            continue
+        if (row.get("rows") or 0) <= min_rows:
+            continue
+        problems.append(row)
+    return problems
+
+
+def _format_plan_row(row: dict) -> str:
+    return (
+        f"table={row.get('table')} type={row.get('type')} key={row.get('key')} "
+        f"rows={row.get('rows')} extra={row.get('Extra')}"
+    )
+
+
+def run_checks(min_rows: int = DEFAULT_MIN_ROWS, verbose: bool = False, cases: Optional[List[PlanCase]] = None) -> int:
+    """执行全部用例并检查执行计划,返回发现问题的查询数"""
+    cases = cases if cases is not None else build_cases()
+    connection = engine.connect()
+    outer = connection.begin()
+    # 端点内部的commit只释放保存点,外层事务结束时统一回滚
+    db = Session(bind=connection, join_transaction_mode="create_savepoint")
+    problem_count = 0
+    try:
+        ctx = _load_context(db)
+        for case in cases:
+            with count_queries(engine) as counter:
+                case.call(db, ctx)
+
+            selects = [
+                (statement, parameters)
+                for statement, parameters in zip(counter.statements, counter.parameters)
+                if statement.lstrip().upper().startswith("SELECT")
+            ]
+            print(f"{case.name}: {len(selects)} 条查询")
+            for statement, parameters in selects:
+                plan = explain(connection, statement, parameters)
+                problems = find_full_scans(plan, case, min_rows)
+                if problems or verbose:
+                    print(f"  {' '.join(statement.split())[:300]}")
+                    for row in plan:
+                        marker = "  ❌ " if row in problems else "     "
+                        print(f"{marker}{_format_plan_row(row)}")
+                problem_count += bool(problems)
+    finally:
+        db.close()
+        outer.rollback()
+        connection.close()
+    return problem_count
+
+
+def main():
+    parser = argparse.ArgumentParser(description="检查路由查询的执行计划中是否出现全表扫描")
+    parser.add_argument("-v", "--verbose", action="store_true", help="输出全部执行计划")
+    parser.add_argument("--min-rows", type=int, default=DEFAULT_MIN_ROWS, help="预估行数超过该值的全表扫描才报告")
+    args = parser.parse_args()
+
+    problem_count = run_checks(min_rows=args.min_rows, verbose=args.verbose)
+    if problem_count:
+        print(f"\n❌ 发现 {problem_count} 条查询存在全表扫描")
+        sys.exit(1)
+    print("\n✅ 未发现全表扫描")
+
+
+if __name__ == "__main__":
+    main()
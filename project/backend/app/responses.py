@@ -0,0 +1,55 @@
+"""
+快速JSON响应模块
+列表接口直接返回按列查询得到的行数据,由orjson序列化,
+跳过FastAPI对ORM对象逐个调用jsonable_encoder的开销
+未安装orjson时回退到标准库json
+"""
+import json
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, Iterable, List
+
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson为可选依赖
+    orjson = None
+
+
+def _default(value):
+    """orjson/json无法直接处理的类型"""
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    raise TypeError(f"无法序列化的类型: {type(value).__name__}")
+
+
+def dumps(content: Any) -> bytes:
+    """将内容序列化为JSON字节串"""
+    if orjson is not None:
+        return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(
+        content,
+        default=_default,
+        ensure_ascii=False,
+        allow_nan=False,
+        separators=(",", ":")
+    ).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    基于orjson的JSON响应
+    内容应为dict/list/基本类型组成的结构,Decimal转为浮点数,日期转为ISO格式字符串
+    """
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+def rows_to_dicts(rows: Iterable) -> List[dict]:
+    """将按列查询返回的Row转换为字典列表"""
+    return [dict(row._mapping) for row in rows]
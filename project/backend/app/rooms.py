@@ -0,0 +1,160 @@
+"""
+房间目录模块
+在内存中维护 楼栋 -> 楼层 -> 房间 的目录,并为房间号建立有序数组和后缀数组,
+支持前缀和子串搜索,每次查询只需几次二分查找
+目录只保存房间的静态信息(ID、楼栋、楼层、房间号),床位数等实时数据仍按宿舍ID从数据库读取
+
+目录在应用启动时构建,宿舍批量导入后调用 load 重建
+"""
+import threading
+from bisect import bisect_left
+from typing import Dict, Iterable, List, NamedTuple, Optional
+
+from sqlalchemy.orm import Session
+
+from . import models
+
+
+class RoomEntry(NamedTuple):
+    dorm_id: int
+    building_no: str
+    floor_no: int
+    room_no: str
+
+
+def _key(text: str) -> str:
+    return text.strip().upper()
+
+
+class _Snapshot:
+    """目录的只读快照,更新时整体替换,查询无需加锁"""
+
+    def __init__(self, entries: Iterable[RoomEntry]):
+        self.entries: List[RoomEntry] = sorted(entries, key=lambda e: _key(e.room_no))
+        self.room_keys: List[str] = [_key(e.room_no) for e in self.entries]
+        # 后缀数组: (后缀, 房间下标),按后缀排序
+        suffixes = sorted(
+            (key[start:], index)
+            for index, key in enumerate(self.room_keys)
+            for start in range(len(key))
+        )
+        self.suffix_keys: List[str] = [suffix for suffix, _ in suffixes]
+        self.suffix_rooms: List[int] = [index for _, index in suffixes]
+
+        self.tree: Dict[str, Dict[int, List[RoomEntry]]] = {}
+        for entry in sorted(self.entries, key=lambda e: (e.building_no, e.floor_no, e.room_no)):
+            self.tree.setdefault(entry.building_no, {}).setdefault(entry.floor_no, []).append(entry)
+
+    def prefix_range(self, term: str) -> range:
+        start = bisect_left(self.room_keys, term)
+        end = bisect_left(self.room_keys, term + "\uffff", start)
+        return range(start, end)
+
+    def substring_matches(self, term: str) -> List[int]:
+        start = bisect_left(self.suffix_keys, term)
+        end = bisect_left(self.suffix_keys, term + "\uffff", start)
+        # 同一房间号可能有多个后缀命中,去重后按房间号顺序返回
+        return sorted(set(self.suffix_rooms[start:end]))
+
+
+class RoomDirectory:
+    """
+    房间目录
+    search() 返回的结果中,前缀命中的房间排在子串命中的房间之前,各自按房间号排序
+    """
+
+    def __init__(self):
+        self._snapshot = _Snapshot([])
+        self._loaded = False
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self) -> bool:
+        return self._loaded
+
+    def __len__(self) -> int:
+        return len(self._snapshot.entries)
+
+    def load(self, db: Session) -> None:
+        """从宿舍表全量构建目录"""
+        rows = db.query(
+            models.Dormitory.dorm_id,
+            models.Dormitory.building_no,
+            models.Dormitory.floor_no,
+            models.Dormitory.room_no
+        ).all()
+        snapshot = _Snapshot(RoomEntry(*row) for row in rows)
+        with self._lock:
+            self._snapshot = snapshot
+            self._loaded = True
+
+    def ensure_loaded(self, db: Session) -> None:
+        if not self._loaded:
+            self.load(db)
+
+    def buildings(self) -> Dict[str, List[int]]:
+        """各楼栋的楼层列表"""
+        return {
+            building_no: sorted(floors)
+            for building_no, floors in sorted(self._snapshot.tree.items())
+        }
+
+    def rooms(self, building_no: Optional[str] = None, floor_no: Optional[int] = None) -> List[RoomEntry]:
+        """按楼栋、楼层列出房间"""
+        tree = self._snapshot.tree
+        buildings = [building_no] if building_no is not None else sorted(tree)
+        result = []
+        for building in buildings:
+            floors = tree.get(building, {})
+            for floor in ([floor_no] if floor_no is not None else sorted(floors)):
+                result.extend(floors.get(floor, []))
+        return result
+
+    def search(
+        self,
+        term: str,
+        building_no: Optional[str] = None,
+        limit: Optional[int] = None,
+        prefix_only: bool = False,
+        exact: bool = False
+    ) -> List[RoomEntry]:
+        """
+        按房间号搜索(不区分大小写)
+        prefix_only为True时只做前缀匹配,exact为True时只返回房间号完全相同的房间;
+        building_no用于限定楼栋;limit限制返回数量
+        """
+        term = _key(term)
+        snapshot = self._snapshot
+        if not term:
+            return self.rooms(building_no)[:limit]
+
+        prefix = snapshot.prefix_range(term)
+        if exact:
+            indexes = [i for i in prefix if snapshot.room_keys[i] == term]
+        else:
+            indexes = list(prefix)
+        if not (prefix_only or exact):
+            indexes += [i for i in snapshot.substring_matches(term) if i not in prefix]
+
+        result = []
+        for index in indexes:
+            entry = snapshot.entries[index]
+            if building_no is not None and entry.building_no != building_no:
+                continue
+            result.append(entry)
+            if limit is not None and len(result) >= limit:
+                break
+        return result
+
+    def search_ids(
+        self,
+        term: str,
+        building_no: Optional[str] = None,
+        limit: Optional[int] = None,
+        exact: bool = False
+    ) -> List[int]:
+        return [entry.dorm_id for entry in self.search(term, building_no, limit, exact=exact)]
+
+
+# 全局房间目录
+room_directory = RoomDirectory()
@@ -1,14 +1,23 @@
 """
 管理员功能API路由
 """
-from fastapi import APIRouter, Depends, HTTPException, status, Query
-from sqlalchemy.orm import Session
-from sqlalchemy import func, and_, or_
+from fastapi import APIRouter, Depends, HTTPException, status, Query, File, UploadFile
+from sqlalchemy.orm import Session, aliased
+from sqlalchemy import func, and_, case, select, true
+from sqlalchemy.exc import IntegrityError
 from typing import List, Optional
 from datetime import datetime
 
-from .. import schemas, auth, models
+from .. import schemas, auth, models, beds, billing, bulk_assign, dorm_changes, events, importer, swap_matching
 from ..database import get_db
+from ..cache import STATISTICS_CACHE_TTL, STATISTICS_TAGS, cache, invalidate_statistics
+from ..spreadsheet import iter_rows
+from ..responses import FastJSONResponse, rows_to_dicts
+from ..projections import project
+from ..search import apply_student_search
+from ..rooms import room_directory
+from ..profiler import sql_profiler
+from ..tasks import task_queue
 
 router = APIRouter(prefix="/api/admin", tags=["管理员功能"])
 
@@ -17,7 +26,7 @@ router = APIRouter(prefix="/api/admin", tags=["管理员功能"])
 # 宿舍管理
 # ============================================================================
 
-@router.get("/dormitories", summary="查看所有宿舍")
+@router.get("/dormitories", summary="查看所有宿舍", response_class=FastJSONResponse)
 async def get_all_dormitories(
     building: Optional[str] = Query(None, description="按楼栋筛选"),
     room_no: Optional[str] = Query(None, description="按房间号筛选"),
@@ -30,14 +39,27 @@ async def get_all_dormitories(
 ):
     """
     查看所有宿舍信息,支持筛选和分页
+    结果按筛选条件缓存,宿舍表有写入后自动失效
     """
-    query = db.query(models.Dormitory)
+    return FastJSONResponse(cache.get_or_set(
+        "admin_dormitories",
+        (building, room_no, gender_type, has_vacancy, skip, limit),
+        lambda: _list_dormitories(db, building, room_no, gender_type, has_vacancy, skip, limit),
+        tags=("dormitories",)
+    ))
+
+
+def _list_dormitories(db: Session, building, room_no, gender_type, has_vacancy, skip: int, limit: int) -> dict:
+    # 只查询响应模型需要的列,返回元组而不构造ORM对象
+    query = project(db, schemas.DormitoryInfo, models.Dormitory)
     
     # 应用筛选条件
     if building:
         query = query.filter(models.Dormitory.building_no == building)
     if room_no:
-        query = query.filter(models.Dormitory.room_no.like(f"%{room_no}%"))
+        # 房间号子串搜索由内存目录完成,数据库只按主键取行
+        room_directory.ensure_loaded(db)
+        query = query.filter(models.Dormitory.dorm_id.in_(room_directory.search_ids(room_no, building)))
     if gender_type:
         query = query.filter(models.Dormitory.gender_type == gender_type)
     if has_vacancy is True:
@@ -48,7 +70,7 @@ async def get_all_dormitories(
     
     return {
         "total": total,
-        "items": dormitories,
+        "items": rows_to_dicts(dormitories),
         "skip": skip,
         "limit": limit
     }
@@ -73,10 +95,10 @@ async def get_dormitory_detail(
             detail="宿舍不存在"
         )
     
-    # 获取该宿舍的所有学生
-    students = db.query(models.Student).filter(
+    # 获取该宿舍的所有学生(只查询列表需要的列,不返回密码)
+    students = rows_to_dicts(project(db, schemas.StudentListItem, models.Student).filter(
         models.Student.dorm_id == dorm_id
-    ).all()
+    ).all())
     
     return {
         "dormitory": dormitory,
@@ -105,10 +127,10 @@ async def get_dormitory_students(
             detail="宿舍不存在"
         )
     
-    # 获取该宿舍的所有学生
-    students = db.query(models.Student).filter(
+    # 获取该宿舍的所有学生(只查询列表需要的列,不返回密码)
+    students = rows_to_dicts(project(db, schemas.StudentListItem, models.Student).filter(
         models.Student.dorm_id == dorm_id
-    ).all()
+    ).all())
     
     return students
 
@@ -146,7 +168,7 @@ async def update_dormitory(
 # 学生管理
 # ============================================================================
 
-@router.get("/students", summary="查看所有学生")
+@router.get("/students", summary="查看所有学生", response_class=FastJSONResponse)
 async def get_all_students(
     search: Optional[str] = Query(None, description="搜索学号或姓名"),
     college: Optional[str] = Query(None, description="按学院筛选"),
@@ -160,17 +182,10 @@ async def get_all_students(
     """
     查看所有学生信息,支持搜索、筛选和分页
     """
-    query = db.query(models.Student)
+    query = project(db, schemas.StudentListItem, models.Student)
     
-    # 搜索功能
-    if search:
-        search_pattern = f"%{search}%"
-        query = query.filter(
-            or_(
-                models.Student.student_id.like(search_pattern),
-                models.Student.name.like(search_pattern)
-            )
-        )
+    # 搜索功能: 学号前缀走主键索引,姓名走FULLTEXT ngram索引
+    query, search_order = apply_student_search(query, search)
     
     # 应用筛选条件
     if college:
@@ -181,14 +196,82 @@ async def get_all_students(
         query = query.filter(models.Student.enrollment_year == enrollment_year)
     
     total = query.count()
+    if search_order:
+        query = query.order_by(*search_order)
     students = query.offset(skip).limit(limit).all()
     
-    return {
+    return FastJSONResponse({
         "total": total,
-        "items": students,
+        "items": rows_to_dicts(students),
         "skip": skip,
         "limit": limit
-    }
+    })
+
+
+@router.post("/students/bulk-assign", summary="新生批量分配宿舍")
+def bulk_assign_students(
+    file: UploadFile = File(..., description="新生名单文件(xlsx/csv)"),
+    buildings: Optional[List[str]] = Query(None, description="限定可分配的楼栋"),
+    group_by_college: bool = Query(True, description="同学院学生优先同住"),
+    dry_run: bool = Query(False, description="只计算分配方案,不写入数据库"),
+    current_admin: models.Administrator = Depends(auth.get_current_admin),
+    db: Session = Depends(get_db)
+):
+    """
+    上传整批新生名单,按性别、楼栋和学院分组在内存中计算宿舍分配,
+    在一个事务内批量写入学生记录和床位计数,返回分配结果和吞吐量
+    """
+    try:
+        report = bulk_assign.run_bulk_assignment(
+            db,
+            iter_rows(file.file, file.filename or ""),
+            buildings=buildings,
+            group_by_college=group_by_college,
+            dry_run=dry_run
+        )
+    except (ValueError, RuntimeError) as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    
+    if report["assigned"] and not dry_run:
+        invalidate_statistics()
+    
+    return report
+
+
+@router.post("/import/{kind}", summary="批量导入学生或宿舍数据")
+def import_records(
+    kind: str,
+    file: UploadFile = File(..., description="数据文件(xlsx/csv)"),
+    chunk_size: int = Query(importer.DEFAULT_CHUNK_SIZE, ge=100, le=10000, description="每块行数"),
+    current_admin: models.Administrator = Depends(auth.get_current_admin),
+    db: Session = Depends(get_db)
+):
+    """
+    流式读取上传的xlsx/csv文件,按块校验并批量插入或更新记录
+    kind为students或dormitories;校验失败的行会被跳过并在结果中列出
+    """
+    import_func = importer.IMPORTERS.get(kind)
+    if import_func is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="导入类型必须是students或dormitories"
+        )
+    
+    try:
+        report = import_func(db, iter_rows(file.file, file.filename or ""), chunk_size=chunk_size)
+    except (ValueError, RuntimeError) as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    
+    if report["written"]:
+        invalidate_statistics()
+    
+    return report
 
 
 @router.get("/students/{student_id}", summary="查看学生详情")
@@ -224,7 +307,7 @@ async def get_student_detail(
 
 
 @router.put("/students/{student_id}", summary="更新学生信息")
-async def update_student_info(
+def update_student_info(
     student_id: str,
     student_update: schemas.AdminStudentUpdate,
     current_admin: models.Administrator = Depends(auth.get_current_admin),
@@ -233,10 +316,11 @@ async def update_student_info(
     """
     管理员更新学生信息
     可以修改姓名、性别、国籍、学院、入学年份、邮箱、宿舍分配
+    修改宿舍时学生行加锁,床位通过条件更新原子调整,目标宿舍已满时返回400
     """
     student = db.query(models.Student).filter(
         models.Student.student_id == student_id
-    ).first()
+    ).with_for_update().first()
     
     if not student:
         raise HTTPException(
@@ -265,68 +349,35 @@ async def update_student_info(
                 detail="该邮箱已被其他学生使用"
             )
     
-    # 如果修改宿舍
-    if "dorm_id" in update_data:
-        new_dorm_id = update_data["dorm_id"]
-        old_dorm_id = student.dorm_id
-        
-        # 如果是分配新宿舍(不是清除宿舍)
-        if new_dorm_id is not None:
-            new_dorm = db.query(models.Dormitory).filter(
-                models.Dormitory.dorm_id == new_dorm_id
-            ).first()
-            
-            if not new_dorm:
-                raise HTTPException(
-                    status_code=status.HTTP_400_BAD_REQUEST,
-                    detail="目标宿舍不存在"
-                )
-            
-            # 检查性别是否匹配
-            student_gender = update_data.get("gender", student.gender)
-            if new_dorm.gender_type != student_gender:
-                raise HTTPException(
-                    status_code=status.HTTP_400_BAD_REQUEST,
-                    detail=f"目标宿舍性别类型({new_dorm.gender_type})与学生性别({student_gender})不匹配"
-                )
-            
-            # 检查是否有空位(如果不是原宿舍)
-            if new_dorm_id != old_dorm_id and new_dorm.occupied_beds >= new_dorm.total_beds:
-                raise HTTPException(
-                    status_code=status.HTTP_400_BAD_REQUEST,
-                    detail="目标宿舍已满"
-                )
-        
-        # 更新床位计数
-        if old_dorm_id != new_dorm_id:
-            # 减少原宿舍床位
-            if old_dorm_id:
-                old_dorm = db.query(models.Dormitory).filter(
-                    models.Dormitory.dorm_id == old_dorm_id
-                ).first()
-                if old_dorm and old_dorm.occupied_beds > 0:
-                    old_dorm.occupied_beds -= 1
-            
-            # 增加新宿舍床位
-            if new_dorm_id:
-                new_dorm = db.query(models.Dormitory).filter(
-                    models.Dormitory.dorm_id == new_dorm_id
-                ).first()
-                if new_dorm:
-                    new_dorm.occupied_beds += 1
+    # 如果修改宿舍或性别: 校验(目标)宿舍的性别类型,宿舍变化时原子调整新旧宿舍的床位数
+    if "dorm_id" in update_data or "gender" in update_data:
+        try:
+            beds.move_student(
+                db,
+                student,
+                update_data.pop("dorm_id", student.dorm_id),
+                gender=update_data.get("gender", student.gender)
+            )
+        except ValueError as e:
+            db.rollback()
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=str(e)
+            )
     
     # 应用更新
     for field, value in update_data.items():
         setattr(student, field, value)
     
     db.commit()
+    invalidate_statistics()
     db.refresh(student)
     
     return student
 
 
 @router.delete("/students/{student_id}", summary="删除学生")
-async def delete_student(
+def delete_student(
     student_id: str,
     current_admin: models.Administrator = Depends(auth.get_current_admin),
     db: Session = Depends(get_db)
@@ -337,7 +388,7 @@ async def delete_student(
     """
     student = db.query(models.Student).filter(
         models.Student.student_id == student_id
-    ).first()
+    ).with_for_update().first()
     
     if not student:
         raise HTTPException(
@@ -347,14 +398,11 @@ async def delete_student(
     
     # 如果学生有宿舍,减少宿舍床位计数
     if student.dorm_id:
-        dorm = db.query(models.Dormitory).filter(
-            models.Dormitory.dorm_id == student.dorm_id
-        ).first()
-        if dorm and dorm.occupied_beds > 0:
-            dorm.occupied_beds -= 1
+        beds.move_student(db, student, None)
     
     db.delete(student)
     db.commit()
+    invalidate_statistics()
     
     return {"message": "学生删除成功"}
 
@@ -373,17 +421,24 @@ async def get_dorm_change_requests(
 ):
     """
     查看所有宿舍调换申请（包含学生和宿舍信息）
+    当前宿舍与目标宿舍通过别名二次连接一次查出,避免逐行查询目标宿舍(N+1)
     """
+    target_dorm = aliased(models.Dormitory, name="target_dorm")
+    
     query = db.query(
         models.DormChangeRequest,
         models.Student.name.label('student_name'),
-        models.Dormitory.room_no.label('current_dorm')
+        models.Dormitory.room_no.label('current_dorm'),
+        target_dorm.room_no.label('target_dorm')
     ).join(
         models.Student,
         models.DormChangeRequest.student_id == models.Student.student_id
     ).outerjoin(
         models.Dormitory,
         models.Student.dorm_id == models.Dormitory.dorm_id
+    ).outerjoin(
+        target_dorm,
+        models.DormChangeRequest.target_dorm_id == target_dorm.dorm_id
     )
     
     if status_filter:
@@ -393,19 +448,14 @@ async def get_dorm_change_requests(
         models.DormChangeRequest.created_at.desc()
     ).offset(skip).limit(limit).all()
     
-    # 获取目标宿舍信息
     items = []
-    for request, student_name, current_dorm in results:
-        target_dorm = db.query(models.Dormitory).filter(
-            models.Dormitory.dorm_id == request.target_dorm_id
-        ).first()
-        
+    for request, student_name, current_dorm, target_room_no in results:
         items.append({
             "request_id": request.request_id,
             "student_id": request.student_id,
             "student_name": student_name,
             "current_dorm": current_dorm or "未分配",
-            "target_dorm": target_dorm.room_no if target_dorm else "未知",
+            "target_dorm": target_room_no or "未知",
             "reason": request.reason,
             "status": request.status,
             "admin_comment": request.admin_comment,
@@ -416,90 +466,105 @@ async def get_dorm_change_requests(
     return items
 
 
-@router.put("/dorm-change-requests/{request_id}", summary="处理调换申请")
-async def process_dorm_change_request(
-    request_id: int,
-    action: str = Query(..., description="操作: approve/reject"),
-    admin_comment: Optional[str] = Query(None, max_length=500, description="管理员备注"),
+@router.post("/dorm-change/batch", summary="批量处理调换申请")
+def process_dorm_change_batch(
+    batch: schemas.DormChangeBatchAction,
     current_admin: models.Administrator = Depends(auth.get_current_admin),
     db: Session = Depends(get_db)
 ):
     """
-    审批或拒绝宿舍调换申请
+    一次审批或拒绝多条调换申请,整批在一个事务内提交
+    审批时按整批的迁入迁出净变化校验容量,互换的申请可以同时通过;
+    未能处理的申请保持待处理状态,并在items中说明原因
     """
-    if action not in ["approve", "reject"]:
+    try:
+        report = dorm_changes.process_batch(
+            db,
+            batch.request_ids,
+            batch.action,
+            admin_id=current_admin.admin_id,
+            admin_comment=batch.admin_comment
+        )
+    except ValueError as e:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
-            detail="操作必须是'approve'或'reject'"
+            detail=str(e)
         )
     
-    request = db.query(models.DormChangeRequest).filter(
-        models.DormChangeRequest.request_id == request_id
-    ).first()
+    if report["processed"]:
+        invalidate_statistics()
+        events.publish_dorm_change_report(report)
     
-    if not request:
+    return report
+
+
+@router.get("/dorm-change/matching", summary="调换撮合方案")
+def get_dorm_change_matching(
+    limit: int = Query(100, ge=0, le=1000, description="返回的链和环数量"),
+    current_admin: models.Administrator = Depends(auth.get_current_admin),
+    db: Session = Depends(get_db)
+):
+    """
+    在全部待处理申请中寻找可同时执行的互换环和空床位调换链(只读)
+    request_ids为方案中的全部申请,可直接提交给批量审批接口
+    """
+    return FastJSONResponse(swap_matching.plan_matching(db, group_limit=limit))
+
+
+@router.post("/dorm-change/matching/apply", summary="执行调换撮合")
+def apply_dorm_change_matching(
+    admin_comment: Optional[str] = Query(None, max_length=500, description="管理员备注"),
+    current_admin: models.Administrator = Depends(auth.get_current_admin),
+    db: Session = Depends(get_db)
+):
+    """计算撮合方案并在一个事务内批准其中全部申请,items列出执行时因数据变化未能通过的申请"""
+    report = swap_matching.apply_matching(db, admin_id=current_admin.admin_id, admin_comment=admin_comment)
+    if report["processed"]:
+        invalidate_statistics()
+        events.publish_dorm_change_report(report)
+    return FastJSONResponse(report)
+
+
+def _decide_dorm_change(db: Session, request_id: int, action: str, admin_id: int, admin_comment: Optional[str]):
+    """单条审批的公共逻辑,错误转换为HTTP异常"""
+    try:
+        request = dorm_changes.decide_request(db, request_id, action, admin_id, admin_comment)
+    except ValueError as e:
         raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="申请不存在"
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
         )
     
-    if request.status != "pending":
+    if not request:
         raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"该申请当前状态为'{request.status}',无法处理"
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="申请不存在"
         )
     
-    # 更新申请状态
-    request.status = "approved" if action == "approve" else "rejected"
-    request.admin_id = current_admin.admin_id
-    request.admin_comment = admin_comment
-    request.processed_at = datetime.utcnow()
-    
-    # 如果批准,需要更新学生宿舍并调整床位数
-    if action == "approve":
-        student = db.query(models.Student).filter(
-            models.Student.student_id == request.student_id
-        ).first()
-        
-        if student and student.dorm_id:
-            # 减少原宿舍的occupied_beds
-            old_dorm = db.query(models.Dormitory).filter(
-                models.Dormitory.dorm_id == student.dorm_id
-            ).first()
-            if old_dorm and old_dorm.occupied_beds > 0:
-                old_dorm.occupied_beds -= 1
-        
-        # 增加新宿舍的occupied_beds
-        new_dorm = db.query(models.Dormitory).filter(
-            models.Dormitory.dorm_id == request.target_dorm_id
-        ).first()
-        
-        if not new_dorm:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="目标宿舍不存在"
-            )
-        
-        if new_dorm.occupied_beds >= new_dorm.total_beds:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="目标宿舍已满,无法批准"
-            )
-        
-        new_dorm.occupied_beds += 1
-        
-        # 更新学生宿舍
-        if student:
-            student.dorm_id = request.target_dorm_id
-    
-    db.commit()
+    invalidate_statistics()
+    events.publish_dorm_change(request.student_id, request.request_id, request.status)
+    return request
+
+
+@router.put("/dorm-change-requests/{request_id}", summary="处理调换申请")
+def process_dorm_change_request(
+    request_id: int,
+    action: str = Query(..., description="操作: approve/reject"),
+    admin_comment: Optional[str] = Query(None, max_length=500, description="管理员备注"),
+    current_admin: models.Administrator = Depends(auth.get_current_admin),
+    db: Session = Depends(get_db)
+):
+    """
+    审批或拒绝宿舍调换申请
+    """
+    request = _decide_dorm_change(db, request_id, action, current_admin.admin_id, admin_comment)
     db.refresh(request)
     
     return request
 
 
 @router.post("/dorm-change/{request_id}/approve", summary="通过调换申请")
-async def approve_dorm_change(
+def approve_dorm_change(
     request_id: int,
     request_body: dict,
     current_admin: models.Administrator = Depends(auth.get_current_admin),
@@ -509,71 +574,13 @@ async def approve_dorm_change(
     通过宿舍调换申请
     """
     admin_comment = request_body.get("admin_comment", "")
-    
-    request = db.query(models.DormChangeRequest).filter(
-        models.DormChangeRequest.request_id == request_id
-    ).first()
-    
-    if not request:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="申请不存在"
-        )
-    
-    if request.status != "pending":
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"该申请当前状态为'{request.status}',无法处理"
-        )
-    
-    student = db.query(models.Student).filter(
-        models.Student.student_id == request.student_id
-    ).first()
-    
-    if student and student.dorm_id:
-        # 减少原宿舍的occupied_beds
-        old_dorm = db.query(models.Dormitory).filter(
-            models.Dormitory.dorm_id == student.dorm_id
-        ).first()
-        if old_dorm and old_dorm.occupied_beds > 0:
-            old_dorm.occupied_beds -= 1
-    
-    # 增加新宿舍的occupied_beds
-    new_dorm = db.query(models.Dormitory).filter(
-        models.Dormitory.dorm_id == request.target_dorm_id
-    ).first()
-    
-    if not new_dorm:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="目标宿舍不存在"
-        )
-    
-    if new_dorm.occupied_beds >= new_dorm.total_beds:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="目标宿舍已满,无法批准"
-        )
-    
-    new_dorm.occupied_beds += 1
-    
-    # 更新学生宿舍
-    if student:
-        student.dorm_id = request.target_dorm_id
-    
-    # 更新申请状态
-    request.status = "approved"
-    request.admin_id = current_admin.admin_id
-    request.admin_comment = admin_comment
-    request.processed_at = datetime.utcnow()
-    
-    db.commit()
+    _decide_dorm_change(db, request_id, "approve", current_admin.admin_id, admin_comment)
     
     return {"message": "申请已通过"}
 
 
 @router.post("/dorm-change/{request_id}/reject", summary="拒绝调换申请")
-async def reject_dorm_change(
+def reject_dorm_change(
     request_id: int,
     request_body: dict,
     current_admin: models.Administrator = Depends(auth.get_current_admin),
@@ -583,30 +590,7 @@ async def reject_dorm_change(
     拒绝宿舍调换申请
     """
     admin_comment = request_body.get("admin_comment", "")
-    
-    request = db.query(models.DormChangeRequest).filter(
-        models.DormChangeRequest.request_id == request_id
-    ).first()
-    
-    if not request:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="申请不存在"
-        )
-    
-    if request.status != "pending":
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"该申请当前状态为'{request.status}',无法处理"
-        )
-    
-    # 更新申请状态
-    request.status = "rejected"
-    request.admin_id = current_admin.admin_id
-    request.admin_comment = admin_comment
-    request.processed_at = datetime.utcnow()
-    
-    db.commit()
+    _decide_dorm_change(db, request_id, "reject", current_admin.admin_id, admin_comment)
     
     return {"message": "申请已拒绝"}
 
@@ -696,7 +680,9 @@ async def update_maintenance_request(
     request.admin_id = current_admin.admin_id
     
     db.commit()
+    invalidate_statistics()
     db.refresh(request)
+    events.publish_maintenance(request)
     
     return request
 
@@ -705,7 +691,7 @@ async def update_maintenance_request(
 # 账单管理
 # ============================================================================
 
-@router.get("/bills", summary="查看所有账单")
+@router.get("/bills", summary="查看所有账单", response_class=FastJSONResponse)
 async def get_all_bills(
     dorm_id: Optional[int] = Query(None, description="按宿舍ID筛选"),
     status_filter: Optional[str] = Query(None, description="按状态筛选: unpaid/paid/overdue"),
@@ -718,7 +704,7 @@ async def get_all_bills(
     """
     查看所有账单
     """
-    query = db.query(models.Bill)
+    query = project(db, schemas.BillInfo, models.Bill)
     
     if dorm_id:
         query = query.filter(models.Bill.dorm_id == dorm_id)
@@ -732,12 +718,12 @@ async def get_all_bills(
         models.Bill.due_date.desc()
     ).offset(skip).limit(limit).all()
     
-    return {
+    return FastJSONResponse({
         "total": total,
-        "items": bills,
+        "items": rows_to_dicts(bills),
         "skip": skip,
         "limit": limit
-    }
+    })
 
 
 @router.put("/bills/{bill_id}", summary="更新账单状态")
@@ -769,7 +755,9 @@ async def update_bill_status(
         bill.payment_date = datetime.utcnow()
     
     db.commit()
+    invalidate_statistics()
     db.refresh(bill)
+    events.publish_bill(bill)
     
     return bill
 
@@ -805,12 +793,65 @@ async def create_bill(
     )
     
     db.add(new_bill)
-    db.commit()
+    try:
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="该宿舍本月已有同类型账单"
+        )
+    invalidate_statistics()
     db.refresh(new_bill)
     
     return new_bill
 
 
+@router.post("/bills/run", summary="按月批量生成账单")
+def run_monthly_billing(
+    run: schemas.BillingRunRequest,
+    current_admin: models.Administrator = Depends(auth.get_current_admin),
+    db: Session = Depends(get_db)
+):
+    """
+    为全部或指定楼栋的宿舍生成一个月的账单,每种账单类型一条INSERT ... SELECT语句
+    同一宿舍同月同类型的账单已存在时跳过,可重复执行
+    """
+    try:
+        report = billing.run_billing(db, run)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    
+    if report["created"] and not run.dry_run:
+        invalidate_statistics()
+    
+    return report
+
+
+@router.get("/bills/overdue-sweep", summary="查看逾期账单扫描状态")
+async def get_overdue_sweep_stats(
+    current_admin: models.Administrator = Depends(auth.get_current_admin)
+):
+    """
+    查看后台逾期账单扫描的运行指标
+    """
+    return billing.sweep_stats.to_dict()
+
+
+@router.post("/bills/overdue-sweep", summary="立即扫描逾期账单")
+def run_overdue_sweep(
+    current_admin: models.Administrator = Depends(auth.get_current_admin)
+):
+    """
+    立即将已过截止日期的未支付账单标记为逾期,不必等待下一次定时扫描
+    """
+    result = billing.sweep_overdue_bills()
+    return {**result, "stats": billing.sweep_stats.to_dict()}
+
+
 @router.delete("/bills/{bill_id}", summary="删除账单")
 async def delete_bill(
     bill_id: int,
@@ -830,6 +871,7 @@ async def delete_bill(
     
     db.delete(bill)
     db.commit()
+    invalidate_statistics()
     
     return {"message": "账单删除成功"}
 
@@ -845,50 +887,165 @@ async def get_statistics(
 ):
     """
     获取系统整体统计数据
+    结果缓存STATISTICS_CACHE_TTL秒,相关写接口提交后会主动失效缓存
+    """
+    return cache.get_or_set(
+        "statistics", "all", lambda: _compute_statistics(db),
+        ttl=STATISTICS_CACHE_TTL, tags=STATISTICS_TAGS
+    )
+
+
+def _compute_statistics(db: Session) -> dict:
+    """
+    用一条聚合查询计算全部统计数据
+    每张表先聚合成单行派生表,再交叉连接,避免多次往返数据库
     """
-    # 学生统计
-    total_students = db.query(func.count(models.Student.student_id)).scalar()
-    male_students = db.query(func.count(models.Student.student_id)).filter(
-        models.Student.gender == "男"
-    ).scalar()
-    female_students = db.query(func.count(models.Student.student_id)).filter(
-        models.Student.gender == "女"
-    ).scalar()
-    
-    # 宿舍统计
-    total_dorms = db.query(func.count(models.Dormitory.dorm_id)).scalar()
-    total_beds = db.query(func.sum(models.Dormitory.total_beds)).scalar() or 0
-    occupied_beds = db.query(func.sum(models.Dormitory.occupied_beds)).scalar() or 0
-    available_beds = total_beds - occupied_beds
+    # 学生统计(按性别条件求和)
+    student_stats = select(
+        func.count(models.Student.student_id).label("total_students"),
+        func.coalesce(func.sum(case((models.Student.gender == "男", 1), else_=0)), 0).label("male_students"),
+        func.coalesce(func.sum(case((models.Student.gender == "女", 1), else_=0)), 0).label("female_students")
+    ).subquery("student_stats")
+    
+    # 宿舍统计(读取入住汇总表,不扫描宿舍表)
+    dorm_stats = select(
+        func.coalesce(func.sum(models.DormitoryOccupancy.total_rooms), 0).label("total_dorms"),
+        func.coalesce(func.sum(models.DormitoryOccupancy.total_beds), 0).label("total_beds"),
+        func.coalesce(func.sum(models.DormitoryOccupancy.occupied_beds), 0).label("occupied_beds")
+    ).subquery("dorm_stats")
     
     # 申请统计
-    pending_dorm_changes = db.query(func.count(models.DormChangeRequest.request_id)).filter(
-        models.DormChangeRequest.status == "pending"
-    ).scalar()
+    dorm_change_stats = select(
+        func.count(models.DormChangeRequest.request_id).label("pending_dorm_changes")
+    ).where(models.DormChangeRequest.status == "pending").subquery("dorm_change_stats")
     
-    pending_maintenance = db.query(func.count(models.MaintenanceRequest.request_id)).filter(
-        models.MaintenanceRequest.status == "pending"
-    ).scalar()
+    maintenance_stats = select(
+        func.count(models.MaintenanceRequest.request_id).label("pending_maintenance")
+    ).where(models.MaintenanceRequest.status == "pending").subquery("maintenance_stats")
     
     # 账单统计
-    unpaid_bills = db.query(func.count(models.Bill.bill_id)).filter(
-        models.Bill.status == "unpaid"
-    ).scalar()
+    bill_stats = select(
+        func.count(models.Bill.bill_id).label("unpaid_bills")
+    ).where(models.Bill.status == "unpaid").subquery("bill_stats")
+    
+    row = db.execute(
+        select(student_stats, dorm_stats, dorm_change_stats, maintenance_stats, bill_stats).select_from(
+            student_stats
+            .join(dorm_stats, true())
+            .join(dorm_change_stats, true())
+            .join(maintenance_stats, true())
+            .join(bill_stats, true())
+        )
+    ).one()
+    
+    stats = {key: int(value) for key, value in row._mapping.items()}
+    
+    return {
+        "total_students": stats["total_students"],
+        "male_students": stats["male_students"],
+        "female_students": stats["female_students"],
+        "total_dorms": stats["total_dorms"],
+        "total_beds": stats["total_beds"],
+        "occupied_beds": stats["occupied_beds"],
+        "available_beds": stats["total_beds"] - stats["occupied_beds"],
+        "pending_dorm_changes": stats["pending_dorm_changes"],
+        "pending_maintenance": stats["pending_maintenance"],
+        "unpaid_bills": stats["unpaid_bills"]
+    }
+
+
+@router.get("/occupancy", summary="查看各楼栋入住汇总")
+async def get_occupancy_summary(
+    current_admin: models.Administrator = Depends(auth.get_current_admin),
+    db: Session = Depends(get_db)
+):
+    """
+    按楼栋和性别查看床位入住汇总
+    数据来自增量维护的入住汇总表,结果缓存到汇总表下次写入
+    """
+    return cache.get_or_set("occupancy", "all", lambda: beds.get_occupancy(db), tags=("dormitory_occupancy",))
+
+
+@router.post("/occupancy/reconcile", summary="校验入住汇总")
+async def reconcile_occupancy_summary(
+    repair: bool = Query(True, description="是否按宿舍表修正不一致项"),
+    current_admin: models.Administrator = Depends(auth.get_current_admin),
+    db: Session = Depends(get_db)
+):
+    """
+    将入住汇总表与宿舍表重新聚合的结果比对,返回不一致项
+    """
+    mismatches = beds.reconcile_occupancy(db, repair=repair)
+    if repair and mismatches:
+        invalidate_statistics()
     
     return {
-        "total_students": total_students,
-        "male_students": male_students,
-        "female_students": female_students,
-        "total_dorms": total_dorms,
-        "total_beds": total_beds,
-        "occupied_beds": occupied_beds,
-        "available_beds": available_beds,
-        "pending_dorm_changes": pending_dorm_changes,
-        "pending_maintenance": pending_maintenance,
-        "unpaid_bills": unpaid_bills
+        "consistent": not mismatches,
+        "repaired": repair and bool(mismatches),
+        "mismatches": mismatches
     }
 
 
+@router.get("/sql-profile", summary="SQL性能分析报告")
+async def get_sql_profile(
+    top: int = Query(20, ge=1, le=500, description="返回的语句数"),
+    sort: str = Query("total", description="排序: total/p99/count/mean/max"),
+    route: Optional[str] = Query(None, description="只看某个路由模板,如 /api/admin/students"),
+    current_admin: models.Administrator = Depends(auth.get_current_admin)
+):
+    """
+    按语句指纹和来源路由汇总的SQL耗时(调用次数、总耗时、p99、最大耗时),以及最近的慢查询
+    统计从应用启动或上次重置开始
+    """
+    try:
+        return sql_profiler.report(top=top, sort=sort, route=route)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+
+
+@router.delete("/sql-profile", summary="重置SQL性能分析")
+async def reset_sql_profile(
+    current_admin: models.Administrator = Depends(auth.get_current_admin)
+):
+    """清空已收集的SQL统计和最近慢查询"""
+    sql_profiler.reset()
+    return {"message": "SQL性能分析已重置"}
+
+
+@router.get("/cache", summary="缓存状态")
+async def get_cache_stats(
+    current_admin: models.Administrator = Depends(auth.get_current_admin)
+):
+    """缓存后端、条目数和错误计数;各缓存的命中率见 /metrics 中的 cache_requests_total"""
+    return cache.stats()
+
+
+@router.delete("/cache", summary="清空缓存")
+def clear_cache(
+    current_admin: models.Administrator = Depends(auth.get_current_admin)
+):
+    """清空所有缓存条目(共享后端时对所有工作进程生效)"""
+    try:
+        cache.clear()
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=f"缓存后端不可用: {e}"
+        )
+    return {"message": "缓存已清空"}
+
+
+@router.get("/tasks", summary="后台任务队列状态")
+async def get_task_queue_stats(
+    current_admin: models.Administrator = Depends(auth.get_current_admin)
+):
+    """就绪、等待重试和执行中的任务数;启用持久化时附带存储中各状态的任务数"""
+    return task_queue.stats()
+
+
 # ============================================================================
 # 管理员自我管理
 # ============================================================================
@@ -6,14 +6,17 @@ from fastapi.security import OAuth2PasswordRequestForm
 from sqlalchemy.orm import Session
 from datetime import timedelta, datetime
 
-from .. import schemas, auth, models
+from .. import schemas, auth, models, beds
 from ..database import get_db
+from ..cache import invalidate_statistics
+from ..vacancy import reserve_dorm
+from ..tasks import task_queue
 
 router = APIRouter(prefix="/api/auth", tags=["认证"])
 
 
 @router.post("/login", response_model=schemas.Token, summary="用户登录")
-async def login(
+def login(
     form_data: OAuth2PasswordRequestForm = Depends(),
     db: Session = Depends(get_db)
 ):
@@ -22,6 +25,9 @@ async def login(
     
     - **username**: 学号（学生）或用户名（管理员）
     - **password**: 密码
+    
+    同步端点: 密码校验(Argon2)在线程池中执行,不阻塞事件循环;
+    密码哈希升级和最后登录时间由后台任务写入
     """
     # 先尝试学生登录
     student = auth.authenticate_student(db, form_data.username, form_data.password)
@@ -41,9 +47,8 @@ async def login(
     # 再尝试管理员登录
     admin = auth.authenticate_admin(db, form_data.username, form_data.password)
     if admin:
-        # 更新最后登录时间
-        admin.last_login = datetime.utcnow()
-        db.commit()
+        # 更新最后登录时间(后台任务)
+        task_queue.enqueue("record_admin_login", admin_id=admin.admin_id, at=datetime.utcnow().isoformat())
         
         access_token_expires = timedelta(minutes=auth.ACCESS_TOKEN_EXPIRE_MINUTES)
         access_token = auth.create_access_token(
@@ -66,7 +71,7 @@ async def login(
 
 
 @router.post("/register", response_model=schemas.Token, summary="学生注册")
-async def register(
+def register(
     student_data: schemas.StudentRegister,
     db: Session = Depends(get_db)
 ):
@@ -124,11 +129,11 @@ async def register(
             detail=f"学院代码必须是以下之一: {', '.join(valid_colleges)}"
         )
     
-    # 查找有空床位的同性别宿舍
-    available_dorm = db.query(models.Dormitory).filter(
-        models.Dormitory.gender_type == student_data.gender,
-        models.Dormitory.occupied_beds < models.Dormitory.total_beds
-    ).order_by(models.Dormitory.dorm_id).first()
+    # 先计算密码哈希,缩短宿舍行锁的持有时间
+    hashed_password = auth.get_password_hash(student_data.password)
+    
+    # 通过空床位索引选取并锁定有空床位的同性别宿舍
+    available_dorm = reserve_dorm(db, student_data.gender)
     
     if not available_dorm:
         raise HTTPException(
@@ -137,7 +142,6 @@ async def register(
         )
     
     # 创建新学生并分配宿舍
-    hashed_password = auth.get_password_hash(student_data.password)
     new_student = models.Student(
         student_id=student_data.student_id,
         password=hashed_password,
@@ -151,10 +155,11 @@ async def register(
     )
     
     # 更新宿舍占用床位数
-    available_dorm.occupied_beds += 1
+    beds.occupy_bed(db, available_dorm)
     
     db.add(new_student)
     db.commit()
+    invalidate_statistics()
     db.refresh(new_student)
     
     # 自动登录，生成Token
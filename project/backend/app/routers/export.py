@@ -0,0 +1,295 @@
+"""
+数据导出API路由
+以CSV或NDJSON格式流式导出整表数据,使用服务端游标分批读取,
+内存占用与表大小无关
+"""
+import csv
+import io
+import json
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Iterator, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
+from sqlalchemy.orm import aliased
+
+from .. import auth, models
+from ..database import SessionLocal
+
+router = APIRouter(prefix="/api/admin/export", tags=["数据导出"])
+
+# 服务端游标每批读取的行数
+EXPORT_BATCH_SIZE = 1000
+
+MEDIA_TYPES = {
+    "csv": "text/csv; charset=utf-8",
+    "ndjson": "application/x-ndjson",
+}
+
+
+# ============================================================================
+# 流式输出
+# ============================================================================
+
+def _json_default(value):
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    raise TypeError(f"无法序列化的类型: {type(value).__name__}")
+
+
+def _iter_batches(stmt) -> Iterator[list]:
+    """
+    使用独立会话和服务端游标执行查询,每次返回一批行
+    请求的数据库会话在响应开始发送后即被关闭,因此生成器内部自行管理会话
+    """
+    db = SessionLocal()
+    try:
+        result = db.connection().execution_options(
+            stream_results=True,
+            yield_per=EXPORT_BATCH_SIZE
+        ).execute(stmt)
+        for partition in result.partitions():
+            yield partition
+    finally:
+        db.close()
+
+
+def _iter_csv(stmt) -> Iterator[str]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    # 写入BOM,Excel打开时可正确识别中文
+    buffer.write("\ufeff")
+    writer.writerow([column.name for column in stmt.selected_columns])
+    for rows in _iter_batches(stmt):
+        writer.writerows(rows)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def _iter_ndjson(stmt) -> Iterator[str]:
+    for rows in _iter_batches(stmt):
+        yield "".join(
+            json.dumps(dict(row._mapping), ensure_ascii=False, default=_json_default) + "\n"
+            for row in rows
+        )
+
+
+def _stream(stmt, fmt: str, name: str) -> StreamingResponse:
+    if fmt not in MEDIA_TYPES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="导出格式必须是csv或ndjson"
+        )
+
+    content = _iter_csv(stmt) if fmt == "csv" else _iter_ndjson(stmt)
+    filename = f"{name}_{datetime.now().strftime('%Y%m%d%H%M%S')}.{fmt}"
+    return StreamingResponse(
+        content,
+        media_type=MEDIA_TYPES[fmt],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+
+# ============================================================================
+# 导出端点
+# ============================================================================
+
+@router.get("/students", summary="导出学生数据")
+async def export_students(
+    fmt: str = Query("csv", alias="format", description="导出格式: csv/ndjson"),
+    college: Optional[str] = Query(None, description="按学院筛选"),
+    gender: Optional[str] = Query(None, description="按性别筛选"),
+    enrollment_year: Optional[int] = Query(None, description="按入学年份筛选"),
+    building: Optional[str] = Query(None, description="按楼栋筛选"),
+    current_admin: models.Administrator = Depends(auth.get_current_admin)
+):
+    """
+    导出学生信息及所住宿舍(不含密码)
+    """
+    student = models.Student
+    dorm = models.Dormitory
+    stmt = select(
+        student.student_id,
+        student.name,
+        student.gender,
+        student.nationality,
+        student.college,
+        student.enrollment_year,
+        student.email,
+        student.dorm_id,
+        dorm.building_no,
+        dorm.room_no,
+        student.created_at
+    ).outerjoin(dorm, student.dorm_id == dorm.dorm_id).order_by(student.student_id)
+
+    if college:
+        stmt = stmt.where(student.college == college)
+    if gender:
+        stmt = stmt.where(student.gender == gender)
+    if enrollment_year:
+        stmt = stmt.where(student.enrollment_year == enrollment_year)
+    if building:
+        stmt = stmt.where(dorm.building_no == building)
+
+    return _stream(stmt, fmt, "students")
+
+
+@router.get("/dormitories", summary="导出宿舍数据")
+async def export_dormitories(
+    fmt: str = Query("csv", alias="format", description="导出格式: csv/ndjson"),
+    building: Optional[str] = Query(None, description="按楼栋筛选"),
+    gender_type: Optional[str] = Query(None, description="按性别筛选"),
+    has_vacancy: Optional[bool] = Query(None, description="仅导出有空位的宿舍"),
+    current_admin: models.Administrator = Depends(auth.get_current_admin)
+):
+    """
+    导出宿舍信息及床位占用情况
+    """
+    dorm = models.Dormitory
+    stmt = select(
+        dorm.dorm_id,
+        dorm.building_no,
+        dorm.floor_no,
+        dorm.room_no,
+        dorm.gender_type,
+        dorm.total_beds,
+        dorm.occupied_beds,
+        (dorm.total_beds - dorm.occupied_beds).label("available_beds")
+    ).order_by(dorm.dorm_id)
+
+    if building:
+        stmt = stmt.where(dorm.building_no == building)
+    if gender_type:
+        stmt = stmt.where(dorm.gender_type == gender_type)
+    if has_vacancy:
+        stmt = stmt.where(dorm.occupied_beds < dorm.total_beds)
+
+    return _stream(stmt, fmt, "dormitories")
+
+
+@router.get("/bills", summary="导出账单数据")
+async def export_bills(
+    fmt: str = Query("csv", alias="format", description="导出格式: csv/ndjson"),
+    dorm_id: Optional[int] = Query(None, description="按宿舍ID筛选"),
+    status_filter: Optional[str] = Query(None, description="按状态筛选: unpaid/paid/overdue"),
+    bill_type: Optional[str] = Query(None, description="按类型筛选"),
+    billing_month: Optional[str] = Query(None, description="按账单月份筛选(YYYY-MM)"),
+    current_admin: models.Administrator = Depends(auth.get_current_admin)
+):
+    """
+    导出账单及对应宿舍房间号
+    """
+    bill = models.Bill
+    dorm = models.Dormitory
+    stmt = select(
+        bill.bill_id,
+        bill.dorm_id,
+        dorm.room_no,
+        bill.bill_type,
+        bill.amount,
+        bill.billing_month,
+        bill.due_date,
+        bill.status,
+        bill.paid_at,
+        bill.created_at
+    ).join(dorm, bill.dorm_id == dorm.dorm_id).order_by(bill.bill_id)
+
+    if dorm_id:
+        stmt = stmt.where(bill.dorm_id == dorm_id)
+    if status_filter:
+        stmt = stmt.where(bill.status == status_filter)
+    if bill_type:
+        stmt = stmt.where(bill.bill_type == bill_type)
+    if billing_month:
+        stmt = stmt.where(bill.billing_month == billing_month)
+
+    return _stream(stmt, fmt, "bills")
+
+
+@router.get("/maintenance", summary="导出维修记录")
+async def export_maintenance(
+    fmt: str = Query("csv", alias="format", description="导出格式: csv/ndjson"),
+    status_filter: Optional[str] = Query(None, description="按状态筛选: pending/in_progress/completed/cancelled"),
+    priority: Optional[str] = Query(None, description="按优先级筛选: low/medium/high"),
+    current_admin: models.Administrator = Depends(auth.get_current_admin)
+):
+    """
+    导出维修申请历史
+    """
+    request = models.MaintenanceRequest
+    student = models.Student
+    dorm = models.Dormitory
+    stmt = select(
+        request.request_id,
+        request.student_id,
+        student.name.label("student_name"),
+        request.dorm_id,
+        dorm.room_no,
+        request.issue_type,
+        request.description,
+        request.status,
+        request.priority,
+        request.admin_id,
+        request.admin_comment,
+        request.created_at,
+        request.completed_at
+    ).join(
+        student, request.student_id == student.student_id
+    ).join(
+        dorm, request.dorm_id == dorm.dorm_id
+    ).order_by(request.request_id)
+
+    if status_filter:
+        stmt = stmt.where(request.status == status_filter)
+    if priority:
+        stmt = stmt.where(request.priority == priority)
+
+    return _stream(stmt, fmt, "maintenance")
+
+
+@router.get("/dorm-change", summary="导出宿舍调换申请")
+async def export_dorm_change_requests(
+    fmt: str = Query("csv", alias="format", description="导出格式: csv/ndjson"),
+    status_filter: Optional[str] = Query(None, description="按状态筛选: pending/approved/rejected"),
+    current_admin: models.Administrator = Depends(auth.get_current_admin)
+):
+    """
+    导出宿舍调换申请历史
+    """
+    request = models.DormChangeRequest
+    student = models.Student
+    current_dorm = aliased(models.Dormitory, name="current_dorm")
+    target_dorm = aliased(models.Dormitory, name="target_dorm")
+    stmt = select(
+        request.request_id,
+        request.student_id,
+        student.name.label("student_name"),
+        request.current_dorm_id,
+        current_dorm.room_no.label("current_room_no"),
+        request.target_dorm_id,
+        target_dorm.room_no.label("target_room_no"),
+        request.reason,
+        request.status,
+        request.admin_id,
+        request.admin_comment,
+        request.created_at,
+        request.updated_at
+    ).join(
+        student, request.student_id == student.student_id
+    ).outerjoin(
+        current_dorm, request.current_dorm_id == current_dorm.dorm_id
+    ).outerjoin(
+        target_dorm, request.target_dorm_id == target_dorm.dorm_id
+    ).order_by(request.request_id)
+
+    if status_filter:
+        stmt = stmt.where(request.status == status_filter)
+
+    return _stream(stmt, fmt, "dorm_change_requests")
@@ -1,12 +1,20 @@
 """
 学生功能API路由
 """
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Request
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
-from typing import List
+from starlette.background import BackgroundTask
+from starlette.concurrency import run_in_threadpool
+from typing import List, Optional
 
 from .. import schemas, auth, models
-from ..database import get_db
+from ..database import SessionLocal, get_db
+from ..cache import cache, invalidate_statistics
+from ..responses import FastJSONResponse, rows_to_dicts
+from ..projections import project
+from ..rooms import room_directory
+from ..events import TooManyConnections, event_bus, stream
 
 router = APIRouter(prefix="/api/students", tags=["学生功能"])
 
@@ -73,45 +81,50 @@ async def get_roommates(
         )
     
     # 查询同宿舍的其他学生
-    roommates = db.query(models.Student).filter(
+    roommates = project(db, schemas.RoommateInfo, models.Student).filter(
         models.Student.dorm_id == current_student.dorm_id,
         models.Student.student_id != current_student.student_id
     ).all()
     
-    return roommates
+    return rows_to_dicts(roommates)
 
 
-@router.get("/dormitories", summary="查询宿舍列表")
+@router.get("/dormitories", response_model=List[schemas.DormitoryBrief], summary="查询宿舍列表")
 async def query_dormitories(
-    building_no: str = None,
-    room_no: str = None,
+    building_no: Optional[str] = Query(None, description="楼栋号"),
+    room_no: Optional[str] = Query(None, description="房间号(支持前缀和部分匹配)"),
+    exact: bool = Query(False, description="房间号完全匹配"),
+    limit: int = Query(20, ge=1, le=100, description="最多返回数量"),
     current_student: models.Student = Depends(auth.get_current_student),
     db: Session = Depends(get_db)
 ):
     """
     查询宿舍列表（用于宿舍调换申请时验证目标宿舍）
+    先在内存房间目录中按楼栋和房间号查找,再按宿舍ID读取床位信息;结果缓存到宿舍表下次写入
     """
-    query = db.query(models.Dormitory)
-    
-    if building_no:
-        query = query.filter(models.Dormitory.building_no == building_no)
-    if room_no:
-        query = query.filter(models.Dormitory.room_no == room_no)
+    return FastJSONResponse(cache.get_or_set(
+        "student_dormitories",
+        (building_no, room_no, exact, limit),
+        lambda: _search_dormitories(db, building_no, room_no, exact, limit),
+        tags=("dormitories",)
+    ))
+
+
+def _search_dormitories(db: Session, building_no: Optional[str], room_no: Optional[str], exact: bool, limit: int) -> list:
+    room_directory.ensure_loaded(db)
+    dorm_ids = room_directory.search_ids(room_no or "", building_no, limit, exact=exact)
+    if not dorm_ids:
+        return []
     
-    dormitories = query.all()
+    dormitories = project(db, schemas.DormitoryBrief, models.Dormitory).filter(
+        models.Dormitory.dorm_id.in_(dorm_ids)
+    ).all()
     
-    result = []
-    for dorm in dormitories:
-        result.append({
-            "dorm_id": dorm.dorm_id,
-            "building_no": dorm.building_no,
-            "room_no": dorm.room_no,
-            "gender_type": dorm.gender_type,
-            "total_beds": dorm.total_beds,
-            "occupied_beds": dorm.occupied_beds
-        })
+    # 保持目录给出的顺序(前缀匹配在前)
+    order = {dorm_id: position for position, dorm_id in enumerate(dorm_ids)}
+    dormitories.sort(key=lambda dorm: order[dorm.dorm_id])
     
-    return result
+    return rows_to_dicts(dormitories)
 
 
 @router.get("/bills", response_model=List[schemas.BillWithDormInfo], summary="查看账单")
@@ -125,11 +138,8 @@ async def get_student_bills(
     if not current_student.dorm_id:
         return []
     
-    # 查询宿舍账单
-    bills = db.query(
-        models.Bill,
-        models.Dormitory.room_no
-    ).join(
+    # 查询宿舍账单(只查询响应模型需要的列)
+    bills = project(db, schemas.BillWithDormInfo, models.Bill, models.Dormitory).join(
         models.Dormitory,
         models.Bill.dorm_id == models.Dormitory.dorm_id
     ).filter(
@@ -138,23 +148,7 @@ async def get_student_bills(
         models.Bill.billing_month.desc()
     ).all()
     
-    result = []
-    for bill, room_no in bills:
-        bill_dict = {
-            "bill_id": bill.bill_id,
-            "dorm_id": bill.dorm_id,
-            "bill_type": bill.bill_type,
-            "amount": bill.amount,
-            "billing_month": bill.billing_month,
-            "due_date": bill.due_date,
-            "status": bill.status,
-            "paid_at": bill.paid_at,
-            "created_at": bill.created_at,
-            "room_no": room_no
-        }
-        result.append(bill_dict)
-    
-    return result
+    return FastJSONResponse(rows_to_dicts(bills))
 
 
 @router.post(
@@ -225,6 +219,7 @@ async def create_dorm_change_request(
     
     db.add(new_request)
     db.commit()
+    invalidate_statistics()
     db.refresh(new_request)
     
     return new_request
@@ -279,6 +274,7 @@ async def create_maintenance_request(
     
     db.add(new_request)
     db.commit()
+    invalidate_statistics()
     db.refresh(new_request)
     
     return new_request
@@ -416,3 +412,83 @@ async def change_password(
     db.commit()
     
     return {"message": "密码修改成功"}
+
+
+def _student_exists(student_id: str) -> bool:
+    # 只在建立连接时查询一次,不在整个连接期间占用数据库会话
+    db = SessionLocal()
+    try:
+        return db.query(models.Student.student_id).filter(
+            models.Student.student_id == student_id
+        ).first() is not None
+    finally:
+        db.close()
+
+
+@router.post("/events/ticket", summary="获取事件流票据")
+async def create_event_ticket(
+    current_student: models.Student = Depends(auth.get_current_student)
+):
+    """
+    签发短期有效的事件流票据
+    EventSource无法设置请求头,票据代替访问令牌放在查询参数中,避免长期有效的令牌出现在访问日志里
+    """
+    return {
+        "ticket": auth.create_event_ticket(current_student.student_id),
+        "expires_in": auth.EVENT_TICKET_EXPIRE_SECONDS
+    }
+
+
+@router.get("/events", summary="状态变化推送(SSE)")
+async def subscribe_events(
+    request: Request,
+    ticket: Optional[str] = Query(None, description="事件流票据(由 POST /events/ticket 获取)"),
+    last_event_id: Optional[str] = Query(None, description="客户端重新建立连接时收到的最后一个事件ID")
+):
+    """
+    以Server-Sent Events推送当前学生的维修申请、调换申请和账单状态变化
+    事件类型: maintenance / dorm_change / bill,data为 {"request_id"或"bill_id", "status"};
+    resync表示可能漏掉了事件,客户端应重新拉取列表。断线重连时按Last-Event-ID头(浏览器自动重连)
+    或last_event_id查询参数(客户端换新票据后重新连接)补发事件
+    认证方式为ticket查询参数或Authorization头中的访问令牌;查询参数不接受访问令牌
+    """
+    if ticket:
+        student_id = auth.decode_event_ticket(ticket)
+    else:
+        scheme, _, credentials = request.headers.get("authorization", "").partition(" ")
+        if scheme.lower() != "bearer" or not credentials:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="未提供认证凭据",
+                headers={"WWW-Authenticate": "Bearer"},
+            )
+        token_data = auth.decode_token(credentials)
+        if token_data.user_type != "student":
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="需要学生权限"
+            )
+        student_id = token_data.username
+    if not await run_in_threadpool(_student_exists, student_id):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="用户不存在"
+        )
+    
+    try:
+        subscription, backlog = event_bus.subscribe(
+            student_id, request.headers.get("last-event-id") or last_event_id
+        )
+    except TooManyConnections:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="连接数过多,请关闭其他页面后重试"
+        )
+    
+    return StreamingResponse(
+        stream(event_bus, subscription, backlog),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        # 客户端在响应体开始前断开时生成器不会执行,由后台任务注销订阅(重复注销无副作用)
+        background=BackgroundTask(event_bus.unsubscribe, subscription)
+    )
@@ -58,6 +58,26 @@ class StudentRegister(BaseModel):
     email: EmailStr = Field(..., description="邮箱")
 
 
+class CohortStudent(BaseModel):
+    """批量分配宿舍的新生记录"""
+    student_id: str = Field(..., min_length=9, max_length=9, description="学号(9位)")
+    name: str = Field(..., min_length=1, description="姓名")
+    gender: str = Field(..., description="性别: 男/女")
+    nationality: str = Field(..., description="国籍")
+    college: str = Field(..., description="学院代码: SSE/SME/MED/HSS/SAI/SDS/MUS")
+    enrollment_year: int = Field(..., ge=2020, le=2030, description="入学年份")
+    email: EmailStr = Field(..., description="邮箱")
+    password: Optional[str] = Field(None, min_length=6, description="初始密码(为空时使用默认密码)")
+    building_no: Optional[str] = Field(None, description="指定楼栋(可选)")
+
+
+class StudentImport(StudentBase):
+    """批量导入的学生记录(按学号插入或更新)"""
+    student_id: str = Field(..., min_length=1, max_length=20, description="学号")
+    dorm_id: Optional[int] = Field(None, description="宿舍ID")
+    password: Optional[str] = Field(None, min_length=6, description="初始密码(仅新学生,为空时使用默认密码)")
+
+
 class StudentProfile(StudentBase):
     """学生个人信息"""
     student_id: str
@@ -68,6 +88,16 @@ class StudentProfile(StudentBase):
         from_attributes = True
 
 
+class StudentListItem(StudentBase):
+    """学生列表项(管理员查看,不含密码)"""
+    student_id: str
+    dorm_id: Optional[int] = None
+    created_at: datetime
+
+    class Config:
+        from_attributes = True
+
+
 class StudentUpdate(BaseModel):
     """学生信息更新(学生自己用)"""
     name: Optional[str] = None
@@ -120,6 +150,16 @@ class DormitoryBase(BaseModel):
     occupied_beds: int
 
 
+class DormitoryImport(BaseModel):
+    """批量导入的宿舍记录(按宿舍ID或房间号插入或更新)"""
+    dorm_id: Optional[int] = Field(None, description="宿舍ID")
+    building_no: str = Field(..., min_length=1, max_length=10, description="楼栋号")
+    floor_no: int = Field(..., ge=1, description="楼层号")
+    room_no: str = Field(..., min_length=1, max_length=20, description="房间号")
+    gender_type: str = Field(..., description="性别类型: 男/女")
+    total_beds: int = Field(4, ge=1, description="总床位数")
+
+
 class DormitoryInfo(DormitoryBase):
     """宿舍详细信息"""
     dorm_id: int
@@ -129,6 +169,19 @@ class DormitoryInfo(DormitoryBase):
         from_attributes = True
 
 
+class DormitoryBrief(BaseModel):
+    """宿舍简要信息(学生查询目标宿舍)"""
+    dorm_id: int
+    building_no: str
+    room_no: str
+    gender_type: str
+    total_beds: int
+    occupied_beds: int
+
+    class Config:
+        from_attributes = True
+
+
 class DormitoryUpdate(BaseModel):
     """宿舍信息更新"""
     description: Optional[str] = Field(None, max_length=200, description="宿舍描述")
@@ -185,6 +238,13 @@ class DormChangeRequestResponse(BaseModel):
     admin_comment: Optional[str] = Field(None, max_length=500)
 
 
+class DormChangeBatchAction(BaseModel):
+    """批量审批宿舍调换申请"""
+    request_ids: List[int] = Field(..., min_length=1, max_length=1000, description="申请ID列表(顺序即审批优先级)")
+    action: str = Field(..., description="操作: approve/reject")
+    admin_comment: Optional[str] = Field(None, max_length=500, description="管理员备注")
+
+
 # ============================================================================
 # 维修申请相关
 # ============================================================================
@@ -268,6 +328,23 @@ class BillWithDormInfo(BillInfo):
     room_no: Optional[str] = None
 
 
+class BillingRate(BaseModel):
+    """批量生成账单的计费标准"""
+    bill_type: str = Field(..., min_length=1, max_length=50, description="账单类型")
+    amount: Decimal = Field(..., ge=0, description="金额(按床位计费时为每床位金额)")
+    per_bed: bool = Field(False, description="是否按已占用床位数计费")
+
+
+class BillingRunRequest(BaseModel):
+    """按月批量生成账单"""
+    billing_month: str = Field(..., pattern=r"^\d{4}-(0[1-9]|1[0-2])$", description="账单月份(YYYY-MM)")
+    due_date: Optional[date] = Field(None, description="截止日期,默认下月1日")
+    rates: List[BillingRate] = Field(..., min_length=1, description="各类型账单的计费标准")
+    buildings: Optional[List[str]] = Field(None, description="限定楼栋")
+    include_empty: bool = Field(False, description="是否为无人入住的宿舍生成账单")
+    dry_run: bool = Field(False, description="只统计,不写入数据库")
+
+
 # ============================================================================
 # 管理员相关
 # ============================================================================
@@ -0,0 +1,68 @@
+"""
+学生搜索模块
+- 纯数字关键词按学号前缀匹配 (student_id LIKE 'x%'),走主键索引范围扫描
+- 其他关键词在姓名上使用 FULLTEXT ngram 索引 (ft_student_name) 匹配并按相关度排序
+- 关键词短于ngram分词长度时FULLTEXT无法命中,回退到姓名前缀匹配
+
+避免 LIKE '%x%' 前导通配符导致的全表扫描
+"""
+import os
+import re
+from typing import Optional, Tuple
+
+from sqlalchemy import case
+from sqlalchemy.dialects.mysql import match
+from sqlalchemy.orm import Query
+
+from . import models
+
+# 与MySQL的ngram_token_size保持一致(默认2)
+NGRAM_TOKEN_SIZE = int(os.getenv("NGRAM_TOKEN_SIZE", "2"))
+# 学号长度,等长的数字关键词按精确匹配处理
+STUDENT_ID_LENGTH = 9
+
+# BOOLEAN MODE中有特殊含义的字符
+_BOOLEAN_OPERATORS = re.compile(r'[+\-<>()~*"@]')
+
+
+def _escape_like(term: str) -> str:
+    return term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def normalize_term(term: Optional[str]) -> str:
+    """去除首尾空白及全文检索运算符,合并连续空白"""
+    if not term:
+        return ""
+    return " ".join(_BOOLEAN_OPERATORS.sub(" ", term).split())
+
+
+def apply_student_search(query: Query, term: Optional[str]) -> Tuple[Query, Optional[list]]:
+    """
+    为学生查询加上搜索条件
+    返回 (加上条件后的查询, 按相关度排序的order_by子句列表);关键词为空时原样返回查询和None
+    """
+    term = normalize_term(term)
+    if not term:
+        return query, None
+
+    student = models.Student
+
+    if term.isdigit():
+        if len(term) >= STUDENT_ID_LENGTH:
+            return query.filter(student.student_id == term), None
+        # 前缀匹配,利用主键有序性,结果天然按学号排序
+        return query.filter(student.student_id.like(f"{_escape_like(term)}%")), [student.student_id]
+
+    if len(term.replace(" ", "")) < NGRAM_TOKEN_SIZE:
+        # 单个字符无法命中ngram分词,只做前缀匹配
+        return query.filter(student.name.like(f"{_escape_like(term)}%")), [student.name, student.student_id]
+
+    # 短语匹配: ngram分词下 "xyz" 要求所有相邻二元组连续出现,相当于子串匹配
+    score = match(student.name, against=f'"{term}"').in_boolean_mode()
+    order_by = [
+        # 姓名完全相同的排在最前,其次按全文相关度
+        case((student.name == term, 0), else_=1),
+        score.desc(),
+        student.student_id
+    ]
+    return query.filter(score), order_by
@@ -0,0 +1,128 @@
+"""
+表格文件读取模块
+以流式方式逐行读取xlsx/csv文件,并把中英文表头映射为模型字段名
+"""
+import csv
+import io
+from itertools import islice
+from typing import IO, Dict, Iterable, Iterator, List, Optional, Type
+
+from pydantic import BaseModel
+
+# 表头别名 -> 字段名 (与project/data下的Excel文件表头对应)
+COLUMN_ALIASES: Dict[str, str] = {
+    "学号": "student_id",
+    "名字": "name",
+    "姓名": "name",
+    "性别": "gender",
+    "国籍": "nationality",
+    "学院": "college",
+    "入学年份": "enrollment_year",
+    "邮箱": "email",
+    "密码": "password",
+    "宿舍id": "dorm_id",
+    "楼栋": "building_no",
+    "楼栋号": "building_no",
+    "楼层": "floor_no",
+    "楼层号": "floor_no",
+    "房间号": "room_no",
+    "性别类型": "gender_type",
+    "总床位数": "total_beds",
+    "已占用床位数": "occupied_beds",
+}
+
+
+def normalize_header(header) -> Optional[str]:
+    """将表头统一为字段名,空表头返回None"""
+    if header is None:
+        return None
+    text = str(header).strip()
+    if not text:
+        return None
+    return COLUMN_ALIASES.get(text.lower(), COLUMN_ALIASES.get(text, text.lower()))
+
+
+def _clean(value):
+    """统一单元格取值: 去除空白,整数值的浮点数转为整数,空串视为None"""
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    if isinstance(value, str):
+        value = value.strip()
+        if not value:
+            return None
+    return value
+
+
+def _iter_xlsx(fileobj: IO[bytes]) -> Iterator[list]:
+    try:
+        from openpyxl import load_workbook
+    except ImportError:
+        raise RuntimeError("读取xlsx文件需要安装openpyxl: pip install openpyxl")
+
+    # read_only模式按需解析工作表XML,内存占用与文件大小无关
+    workbook = load_workbook(fileobj, read_only=True, data_only=True)
+    try:
+        for row in workbook.active.iter_rows(values_only=True):
+            yield list(row)
+    finally:
+        workbook.close()
+
+
+def _iter_csv(fileobj: IO[bytes]) -> Iterator[list]:
+    text = io.TextIOWrapper(fileobj, encoding="utf-8-sig", newline="")
+    try:
+        yield from csv.reader(text)
+    finally:
+        text.detach()
+
+
+def iter_rows(fileobj: IO[bytes], filename: str) -> Iterator[Dict[str, object]]:
+    """
+    逐行读取表格文件,返回 {字段名: 值} 字典
+    根据文件扩展名选择xlsx或csv解析器,第一行视为表头,空行自动跳过
+    """
+    lower_name = filename.lower()
+    if lower_name.endswith((".xlsx", ".xlsm")):
+        raw_rows = _iter_xlsx(fileobj)
+    elif lower_name.endswith(".csv"):
+        raw_rows = _iter_csv(fileobj)
+    else:
+        raise ValueError(f"不支持的文件格式: {filename} (仅支持xlsx/csv)")
+
+    headers = None
+    for raw in raw_rows:
+        if headers is None:
+            headers = [normalize_header(cell) for cell in raw]
+            continue
+        record = {
+            header: _clean(value)
+            for header, value in zip(headers, raw)
+            if header is not None
+        }
+        if any(value is not None for value in record.values()):
+            yield record
+
+
+def iter_chunks(rows: Iterable[dict], size: int) -> Iterator[List[dict]]:
+    """将行迭代器切分为至多size行的块,每次只在内存中保留一块"""
+    iterator = iter(rows)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def coerce_strings(record: Dict[str, object], model: Type[BaseModel]) -> Dict[str, object]:
+    """
+    将模型中字符串字段的取值转为字符串
+    表格中的学号、房间号等常被读成数字,直接校验会失败
+    """
+    string_fields = {
+        name for name, field in model.model_fields.items()
+        if field.annotation in (str, Optional[str])
+    }
+    return {
+        key: str(value) if key in string_fields and value is not None and not isinstance(value, str) else value
+        for key, value in record.items()
+    }
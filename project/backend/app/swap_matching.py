@@ -0,0 +1,278 @@
+"""
+宿舍调换撮合模块
+把所有待处理的调换申请看作宿舍之间的有向边(学生当前宿舍 -> 目标宿舍),
+选出可以同时执行的最多申请,并分解为互换环和利用空床位的调换链:
+- 环: A->B->...->A,每间宿舍迁入迁出相等,满员宿舍之间也能互换
+- 链: 从某宿舍出发,沿申请依次腾出床位,最终落在有空床位的宿舍
+
+选择算法: 先接受全部申请,对 已占用 + 迁入 - 迁出 > 总床位 的宿舍撤销迁入边,
+优先撤销不会使来源宿舍超员的边,其次撤销最晚提交的申请,撤销引起的超员继续级联处理。
+结果一定可行且无法再加入任何一条被撤销的申请(极大解),但不保证是全局最优
+(最优解需要求解最小费用流)。整个过程与申请数成线性关系,数万条申请可在秒级完成。
+
+执行时把选中的申请交给dorm_changes.process_batch,在加锁后按最新床位数据重新校验并一次提交
+
+命令行用法(在backend目录下运行):
+    python -m app.swap_matching             # 只输出撮合方案
+    python -m app.swap_matching --apply --admin-id 1
+"""
+import argparse
+import time
+from collections import defaultdict, deque
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from . import models
+from .dorm_changes import process_batch
+
+
+@dataclass
+class Move:
+    request_id: int
+    student_id: str
+    from_dorm: Optional[int]
+    to_dorm: int
+
+
+@dataclass
+class _Capacity:
+    occupied_beds: int
+    total_beds: int
+
+
+def load_pending_moves(db: Session):
+    """
+    读取待处理申请及宿舍容量
+    以学生当前实际所住宿舍作为迁出宿舍;目标宿舍不存在或性别类型不符的申请不参与撮合
+    返回 (按提交时间排序的Move列表, {宿舍ID: 容量})
+    """
+    request = models.DormChangeRequest
+    student = models.Student
+    dorm = models.Dormitory
+
+    dorms = {}
+    genders = {}
+    for row in db.execute(select(dorm.dorm_id, dorm.gender_type, dorm.occupied_beds, dorm.total_beds)):
+        dorms[row.dorm_id] = _Capacity(row.occupied_beds, row.total_beds)
+        genders[row.dorm_id] = row.gender_type
+
+    rows = db.execute(
+        select(
+            request.request_id,
+            request.student_id,
+            student.dorm_id,
+            student.gender,
+            request.target_dorm_id
+        ).join(
+            student, request.student_id == student.student_id
+        ).where(
+            request.status == "pending"
+        ).order_by(request.created_at, request.request_id)
+    )
+
+    moves = []
+    seen_students = set()
+    for row in rows:
+        if row.student_id in seen_students or row.dorm_id == row.target_dorm_id:
+            continue
+        if genders.get(row.target_dorm_id) != row.gender:
+            continue
+        seen_students.add(row.student_id)
+        from_dorm = row.dorm_id if row.dorm_id in dorms else None
+        moves.append(Move(row.request_id, row.student_id, from_dorm, row.target_dorm_id))
+    return moves, dorms
+
+
+def select_moves(moves: List[Move], dorms: Dict[int, _Capacity]) -> List[Move]:
+    """从待处理申请中选出一组可以同时执行的申请(极大可行解)"""
+    net: Dict[int, int] = defaultdict(int)
+    incoming: Dict[int, List[int]] = defaultdict(list)
+    for index, move in enumerate(moves):
+        net[move.to_dorm] += 1
+        incoming[move.to_dorm].append(index)
+        if move.from_dorm is not None:
+            net[move.from_dorm] -= 1
+    active = [True] * len(moves)
+
+    def excess(dorm_id: int) -> int:
+        capacity = dorms[dorm_id]
+        return capacity.occupied_beds + net[dorm_id] - capacity.total_beds
+
+    def drop(index: int) -> None:
+        move = moves[index]
+        active[index] = False
+        net[move.to_dorm] -= 1
+        if move.from_dorm is not None:
+            net[move.from_dorm] += 1
+
+    queue = deque(dorm_id for dorm_id in list(net) if excess(dorm_id) > 0)
+    while queue:
+        dorm_id = queue.popleft()
+        edges = incoming[dorm_id]
+        # 第一轮: 从最晚的申请开始,撤销来源宿舍有余量的边(不会引起级联)
+        position = len(edges) - 1
+        while excess(dorm_id) > 0 and position >= 0:
+            index = edges[position]
+            source = moves[index].from_dorm
+            if active[index] and (source is None or excess(source) < 0):
+                drop(index)
+            position -= 1
+        # 第二轮: 仍超员时按提交时间从晚到早撤销,来源宿舍因此超员的加入队列
+        while excess(dorm_id) > 0 and edges:
+            index = edges.pop()
+            if not active[index]:
+                continue
+            drop(index)
+            source = moves[index].from_dorm
+            if source is not None and excess(source) > 0:
+                queue.append(source)
+
+    return [move for move, keep in zip(moves, active) if keep]
+
+
+def decompose(selected: List[Move]) -> Dict[str, List[List[Move]]]:
+    """
+    把选中的申请分解为调换链和互换环
+    链从迁出多于迁入的宿舍出发,沿未使用的边前进直到无路可走;剩余的边迁入迁出平衡,逐个拆成环
+    """
+    outgoing: Dict[Optional[int], List[Move]] = defaultdict(list)
+    balance: Dict[Optional[int], int] = defaultdict(int)
+    for move in selected:
+        outgoing[move.from_dorm].append(move)
+        balance[move.from_dorm] += 1
+        balance[move.to_dorm] -= 1
+
+    def walk(start: Optional[int]) -> List[Move]:
+        path = []
+        node = start
+        while outgoing.get(node):
+            move = outgoing[node].pop()
+            path.append(move)
+            node = move.to_dorm
+        return path
+
+    chains = []
+    # 未分配宿舍的学生(from_dorm为None)各自构成链的起点
+    for node in [None] + [dorm_id for dorm_id, value in balance.items() if dorm_id is not None and value > 0]:
+        count = len(outgoing.get(node, [])) if node is None else balance[node]
+        for _ in range(count):
+            path = walk(node)
+            if path:
+                chains.append(path)
+
+    cycles = []
+    for node in list(outgoing):
+        while outgoing[node]:
+            cycle = walk(node)
+            if cycle:
+                cycles.append(cycle)
+
+    return {"chains": chains, "cycles": cycles}
+
+
+def _format_group(moves: List[Move]) -> List[dict]:
+    return [
+        {
+            "request_id": move.request_id,
+            "student_id": move.student_id,
+            "from_dorm_id": move.from_dorm,
+            "to_dorm_id": move.to_dorm
+        }
+        for move in moves
+    ]
+
+
+def plan_matching(db: Session, group_limit: int = 100) -> dict:
+    """计算撮合方案(只读),group_limit限制返回的链和环的数量"""
+    started = time.perf_counter()
+    moves, dorms = load_pending_moves(db)
+    loaded = time.perf_counter()
+    selected = select_moves(moves, dorms)
+    groups = decompose(selected)
+    finished = time.perf_counter()
+
+    return {
+        "pending": len(moves),
+        "matched": len(selected),
+        "chain_count": len(groups["chains"]),
+        "cycle_count": len(groups["cycles"]),
+        "chains": [_format_group(chain) for chain in groups["chains"][:group_limit]],
+        "cycles": [_format_group(cycle) for cycle in groups["cycles"][:group_limit]],
+        "request_ids": [move.request_id for move in selected],
+        "timings": {
+            "load_seconds": round(loaded - started, 3),
+            "match_seconds": round(finished - loaded, 3)
+        }
+    }
+
+
+def apply_matching(db: Session, admin_id: int, admin_comment: Optional[str] = None) -> dict:
+    """
+    计算撮合方案并在一个事务内执行
+    process_batch在加锁后按最新数据重新校验容量,期间床位发生变化的申请会被跳过
+    """
+    plan = plan_matching(db, group_limit=0)
+    request_ids = plan.pop("request_ids")
+    if not request_ids:
+        return {**plan, "processed": 0, "failed": 0, "items": [], "apply_seconds": 0.0}
+
+    # 结束规划阶段的只读事务,执行阶段重新加锁读取最新数据
+    db.rollback()
+    report = process_batch(
+        db,
+        request_ids,
+        "approve",
+        admin_id=admin_id,
+        admin_comment=admin_comment or "调换撮合自动通过",
+        max_batch_size=None
+    )
+    failed_items = [item for item in report["items"] if item["status"] == "failed"]
+    return {
+        **plan,
+        "processed": report["processed"],
+        "failed": report["failed"],
+        "items": failed_items,
+        "apply_seconds": report["elapsed_seconds"]
+    }
+
+
+def main():
+    from .database import SessionLocal
+
+    parser = argparse.ArgumentParser(description="撮合待处理的宿舍调换申请(互换环和空床位调换链)")
+    parser.add_argument("--apply", action="store_true", help="执行撮合方案(默认只输出方案)")
+    parser.add_argument("--admin-id", type=int, help="执行时记录的管理员ID")
+    parser.add_argument("--show", type=int, default=10, help="输出的链和环数量")
+    args = parser.parse_args()
+    if args.apply and args.admin_id is None:
+        parser.error("--apply 需要提供 --admin-id")
+
+    db = SessionLocal()
+    try:
+        if args.apply:
+            report = apply_matching(db, admin_id=args.admin_id)
+        else:
+            report = plan_matching(db, group_limit=args.show)
+    finally:
+        db.close()
+
+    print(f"待处理申请 {report['pending']} 条, 可撮合 {report['matched']} 条 "
+          f"(调换链 {report['chain_count']} 条, 互换环 {report['cycle_count']} 个)")
+    print(f"读取耗时 {report['timings']['load_seconds']} 秒, 撮合耗时 {report['timings']['match_seconds']} 秒")
+    if args.apply:
+        print(f"✅ 已批准 {report['processed']} 条, 未通过 {report['failed']} 条, "
+              f"执行耗时 {report['apply_seconds']} 秒")
+        for item in report["items"][:args.show]:
+            print(f"  ❌ 申请 {item['request_id']}: {item['detail']}")
+        return
+    for label, groups in (("链", report["chains"]), ("环", report["cycles"])):
+        for group in groups:
+            path = " -> ".join(str(move["from_dorm_id"] or "未分配") for move in group)
+            print(f"  {label}: {path} -> {group[-1]['to_dorm_id']} ({len(group)} 人)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,359 @@
+"""
+后台任务队列
+把不影响响应内容的副作用(密码哈希升级、管理员最后登录时间、状态推送)移出请求路径:
+- TaskQueue: 固定数量的工作线程执行已注册的任务;队列有界,满时enqueue最多等待ENQUEUE_TIMEOUT秒,
+  仍然没有空位则在调用方线程中直接执行(背压: 请求变慢但不会无限积压)
+- 执行失败的任务按指数退避重试,超过max_retries次后记录为失败
+- durable=True的任务在入队时写入本地SQLite文件(TASK_QUEUE_DB),成功后删除;
+  进程退出或崩溃后未完成的任务在下次启动时重新入队。参数含敏感数据(如明文密码)的任务必须使用durable=False
+
+队列只在应用启动后运行;命令行脚本等未启动队列的场景中,任务在调用方线程中直接执行。
+任务可能被执行多次(重试、重启后恢复),处理函数应当可以重复执行
+
+配置(环境变量):
+    TASK_WORKERS=2  TASK_QUEUE_SIZE=1000  TASK_QUEUE_DB=tasks.sqlite3(默认为空,不持久化)
+"""
+import heapq
+import itertools
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, NamedTuple, Optional, Tuple
+
+from .metrics import Counter, Histogram, registry
+
+TASK_WORKERS = int(os.getenv("TASK_WORKERS", "2"))
+TASK_QUEUE_SIZE = int(os.getenv("TASK_QUEUE_SIZE", "1000"))
+TASK_QUEUE_DB = os.getenv("TASK_QUEUE_DB", "")
+# 队列满时入队的最长等待时间(秒)
+ENQUEUE_TIMEOUT = 0.05
+# 停止时等待队列清空的时间(秒)
+SHUTDOWN_TIMEOUT = 10.0
+
+TASK_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+logger = logging.getLogger("app.tasks")
+
+tasks_total = registry.register(Counter(
+    "tasks_total", "后台任务执行次数(result: success/retry/failed/inline)", ("task", "result")
+))
+task_duration = registry.register(Histogram(
+    "task_duration_seconds", "后台任务单次执行耗时", ("task",), TASK_BUCKETS
+))
+
+
+class TaskSpec(NamedTuple):
+    name: str
+    func: Callable[..., Any]
+    durable: bool
+    max_retries: int
+    retry_delay: float
+
+
+class _Job:
+    __slots__ = ("name", "kwargs", "attempts", "row_id")
+
+    def __init__(self, name: str, kwargs: Dict[str, Any], attempts: int = 0, row_id: Optional[int] = None):
+        self.name = name
+        self.kwargs = kwargs
+        self.attempts = attempts
+        self.row_id = row_id
+
+
+# ============================================================================
+# 持久化
+# ============================================================================
+
+class TaskStore:
+    """
+    持久任务的SQLite存储
+    pending: 等待执行或等待重试;failed: 重试用尽,保留供排查
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS tasks ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " name TEXT NOT NULL,"
+            " payload TEXT NOT NULL,"
+            " attempts INTEGER NOT NULL DEFAULT 0,"
+            " status TEXT NOT NULL DEFAULT 'pending',"
+            " last_error TEXT,"
+            " created_at REAL NOT NULL)"
+        )
+        self._lock = threading.Lock()
+
+    def add(self, name: str, kwargs: Dict[str, Any]) -> int:
+        payload = json.dumps(kwargs, ensure_ascii=False)
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT INTO tasks (name, payload, created_at) VALUES (?, ?, ?)",
+                (name, payload, time.time())
+            )
+            return cursor.lastrowid
+
+    def delete(self, row_id: int) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM tasks WHERE id = ?", (row_id,))
+
+    def record_failure(self, row_id: int, attempts: int, error: str, final: bool) -> None:
+        with self._lock:
+            self._conn.execute(
+                "UPDATE tasks SET attempts = ?, last_error = ?, status = ? WHERE id = ?",
+                (attempts, error[:1000], "failed" if final else "pending", row_id)
+            )
+
+    def pending(self) -> List[Tuple[int, str, Dict[str, Any], int]]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, name, payload, attempts FROM tasks WHERE status = 'pending' ORDER BY id"
+            ).fetchall()
+        return [(row_id, name, json.loads(payload), attempts) for row_id, name, payload, attempts in rows]
+
+    def counts(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._conn.execute("SELECT status, COUNT(*) FROM tasks GROUP BY status").fetchall())
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+# ============================================================================
+# 任务队列
+# ============================================================================
+
+class TaskQueue:
+    """有界的线程池任务队列"""
+
+    def __init__(self, workers: int = TASK_WORKERS, maxsize: int = TASK_QUEUE_SIZE, store_path: Optional[str] = TASK_QUEUE_DB):
+        self.workers = workers
+        self.maxsize = maxsize
+        self.store_path = store_path
+        self.store: Optional[TaskStore] = None
+        self._tasks: Dict[str, TaskSpec] = {}
+        self._ready: Deque[_Job] = deque()
+        # (到期时间, 序号, 任务): 等待重试的任务
+        self._delayed: List[Tuple[float, int, _Job]] = []
+        self._sequence = itertools.count()
+        self._active = 0
+        self._running = False
+        self._threads: List[threading.Thread] = []
+        self._cond = threading.Condition()
+
+    def task(self, name: str, durable: bool = True, max_retries: int = 3, retry_delay: float = 1.0):
+        """注册任务处理函数的装饰器;durable任务的参数必须可以JSON序列化"""
+        def decorator(func):
+            self._tasks[name] = TaskSpec(name, func, durable, max_retries, retry_delay)
+            return func
+        return decorator
+
+    # ------------------------------------------------------------------
+    # 入队
+    # ------------------------------------------------------------------
+
+    def enqueue(self, name: str, **kwargs) -> None:
+        spec = self._tasks.get(name)
+        if spec is None:
+            raise ValueError(f"未注册的后台任务: {name}")
+        job = _Job(name, kwargs)
+        if not self._running:
+            self._run_inline(job)
+            return
+        if spec.durable and self.store is not None:
+            job.row_id = self.store.add(name, kwargs)
+
+        with self._cond:
+            deadline = time.monotonic() + ENQUEUE_TIMEOUT
+            while self._running and self._size() >= self.maxsize:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            if self._running and self._size() < self.maxsize:
+                self._ready.append(job)
+                self._cond.notify_all()
+                return
+
+        # 队列已满(或正在停止): 在调用方线程执行
+        tasks_total.inc(name, "inline")
+        self._run_inline(job)
+
+    def _size(self) -> int:
+        return len(self._ready) + len(self._delayed) + self._active
+
+    def _run_inline(self, job: _Job) -> None:
+        """
+        在调用方线程执行,失败不影响调用方
+        队列运行中时失败的任务照常进入重试;队列未启动时只执行一次,失败只记录日志
+        """
+        if self._running:
+            self._execute(job)
+            return
+        spec = self._tasks[job.name]
+        job.attempts += 1
+        error = self._call(spec, job)
+        if job.row_id is not None and self.store is not None:
+            if error is None:
+                self.store.delete(job.row_id)
+            else:
+                # 留在存储中,下次启动时重试
+                self.store.record_failure(job.row_id, job.attempts, error, final=job.attempts > spec.max_retries)
+        if error is not None:
+            tasks_total.inc(job.name, "failed")
+            logger.error("后台任务 %s 执行失败: %s", job.name, error)
+
+    # ------------------------------------------------------------------
+    # 执行
+    # ------------------------------------------------------------------
+
+    def _call(self, spec: TaskSpec, job: _Job) -> Optional[str]:
+        """执行任务,成功返回None,失败返回错误描述"""
+        started = time.perf_counter()
+        try:
+            spec.func(**job.kwargs)
+        except Exception as e:
+            task_duration.observe(time.perf_counter() - started, spec.name)
+            return f"{type(e).__name__}: {e}"
+        task_duration.observe(time.perf_counter() - started, spec.name)
+        tasks_total.inc(spec.name, "success")
+        return None
+
+    def _execute(self, job: _Job) -> None:
+        spec = self._tasks.get(job.name)
+        if spec is None:
+            logger.error("丢弃未注册的后台任务: %s", job.name)
+            return
+        job.attempts += 1
+        error = self._call(spec, job)
+        if error is None:
+            if job.row_id is not None and self.store is not None:
+                self.store.delete(job.row_id)
+            return
+
+        final = job.attempts > spec.max_retries
+        if job.row_id is not None and self.store is not None:
+            self.store.record_failure(job.row_id, job.attempts, error, final=final)
+        if final:
+            tasks_total.inc(spec.name, "failed")
+            logger.error("后台任务 %s 重试%d次后仍然失败: %s", job.name, spec.max_retries, error)
+            return
+
+        tasks_total.inc(spec.name, "retry")
+        delay = spec.retry_delay * 2 ** (job.attempts - 1)
+        with self._cond:
+            heapq.heappush(self._delayed, (time.monotonic() + delay, next(self._sequence), job))
+            self._cond.notify_all()
+
+    def _next_job(self) -> Optional[_Job]:
+        """取出下一个可执行的任务;队列已停止且没有就绪任务时返回None"""
+        with self._cond:
+            while True:
+                if self._ready:
+                    job = self._ready.popleft()
+                    break
+                now = time.monotonic()
+                if self._delayed and self._delayed[0][0] <= now and self._running:
+                    job = heapq.heappop(self._delayed)[2]
+                    break
+                if not self._running:
+                    return None
+                self._cond.wait(self._delayed[0][0] - now if self._delayed else None)
+            self._active += 1
+            self._cond.notify_all()
+            return job
+
+    def _worker(self) -> None:
+        while True:
+            job = self._next_job()
+            if job is None:
+                return
+            try:
+                self._execute(job)
+            except Exception:
+                logger.exception("后台任务 %s 处理异常", job.name)
+            finally:
+                with self._cond:
+                    self._active -= 1
+                    self._cond.notify_all()
+
+    # ------------------------------------------------------------------
+    # 生命周期
+    # ------------------------------------------------------------------
+
+    def start(self) -> None:
+        """启动工作线程,并恢复持久化存储中未完成的任务"""
+        if self._running:
+            return
+        if self.store_path and self.store is None:
+            self.store = TaskStore(self.store_path)
+        self._running = True
+        if self.store is not None:
+            recovered = self.store.pending()
+            with self._cond:
+                for row_id, name, kwargs, attempts in recovered:
+                    self._ready.append(_Job(name, kwargs, attempts, row_id))
+            if recovered:
+                logger.info("恢复了 %d 个未完成的后台任务", len(recovered))
+        for index in range(self.workers):
+            thread = threading.Thread(target=self._worker, name=f"task-worker-{index}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout: float = SHUTDOWN_TIMEOUT) -> None:
+        """
+        停止接收新任务并等待就绪任务执行完
+        等待重试的任务: 持久任务留在存储中下次启动时执行,非持久任务被丢弃
+        """
+        if not self._running:
+            return
+        with self._cond:
+            self._running = False
+            dropped = sum(1 for _, _, job in self._delayed if job.row_id is None)
+            self._delayed.clear()
+            self._cond.notify_all()
+        deadline = time.monotonic() + timeout
+        for thread in self._threads:
+            thread.join(max(0.0, deadline - time.monotonic()))
+        self._threads.clear()
+        if dropped:
+            logger.warning("停止时丢弃了 %d 个等待重试的非持久任务", dropped)
+        if self.store is not None:
+            self.store.close()
+            self.store = None
+
+    def stats(self) -> dict:
+        with self._cond:
+            result = {
+                "running": self._running,
+                "ready": len(self._ready),
+                "delayed": len(self._delayed),
+                "active": self._active,
+                "capacity": self.maxsize
+            }
+        if self.store is not None:
+            result["stored"] = self.store.counts()
+        return result
+
+
+# 全局任务队列
+task_queue = TaskQueue()
+
+
+def _queue_metrics():
+    stats = task_queue.stats()
+    yield "# TYPE task_queue_depth gauge"
+    for state in ("ready", "delayed", "active"):
+        yield f'task_queue_depth{{state="{state}"}} {stats[state]}'
+
+
+registry.register_collector(_queue_metrics)
+
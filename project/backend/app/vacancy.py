@@ -0,0 +1,230 @@
+"""
+空床位索引模块
+按(性别, 楼栋)维护有空床位的宿舍ID集合,注册分配宿舍时O(1)选取候选房间,
+再用 SELECT ... FOR UPDATE SKIP LOCKED 锁定该行并复核空位
+
+索引只是进程内的提示信息: 被其他事务锁住或已住满的候选会被跳过(只有确认住满的才从索引移除),
+候选全部失败时回退到数据库查询,并用查询结果修正索引
+床位变化通过schedule_update登记,事务提交后才写入索引,回滚的事务不会改动索引
+"""
+import random
+import threading
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from . import models
+
+# 每次分配最多尝试的索引候选数,超过后回退到数据库查询
+MAX_CANDIDATE_ATTEMPTS = 5
+
+
+class _RoomSet:
+    """支持O(1)添加、删除和随机选取的宿舍ID集合"""
+
+    def __init__(self):
+        self._items: List[int] = []
+        self._positions: Dict[int, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def add(self, dorm_id: int) -> None:
+        if dorm_id not in self._positions:
+            self._positions[dorm_id] = len(self._items)
+            self._items.append(dorm_id)
+
+    def discard(self, dorm_id: int) -> None:
+        position = self._positions.pop(dorm_id, None)
+        if position is None:
+            return
+        last = self._items.pop()
+        if last != dorm_id:
+            self._items[position] = last
+            self._positions[last] = position
+
+    def sample(self, count: int) -> List[int]:
+        """从随机位置起取至多count个ID,分散并发注册对同一行的争用"""
+        size = len(self._items)
+        if size == 0:
+            return []
+        start = random.randrange(size)
+        return [self._items[(start + i) % size] for i in range(min(count, size))]
+
+
+class VacancyIndex:
+    """
+    空床位索引
+    结构: 性别 -> 楼栋 -> 有空床位的宿舍ID集合
+    """
+
+    def __init__(self):
+        self._rooms: Dict[str, Dict[str, _RoomSet]] = {}
+        self._dorm_keys: Dict[int, Tuple[str, str]] = {}
+        self._loaded = False
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self) -> bool:
+        return self._loaded
+
+    def load(self, db: Session) -> None:
+        """从宿舍表全量构建索引"""
+        rows = db.query(
+            models.Dormitory.dorm_id,
+            models.Dormitory.building_no,
+            models.Dormitory.gender_type
+        ).filter(
+            models.Dormitory.occupied_beds < models.Dormitory.total_beds
+        ).all()
+
+        rooms: Dict[str, Dict[str, _RoomSet]] = {}
+        dorm_keys: Dict[int, Tuple[str, str]] = {}
+        for dorm_id, building_no, gender_type in rows:
+            rooms.setdefault(gender_type, {}).setdefault(building_no, _RoomSet()).add(dorm_id)
+            dorm_keys[dorm_id] = (gender_type, building_no)
+
+        with self._lock:
+            self._rooms = rooms
+            self._dorm_keys = dorm_keys
+            self._loaded = True
+
+    def ensure_loaded(self, db: Session) -> None:
+        if not self._loaded:
+            self.load(db)
+
+    def update(self, dorm) -> None:
+        """根据宿舍当前床位数同步索引(dorm为宿舍实例或_DormState),一般通过schedule_update在提交后调用"""
+        if not self._loaded:
+            return
+        with self._lock:
+            key = (dorm.gender_type, dorm.building_no)
+            room_set = self._rooms.setdefault(key[0], {}).setdefault(key[1], _RoomSet())
+            if dorm.occupied_beds < dorm.total_beds:
+                room_set.add(dorm.dorm_id)
+                self._dorm_keys[dorm.dorm_id] = key
+            else:
+                room_set.discard(dorm.dorm_id)
+                self._dorm_keys.pop(dorm.dorm_id, None)
+
+    def discard(self, dorm_id: int) -> None:
+        with self._lock:
+            key = self._dorm_keys.pop(dorm_id, None)
+            if key:
+                self._rooms[key[0]][key[1]].discard(dorm_id)
+
+    def candidates(self, gender: str, building_no: Optional[str] = None, count: int = MAX_CANDIDATE_ATTEMPTS) -> List[int]:
+        """返回至多count个候选宿舍ID"""
+        with self._lock:
+            buildings = self._rooms.get(gender, {})
+            if building_no is not None:
+                room_sets = [buildings.get(building_no)] if building_no in buildings else []
+            else:
+                room_sets = [room_set for room_set in buildings.values() if len(room_set)]
+            if not room_sets:
+                return []
+            return random.choice(room_sets).sample(count)
+
+    def vacant_rooms(self, gender: str) -> Dict[str, int]:
+        """各楼栋有空床位的房间数"""
+        with self._lock:
+            return {
+                building_no: len(room_set)
+                for building_no, room_set in self._rooms.get(gender, {}).items()
+                if len(room_set)
+            }
+
+
+# 全局空床位索引
+vacancy_index = VacancyIndex()
+
+
+# ============================================================================
+# 提交后同步索引
+# ============================================================================
+
+class _DormState(NamedTuple):
+    dorm_id: int
+    gender_type: str
+    building_no: str
+    occupied_beds: int
+    total_beds: int
+
+
+_PENDING_KEY = "vacancy_updates"
+
+
+def schedule_update(db: Session, dorm) -> None:
+    """登记宿舍的当前床位数,会话提交后同步到索引,回滚时丢弃(同一宿舍以最后一次登记为准)"""
+    db.info.setdefault(_PENDING_KEY, {})[dorm.dorm_id] = _DormState(
+        dorm.dorm_id, dorm.gender_type, dorm.building_no, dorm.occupied_beds, dorm.total_beds
+    )
+
+
+@event.listens_for(Session, "after_commit")
+def _apply_pending_updates(session: Session) -> None:
+    for state in session.info.pop(_PENDING_KEY, {}).values():
+        vacancy_index.update(state)
+
+
+@event.listens_for(Session, "after_rollback")
+def _drop_pending_updates(session: Session) -> None:
+    session.info.pop(_PENDING_KEY, None)
+
+
+# ============================================================================
+# 分配
+# ============================================================================
+
+def _lock_vacant_dorm(db: Session, *conditions, skip_locked: bool = True) -> Optional[models.Dormitory]:
+    """锁定一间满足条件且有空位的宿舍;skip_locked为True时跳过已被其他事务锁定的行"""
+    return db.query(models.Dormitory).filter(
+        models.Dormitory.occupied_beds < models.Dormitory.total_beds,
+        *conditions
+    ).order_by(
+        models.Dormitory.dorm_id
+    ).with_for_update(skip_locked=skip_locked).first()
+
+
+def _is_full(db: Session, dorm_id: int, gender: str) -> bool:
+    """不加锁地确认宿舍已住满(或已不存在、性别不符),被锁住但仍有空位的宿舍返回False"""
+    row = db.query(
+        models.Dormitory.gender_type,
+        models.Dormitory.occupied_beds,
+        models.Dormitory.total_beds
+    ).filter(models.Dormitory.dorm_id == dorm_id).first()
+    return row is None or row.gender_type != gender or row.occupied_beds >= row.total_beds
+
+
+def reserve_dorm(db: Session, gender: str, building_no: Optional[str] = None) -> Optional[models.Dormitory]:
+    """
+    为指定性别选取并锁定一间有空床位的宿舍
+    返回的宿舍行已加行锁,调用方在同一事务内占用床位并提交
+    没有可用宿舍时返回None
+    """
+    vacancy_index.ensure_loaded(db)
+
+    for dorm_id in vacancy_index.candidates(gender, building_no):
+        dorm = _lock_vacant_dorm(
+            db,
+            models.Dormitory.dorm_id == dorm_id,
+            models.Dormitory.gender_type == gender
+        )
+        if dorm:
+            return dorm
+        # 只在确认住满时从索引移除;仅被其他事务锁住的宿舍保留在索引中
+        if _is_full(db, dorm_id, gender):
+            vacancy_index.discard(dorm_id)
+
+    # 索引候选全部失败,回退到数据库查询并修正索引
+    conditions = [models.Dormitory.gender_type == gender]
+    if building_no is not None:
+        conditions.append(models.Dormitory.building_no == building_no)
+    dorm = _lock_vacant_dorm(db, *conditions)
+    if dorm is None:
+        # 有空位的宿舍可能都被批量分配或导入暂时锁住: 等待行锁,而不是误报没有空位
+        dorm = _lock_vacant_dorm(db, *conditions, skip_locked=False)
+    if dorm:
+        schedule_update(db, dorm)
+    return dorm
@@ -0,0 +1,201 @@
+"""
+床位并发压测
+为同一性别的少量目标宿舍创建一批调换申请(包含目标宿舍之间的互相调换),
+用N个线程同时审批,统计吞吐量和延迟,并校验:
+- 没有宿舍超额分配(occupied_beds <= total_beds)
+- 每间宿舍床位数的变化等于实际迁入迁出的学生数
+- 入住汇总表与宿舍表一致
+- 没有死锁
+
+压测结束后恢复学生宿舍、床位数并删除创建的申请(--keep 保留)
+
+用法(在backend目录下运行,需要已导入数据的数据库):
+    python -m benchmarks.bench_bed_contention [--requests 100] [--workers 100] [--dorms 5]
+"""
+import argparse
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy import create_engine, delete, func, select, update
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+
+from app import models
+from app.beds import BedUnavailableError, reconcile_occupancy
+from app.database import DATABASE_URL
+from app.dorm_changes import decide_request
+
+MYSQL_DEADLOCK = 1213
+
+
+def _setup(db, request_count: int, dorm_count: int):
+    """选取目标宿舍和学生并创建待处理申请,返回 (管理员ID, 申请ID列表, 目标宿舍ID列表, {学生ID: 原宿舍ID})"""
+    dorm = models.Dormitory
+    student = models.Student
+    admin = db.scalar(select(models.Administrator.admin_id).limit(1))
+    if admin is None:
+        raise RuntimeError("数据库中缺少管理员,请先导入测试数据")
+
+    target_ids = list(db.scalars(
+        select(dorm.dorm_id)
+        .where(dorm.occupied_beds > 0, dorm.occupied_beds < dorm.total_beds, dorm.gender_type == "男")
+        .order_by(dorm.dorm_id)
+        .limit(dorm_count)
+    ))
+    if len(target_ids) < 2:
+        raise RuntimeError("可用的目标宿舍不足")
+
+    # 一半申请来自目标宿舍的住户(互相调换,制造反向加锁),一半来自其他宿舍
+    residents = db.execute(
+        select(student.student_id, student.dorm_id)
+        .where(student.dorm_id.in_(target_ids))
+        .limit(request_count // 2)
+    ).all()
+    others = db.execute(
+        select(student.student_id, student.dorm_id)
+        .where(student.gender == "男", student.dorm_id.isnot(None), student.dorm_id.notin_(target_ids))
+        .limit(request_count - len(residents))
+    ).all()
+
+    original = {}
+    requests = []
+    for row in list(residents) + list(others):
+        original[row.student_id] = row.dorm_id
+        target = random.choice([dorm_id for dorm_id in target_ids if dorm_id != row.dorm_id])
+        requests.append(models.DormChangeRequest(
+            student_id=row.student_id,
+            current_dorm_id=row.dorm_id,
+            target_dorm_id=target,
+            reason="床位并发压测"
+        ))
+    db.add_all(requests)
+    db.commit()
+    return admin, [request.request_id for request in requests], target_ids, original
+
+
+def _snapshot(db, dorm_ids):
+    """返回 {宿舍ID: (已占用床位, 总床位, 实际学生数)}"""
+    dorm = models.Dormitory
+    counts = dict(db.execute(
+        select(models.Student.dorm_id, func.count())
+        .where(models.Student.dorm_id.in_(dorm_ids))
+        .group_by(models.Student.dorm_id)
+    ).all())
+    return {
+        row.dorm_id: (row.occupied_beds, row.total_beds, counts.get(row.dorm_id, 0))
+        for row in db.execute(select(dorm.dorm_id, dorm.occupied_beds, dorm.total_beds).where(dorm.dorm_id.in_(dorm_ids)))
+    }
+
+
+def _verify(before, after) -> list:
+    problems = []
+    for dorm_id, (occupied, total, residents) in after.items():
+        old_occupied, _, old_residents = before[dorm_id]
+        if occupied > total:
+            problems.append(f"宿舍 {dorm_id} 超额分配: {occupied}/{total}")
+        if occupied - old_occupied != residents - old_residents:
+            problems.append(
+                f"宿舍 {dorm_id} 床位数变化 {occupied - old_occupied} 与学生数变化 {residents - old_residents} 不一致"
+            )
+    return problems
+
+
+def _restore(db, request_ids, original, before):
+    student_table = models.Student.__table__
+    dorm_table = models.Dormitory.__table__
+    for student_id, dorm_id in original.items():
+        db.execute(update(student_table).where(student_table.c.student_id == student_id).values(dorm_id=dorm_id))
+    for dorm_id, (occupied, _, _) in before.items():
+        db.execute(update(dorm_table).where(dorm_table.c.dorm_id == dorm_id).values(occupied_beds=occupied))
+    db.execute(delete(models.DormChangeRequest.__table__).where(
+        models.DormChangeRequest.__table__.c.request_id.in_(request_ids)
+    ))
+    db.commit()
+    reconcile_occupancy(db, repair=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="床位并发压测")
+    parser.add_argument("--requests", type=int, default=100, help="申请数")
+    parser.add_argument("--workers", type=int, default=100, help="并发线程数")
+    parser.add_argument("--dorms", type=int, default=5, help="目标宿舍数")
+    parser.add_argument("--keep", action="store_true", help="保留压测产生的数据")
+    args = parser.parse_args()
+
+    # 独立连接池,保证每个线程都能拿到连接
+    engine = create_engine(DATABASE_URL, pool_size=args.workers, max_overflow=0, pool_pre_ping=True)
+    Session = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+    db = Session()
+    admin_id, request_ids, target_ids, original = _setup(db, args.requests, args.dorms)
+    touched = sorted(set(target_ids) | set(original.values()))
+    before = _snapshot(db, touched)
+    if reconcile_occupancy(db, repair=False):
+        print("⚠️  压测前入住汇总表已不一致,汇总校验结果仅供参考")
+    db.close()
+
+    barrier = threading.Barrier(min(args.workers, len(request_ids)))
+    latencies = []
+
+    def approve(request_id):
+        session = Session()
+        try:
+            try:
+                barrier.wait(timeout=30)
+            except threading.BrokenBarrierError:
+                pass
+            started = time.perf_counter()
+            try:
+                decide_request(session, request_id, "approve", admin_id, "床位并发压测")
+                outcome = "approved"
+            except BedUnavailableError:
+                outcome = "full"
+            except ValueError:
+                outcome = "rejected"
+            except OperationalError as e:
+                outcome = "deadlock" if getattr(e.orig, "args", [None])[0] == MYSQL_DEADLOCK else "error"
+            latencies.append(time.perf_counter() - started)
+            return outcome
+        finally:
+            session.close()
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.workers) as pool:
+        outcomes = Counter(pool.map(approve, request_ids))
+    elapsed = time.perf_counter() - started
+
+    db = Session()
+    try:
+        after = _snapshot(db, touched)
+        problems = _verify(before, after)
+        mismatches = reconcile_occupancy(db, repair=False)
+        if mismatches:
+            problems.append(f"入住汇总表有 {len(mismatches)} 项与宿舍表不一致")
+        if outcomes["deadlock"] or outcomes["error"]:
+            problems.append(f"死锁 {outcomes['deadlock']} 次, 其他错误 {outcomes['error']} 次")
+        if not args.keep:
+            _restore(db, request_ids, original, before)
+    finally:
+        db.close()
+        engine.dispose()
+
+    latencies.sort()
+    print(f"申请 {len(request_ids)} 条, 线程 {args.workers}, 目标宿舍 {len(target_ids)} 间")
+    print(f"通过 {outcomes['approved']}, 已满 {outcomes['full']}, 其他拒绝 {outcomes['rejected']}, "
+          f"死锁 {outcomes['deadlock']}, 错误 {outcomes['error']}")
+    print(f"总耗时 {elapsed:.3f}s, 吞吐 {len(request_ids) / elapsed:.1f} 次/秒, "
+          f"延迟 p50 {latencies[len(latencies) // 2] * 1000:.1f}ms "
+          f"p99 {latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000:.1f}ms")
+    if problems:
+        for problem in problems:
+            print(f"❌ {problem}")
+        sys.exit(1)
+    print("✅ 无超额分配、床位计数与汇总表一致、无死锁")
+
+
+if __name__ == "__main__":
+    main()
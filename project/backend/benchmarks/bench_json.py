@@ -0,0 +1,149 @@
+"""
+列表接口序列化基准测试
+
+对比两种响应路径每秒可完成的请求数:
+  旧路径: ORM对象 -> jsonable_encoder -> JSONResponse
+  新路径: 按列查询的行字典 -> FastJSONResponse(orjson)
+
+用法(在backend目录下运行):
+    python -m benchmarks.bench_json                 # 进程内序列化对比,无需数据库
+    python -m benchmarks.bench_json --rows 200 --seconds 3
+    python -m benchmarks.bench_json --url http://localhost:8000/api/admin/students?limit=200 \\
+        --token <管理员JWT> --concurrency 8    # 对运行中的服务压测
+"""
+import argparse
+import random
+import threading
+import time
+import urllib.request
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from app import models
+from app.responses import FastJSONResponse, orjson
+
+
+def _make_students(count: int):
+    now = datetime.now()
+    return [
+        models.Student(
+            student_id=f"12{i:07d}",
+            password="$argon2id$v=19$m=65536,t=3,p=4$" + "x" * 60,
+            name=f"Student {i}",
+            gender=random.choice(["男", "女"]),
+            nationality="China",
+            college=random.choice(["SSE", "SME", "HSS", "LHS", "MED"]),
+            enrollment_year=2020 + i % 5,
+            email=f"12{i:07d}@link.cuhk.edu.cn",
+            dorm_id=i % 1350 + 1,
+            created_at=now,
+            updated_at=now
+        )
+        for i in range(count)
+    ]
+
+
+def _make_bills(count: int):
+    now = datetime.now()
+    return [
+        models.Bill(
+            bill_id=i,
+            dorm_id=i % 1350 + 1,
+            bill_type=random.choice(["electricity", "water", "accommodation"]),
+            amount=Decimal(random.randint(1000, 200000)) / 100,
+            billing_month="2024-09",
+            due_date=date.today() + timedelta(days=30),
+            status="unpaid",
+            paid_at=None,
+            created_at=now,
+            updated_at=now
+        )
+        for i in range(count)
+    ]
+
+
+def _as_rows(objects, model):
+    columns = [column.name for column in model.__table__.c]
+    return [{name: getattr(obj, name) for name in columns} for obj in objects]
+
+
+def _measure(func, seconds: float) -> float:
+    """在给定时间内反复调用func,返回每秒调用次数"""
+    calls = 0
+    deadline = time.perf_counter() + seconds
+    started = time.perf_counter()
+    while time.perf_counter() < deadline:
+        func()
+        calls += 1
+    return calls / (time.perf_counter() - started)
+
+
+def run_inprocess(rows: int, seconds: float) -> None:
+    print(f"序列化器: {'orjson' if orjson is not None else 'json (未安装orjson)'}")
+    for name, objects, model in (
+        ("students", _make_students(rows), models.Student),
+        ("bills", _make_bills(rows), models.Bill),
+    ):
+        row_dicts = _as_rows(objects, model)
+
+        def old_path():
+            JSONResponse(jsonable_encoder({"total": rows, "items": objects, "skip": 0, "limit": rows}))
+
+        def new_path():
+            FastJSONResponse({"total": rows, "items": row_dicts, "skip": 0, "limit": rows})
+
+        old_rps = _measure(old_path, seconds)
+        new_rps = _measure(new_path, seconds)
+        print(f"{name:10s} {rows}行/页  旧路径 {old_rps:8.1f} 次/秒  新路径 {new_rps:8.1f} 次/秒  "
+              f"提升 {new_rps / old_rps:5.1f}x")
+
+
+def run_http(url: str, token: str, seconds: float, concurrency: int) -> None:
+    headers = {"Authorization": f"Bearer {token}"} if token else {}
+    counts = [0] * concurrency
+    errors = [0] * concurrency
+    deadline = time.perf_counter() + seconds
+
+    def worker(index: int):
+        while time.perf_counter() < deadline:
+            request = urllib.request.Request(url, headers=headers)
+            try:
+                with urllib.request.urlopen(request) as response:
+                    response.read()
+                counts[index] += 1
+            except Exception:
+                errors[index] += 1
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    print(f"{url}")
+    print(f"并发 {concurrency}, 请求 {sum(counts)} 次, 失败 {sum(errors)} 次, "
+          f"{sum(counts) / elapsed:.1f} 次/秒")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="列表接口序列化基准测试")
+    parser.add_argument("--rows", type=int, default=200, help="每页行数")
+    parser.add_argument("--seconds", type=float, default=2.0, help="每项测试时长(秒)")
+    parser.add_argument("--url", help="对运行中的服务压测的接口地址")
+    parser.add_argument("--token", default="", help="访问接口使用的JWT")
+    parser.add_argument("--concurrency", type=int, default=4, help="HTTP压测并发数")
+    args = parser.parse_args()
+
+    if args.url:
+        run_http(args.url, args.token, args.seconds, args.concurrency)
+    else:
+        run_inprocess(args.rows, args.seconds)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""
+列投影基准测试
+对比完整ORM实体加载与按响应模型投影列两种方式的内存占用和耗时
+
+用法(在backend目录下运行,需要可访问的数据库):
+    python -m benchmarks.bench_projection [--limit 200] [--repeat 50]
+"""
+import argparse
+import time
+import tracemalloc
+
+from app import models, schemas
+from app.database import SessionLocal
+from app.projections import project
+from app.responses import rows_to_dicts
+
+
+def _measure(load, repeat: int):
+    """返回 (单次平均耗时毫秒, 单次峰值内存KB)"""
+    db = SessionLocal()
+    try:
+        load(db)  # 预热连接和编译缓存
+        db.expunge_all()
+
+        started = time.perf_counter()
+        for _ in range(repeat):
+            load(db)
+            db.expunge_all()
+        elapsed = (time.perf_counter() - started) / repeat * 1000
+
+        tracemalloc.start()
+        load(db)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        db.expunge_all()
+    finally:
+        db.close()
+    return elapsed, peak / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description="列投影基准测试")
+    parser.add_argument("--limit", type=int, default=200, help="每次读取行数")
+    parser.add_argument("--repeat", type=int, default=50, help="重复次数")
+    args = parser.parse_args()
+
+    cases = (
+        ("students", models.Student, schemas.StudentListItem),
+        ("dormitories", models.Dormitory, schemas.DormitoryInfo),
+        ("bills", models.Bill, schemas.BillInfo),
+    )
+    for name, model, schema in cases:
+        def full(db):
+            return db.query(model).limit(args.limit).all()
+
+        def projected(db):
+            return rows_to_dicts(project(db, schema, model).limit(args.limit).all())
+
+        full_ms, full_kb = _measure(full, args.repeat)
+        proj_ms, proj_kb = _measure(projected, args.repeat)
+        print(f"{name:12s} 完整实体 {full_ms:7.2f}ms {full_kb:8.1f}KB  "
+              f"列投影 {proj_ms:7.2f}ms {proj_kb:8.1f}KB  "
+              f"内存降低 {(1 - proj_kb / full_kb) * 100:5.1f}%")
+
+
+if __name__ == "__main__":
+    main()
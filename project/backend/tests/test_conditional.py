@@ -0,0 +1,83 @@
+"""
+条件请求中间件测试
+事件流票据只能用于订阅推送,不能从中间件取得学生已缓存的响应体或304
+
+不需要数据库(使用local缓存后端)
+"""
+import asyncio
+
+import pytest
+
+pytest.importorskip("fastapi")
+pytest.importorskip("jose")
+pytest.importorskip("sqlalchemy")
+
+from app import auth  # noqa: E402
+from app.conditional import ConditionalGetMiddleware  # noqa: E402
+
+STUDENT_ID = "120090001"
+PATH = "/api/students/bills"
+
+
+class _Endpoint:
+    """代替真实接口: 第一次返回学生数据,之后按认证失败处理"""
+
+    def __init__(self):
+        self.calls = 0
+
+    async def __call__(self, scope, receive, send):
+        self.calls += 1
+        status, body = (200, b'[{"bill_id":1}]') if self.calls == 1 else (401, b'{"detail":"invalid"}')
+        await send({"type": "http.response.start", "status": status, "headers": [(b"content-type", b"application/json")]})
+        await send({"type": "http.response.body", "body": body})
+
+
+def _get(app, token, if_none_match=None):
+    headers = [(b"authorization", f"Bearer {token}".encode())]
+    if if_none_match:
+        headers.append((b"if-none-match", if_none_match.encode()))
+    scope = {"type": "http", "method": "GET", "path": PATH, "query_string": b"", "headers": headers}
+    messages = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        messages.append(message)
+
+    asyncio.run(app(scope, receive, send))
+    start = messages[0]
+    return start["status"], dict(start["headers"]), b"".join(m.get("body", b"") for m in messages[1:])
+
+
+def test_event_ticket_gets_no_cached_response():
+    endpoint = _Endpoint()
+    app = ConditionalGetMiddleware(endpoint)
+    access_token = auth.create_access_token(data={"sub": STUDENT_ID, "user_type": "student"})
+    ticket = auth.create_event_ticket(STUDENT_ID)
+
+    status, headers, body = _get(app, access_token)
+    assert status == 200 and endpoint.calls == 1
+    etag = headers[b"etag"].decode()
+
+    # 票据既不能命中缓存的响应体,也不能得到304,请求必须交给接口认证
+    status, _, body = _get(app, ticket)
+    assert endpoint.calls == 2
+    assert status == 401 and b"bill_id" not in body
+
+    status, _, body = _get(app, ticket, if_none_match=etag)
+    assert endpoint.calls == 3
+    assert status == 401
+
+
+def test_access_token_still_served_from_cache():
+    endpoint = _Endpoint()
+    app = ConditionalGetMiddleware(endpoint)
+    access_token = auth.create_access_token(data={"sub": STUDENT_ID, "user_type": "student"})
+
+    _, headers, first = _get(app, access_token)
+    status, _, second = _get(app, access_token)
+    assert status == 200 and second == first and endpoint.calls == 1
+
+    status, _, _ = _get(app, access_token, if_none_match=headers[b"etag"].decode())
+    assert status == 304 and endpoint.calls == 1
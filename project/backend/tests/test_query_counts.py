@@ -0,0 +1,70 @@
+"""
+列表接口查询次数测试
+同一接口分别取1条和200条记录,执行的SQL条数必须相同,防止退化为N+1查询
+
+需要可访问的数据库(DATABASE_URL)且已导入示例数据(setup_database.py),否则跳过
+用法(在backend目录下运行):
+    python -m pytest tests
+"""
+import pytest
+
+pytest.importorskip("fastapi")
+pytest.importorskip("sqlalchemy")
+
+from fastapi.testclient import TestClient  # noqa: E402
+from sqlalchemy.exc import OperationalError  # noqa: E402
+
+from app import auth, models  # noqa: E402
+from app.cache import cache  # noqa: E402
+from app.database import SessionLocal  # noqa: E402
+from app.main import app  # noqa: E402
+from app.query_counter import assert_constant_queries, assert_max_queries  # noqa: E402
+
+PAGE_SIZES = (1, 200)
+
+LISTING_ENDPOINTS = (
+    "/api/admin/dorm-change",
+    "/api/admin/maintenance",
+    "/api/admin/students",
+    "/api/admin/dormitories",
+    "/api/admin/bills",
+)
+
+
+@pytest.fixture(scope="module")
+def admin_headers():
+    db = SessionLocal()
+    try:
+        admin = db.query(models.Administrator).first()
+    except OperationalError:
+        pytest.skip("数据库不可用")
+    finally:
+        db.close()
+    if admin is None:
+        pytest.skip("数据库中没有管理员账号")
+    token = auth.create_access_token(data={"sub": admin.username, "user_type": "admin"})
+    return {"Authorization": f"Bearer {token}"}
+
+
+@pytest.fixture(scope="module")
+def client():
+    # 不进入上下文,避免启动后台任务线程
+    return TestClient(app)
+
+
+@pytest.mark.parametrize("path", LISTING_ENDPOINTS)
+def test_listing_queries_do_not_grow_with_page_size(client, admin_headers, path):
+    def call(limit):
+        # 宿舍列表按筛选条件缓存,清空后每次都实际查询
+        cache.clear()
+        response = client.get(path, params={"limit": limit}, headers=admin_headers)
+        assert response.status_code == 200, response.text
+
+    assert_constant_queries(call, *PAGE_SIZES)
+
+
+def test_dorm_change_listing_query_count(client, admin_headers):
+    # 管理员认证1条 + 列表1条(当前宿舍和目标宿舍在同一条语句中连接)
+    with assert_max_queries(2):
+        response = client.get("/api/admin/dorm-change", params={"limit": 200}, headers=admin_headers)
+    assert response.status_code == 200, response.text
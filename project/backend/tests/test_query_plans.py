@@ -0,0 +1,35 @@
+"""
+执行计划测试
+调用各路由实际执行的查询并逐条EXPLAIN,出现对大表的全表扫描时失败(详细计划见 python -m app.query_plans -v)
+
+需要可访问的数据库(DATABASE_URL)且已导入示例数据(setup_database.py),否则跳过
+用法(在backend目录下运行):
+    python -m pytest tests
+"""
+import pytest
+
+pytest.importorskip("fastapi")
+pytest.importorskip("sqlalchemy")
+
+from sqlalchemy.exc import OperationalError  # noqa: E402
+
+from app.database import engine  # noqa: E402
+from app.query_plans import run_checks  # noqa: E402
+
+
+@pytest.fixture(scope="module", autouse=True)
+def database():
+    try:
+        with engine.connect():
+            pass
+    except OperationalError:
+        pytest.skip("数据库不可用")
+
+
+def test_routes_have_no_full_table_scans():
+    try:
+        problem_count = run_checks()
+    except RuntimeError as e:
+        # 缺少管理员或已分配宿舍的学生
+        pytest.skip(str(e))
+    assert problem_count == 0, f"{problem_count} 条查询存在全表扫描,执行计划见上方输出"
@@ -115,3 +115,13 @@ export function updateMaintenanceRequest(id, data) {
         data
     })
 }
+
+/**
+ * 获取事件流票据（短期有效，用于订阅状态推送）
+ */
+export function getEventTicket() {
+    return request({
+        url: '/students/events/ticket',
+        method: 'post'
+    })
+}
@@ -0,0 +1,84 @@
+import { getToken } from './auth'
+import { getEventTicket } from '@/api/student'
+
+// 重新连接的初始间隔和最大间隔(毫秒)
+const RETRY_MS = 5000
+const MAX_RETRY_MS = 60000
+
+/**
+ * 订阅学生状态变化推送(Server-Sent Events)
+ * types: 关心的事件类型(maintenance / dorm_change / bill)
+ * onChange(type, data): 收到事件时调用;type为resync时表示可能漏掉了事件,应重新拉取列表
+ * EventSource不能设置请求头,每次连接前先用访问令牌换取短期有效的票据放在查询参数中;
+ * 票据过期后浏览器的自动重连会失败,因此出错时关闭连接,换新票据并带上最后的事件ID重新连接
+ * 返回取消订阅的函数
+ */
+export function subscribeEvents(types, onChange) {
+    if (!getToken() || typeof EventSource === 'undefined') {
+        return () => {}
+    }
+
+    let source = null
+    let timer = null
+    let closed = false
+    let lastEventId = ''
+    let retryMs = RETRY_MS
+
+    const listener = (event) => {
+        if (event.lastEventId) {
+            lastEventId = event.lastEventId
+        }
+        onChange(event.type, event.data ? JSON.parse(event.data) : {})
+    }
+
+    const reconnect = () => {
+        if (!closed) {
+            timer = setTimeout(connect, retryMs)
+            retryMs = Math.min(retryMs * 2, MAX_RETRY_MS)
+        }
+    }
+
+    async function connect() {
+        timer = null
+        if (closed || !getToken()) {
+            return
+        }
+        let ticket
+        try {
+            ({ ticket } = await getEventTicket())
+        } catch (error) {
+            reconnect()
+            return
+        }
+        if (closed) {
+            return
+        }
+
+        const params = new URLSearchParams({ ticket })
+        if (lastEventId) {
+            params.set('last_event_id', lastEventId)
+        }
+        source = new EventSource(`/api/students/events?${params}`)
+        source.onopen = () => {
+            retryMs = RETRY_MS
+        }
+        source.onerror = () => {
+            source.close()
+            source = null
+            reconnect()
+        }
+        for (const type of [...types, 'resync']) {
+            source.addEventListener(type, listener)
+        }
+    }
+
+    connect()
+
+    return () => {
+        closed = true
+        clearTimeout(timer)
+        if (source) {
+            source.close()
+        }
+    }
+}
@@ -1,6 +1,11 @@
 import pymysql
+import os
 import sys
 import io
+import time
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 # 设置UTF-8编码
@@ -25,80 +30,354 @@ def get_password():
     password = getpass.getpass("请输入MySQL root密码: ")
     return password
 
-def execute_sql_file(connection, sql_file_path, db_name=None):
-    """执行SQL文件"""
-    with open(sql_file_path, 'r', encoding='utf-8') as f:
-        sql_content = f.read()
-    
-    # 分割SQL语句（按分号分割，但要处理存储过程等特殊情况）
-    statements = []
+# 合并后单条INSERT语句的最大字节数(需小于MySQL的max_allowed_packet)
+MAX_BATCH_BYTES = 4 * 1024 * 1024
+
+# 并行导入的工作线程数(每个线程独占一个数据库连接),设为1时顺序导入
+SEED_WORKERS = int(os.getenv("SEED_WORKERS", str(os.cpu_count() or 4)))
+# 并行导入时每个批次的最大字节数,较小的批次便于同一张表分块并行
+PARALLEL_BATCH_BYTES = 512 * 1024
+
+
+def iter_sql_statements(sql_file_path):
+    """
+    流式读取SQL文件,逐条返回语句
+    按行读取,不一次性载入整个文件
+    """
     current_statement = []
     in_delimiter = False
     
-    for line in sql_content.split('\n'):
-        line = line.strip()
-        
-        # 跳过注释和空行
-        if not line or line.startswith('--'):
-            continue
+    with open(sql_file_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
             
-        # 检查是否是DELIMITER语句
-        if line.upper().startswith('DELIMITER'):
-            in_delimiter = not in_delimiter
-            continue
-        
-        current_statement.append(line)
-        
-        # 检查语句结束
-        if not in_delimiter and line.endswith(';'):
-            statement = ' '.join(current_statement)
-            if statement.strip():
-                statements.append(statement)
-            current_statement = []
-    
-    # 添加最后一个语句（如果有）
+            # 跳过注释和空行
+            if not line or line.startswith('--'):
+                continue
+            
+            # 检查是否是DELIMITER语句
+            if line.upper().startswith('DELIMITER'):
+                in_delimiter = not in_delimiter
+                continue
+            
+            current_statement.append(line)
+            
+            # 检查语句结束
+            if not in_delimiter and line.endswith(';'):
+                statement = ' '.join(current_statement)
+                if statement.strip():
+                    yield statement
+                current_statement = []
+    
+    # 返回最后一个语句（如果有）
     if current_statement:
         statement = ' '.join(current_statement)
         if statement.strip():
-            statements.append(statement)
+            yield statement
+
+
+def split_insert(statement):
+    """
+    拆分 INSERT INTO t (...) VALUES (...), (...); 形式的语句
+    返回 (表名, 语句前缀, VALUES部分),其他语句返回None
+    """
+    upper = statement.upper()
+    if not upper.startswith('INSERT INTO '):
+        return None
+    values_pos = upper.find(' VALUES ')
+    if values_pos < 0:
+        return None
+    table = statement[len('INSERT INTO '):].split()[0].split('(')[0].strip('`')
+    prefix = statement[:values_pos + len(' VALUES ')]
+    values = statement[values_pos + len(' VALUES '):].rstrip().rstrip(';')
+    return table, prefix, values
+
+
+def count_rows(values):
+    """统计VALUES部分包含的行数(只计字符串字面量之外的顶层括号)"""
+    rows = 0
+    depth = 0
+    in_string = False
+    escaped = False
+    for ch in values:
+        if in_string:
+            if escaped:
+                escaped = False
+            elif ch == '\\':
+                escaped = True
+            elif ch == "'":
+                in_string = False
+        elif ch == "'":
+            in_string = True
+        elif ch == '(':
+            if depth == 0:
+                rows += 1
+            depth += 1
+        elif ch == ')':
+            depth -= 1
+    return rows
+
+
+def iter_load_batches(sql_file_path, max_bytes=MAX_BATCH_BYTES):
+    """
+    将SQL文件转换为执行批次
+    前缀相同的连续INSERT语句合并为一条多行VALUES语句(不超过max_bytes),
+    其他语句原样返回: ('sql', 语句) 或 ('insert', 表名, 语句, 行数, 原语句数)
+    """
+    pending = None  # [表名, 前缀, VALUES片段列表, 字节数, 行数, 原语句数]
+    
+    def flush():
+        table, prefix, parts, _, rows, statements = pending
+        return ('insert', table, prefix + ', '.join(parts) + ';', rows, statements)
+    
+    for statement in iter_sql_statements(sql_file_path):
+        parsed = split_insert(statement)
+        if parsed is None:
+            if pending:
+                yield flush()
+                pending = None
+            yield ('sql', statement)
+            continue
+        
+        table, prefix, values = parsed
+        if pending and (pending[1] != prefix or pending[3] + len(values) > max_bytes):
+            yield flush()
+            pending = None
+        if pending is None:
+            pending = [table, prefix, [], len(prefix), 0, 0]
+        pending[2].append(values)
+        pending[3] += len(values) + 2
+        pending[4] += count_rows(values)
+        pending[5] += 1
+    
+    if pending:
+        yield flush()
+
+
+def drop_secondary_indexes(cursor, table):
+    """
+    删除表上可以安全重建的二级索引,返回重建所需的索引定义
+    保留主键、唯一索引、非BTREE索引以及外键依赖的索引
+    """
+    cursor.execute("""
+        SELECT COLUMN_NAME FROM information_schema.KEY_COLUMN_USAGE
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND REFERENCED_TABLE_NAME IS NOT NULL
+    """, (table,))
+    fk_columns = {row['COLUMN_NAME'] for row in cursor.fetchall()}
+    
+    cursor.execute("""
+        SELECT INDEX_NAME, COLUMN_NAME, SUB_PART, COLLATION, NON_UNIQUE, INDEX_TYPE
+        FROM information_schema.STATISTICS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s
+        ORDER BY INDEX_NAME, SEQ_IN_INDEX
+    """, (table,))
+    
+    indexes = {}
+    for row in cursor.fetchall():
+        indexes.setdefault(row['INDEX_NAME'], []).append(row)
+    
+    dropped = []
+    for name, columns in indexes.items():
+        first = columns[0]
+        if (name == 'PRIMARY' or not first['NON_UNIQUE'] or first['INDEX_TYPE'] != 'BTREE'
+                or first['COLUMN_NAME'] in fk_columns):
+            continue
+        parts = []
+        for column in columns:
+            part = f"`{column['COLUMN_NAME']}`"
+            if column['SUB_PART']:
+                part += f"({column['SUB_PART']})"
+            if column['COLLATION'] == 'D':
+                part += ' DESC'
+            parts.append(part)
+        dropped.append(f"ADD INDEX `{name}` ({', '.join(parts)})")
     
-    # 执行SQL语句
+    if dropped:
+        names = [definition.split('`')[1] for definition in dropped]
+        cursor.execute(f"ALTER TABLE `{table}` " + ', '.join(f"DROP INDEX `{name}`" for name in names))
+    return dropped
+
+
+def rebuild_indexes(cursor, table, definitions):
+    """一条ALTER TABLE语句重建之前删除的全部二级索引"""
+    if definitions:
+        cursor.execute(f"ALTER TABLE `{table}` " + ', '.join(definitions))
+
+
+def execute_sql_file(connection, sql_file_path, db_name=None, defer_indexes=True):
+    """
+    执行SQL文件
+    流式解析文件,相同前缀的INSERT语句合并为大批量多行INSERT执行;
+    defer_indexes为True时在导入前删除目标表的二级索引,导入完成后统一重建
+    返回 (成功批次数, 失败批次数)
+    """
     with connection.cursor() as cursor:
         if db_name:
             cursor.execute(f"USE {db_name}")
         
+        # 导入期间跳过唯一性检查,由最终提交统一落盘
+        cursor.execute("SET unique_checks = 0")
+        
         success_count = 0
         error_count = 0
+        total_rows = 0
+        deferred_indexes = {}
+        start_time = time.perf_counter()
         
-        for i, statement in enumerate(statements, 1):
-            try:
-                # 跳过一些特殊语句
-                statement_upper = statement.upper().strip()
-                if (statement_upper.startswith('USE ') or 
-                    statement_upper.startswith('SET ') or
-                    statement_upper.startswith('DROP DATABASE')):
-                    cursor.execute(statement)
-                    success_count += 1
-                elif statement_upper.startswith('CREATE OR REPLACE VIEW'):
-                    # 处理视图创建
-                    cursor.execute(statement)
-                    success_count += 1
-                elif statement.strip():
-                    cursor.execute(statement)
+        try:
+            for i, batch in enumerate(iter_load_batches(sql_file_path), 1):
+                try:
+                    if batch[0] == 'insert':
+                        _, table, statement, rows, _ = batch
+                        if defer_indexes and table not in deferred_indexes:
+                            deferred_indexes[table] = drop_secondary_indexes(cursor, table)
+                        cursor.execute(statement)
+                        total_rows += rows
+                    else:
+                        cursor.execute(batch[1])
                     success_count += 1
                     
-                    # 每100条显示进度
-                    if success_count % 100 == 0:
-                        print(f"  已执行 {success_count} 条语句...")
+                    # 每10个批次显示进度
+                    if success_count % 10 == 0:
+                        elapsed = time.perf_counter() - start_time
+                        print(f"  已导入 {total_rows:,} 行 ({total_rows / elapsed:,.0f} 行/秒)...")
                         
-            except Exception as e:
-                error_count += 1
-                if error_count <= 5:  # 只显示前5个错误
-                    print(f"  ⚠️  语句 {i} 执行失败: {str(e)[:100]}")
+                except Exception as e:
+                    error_count += 1
+                    if error_count <= 5:  # 只显示前5个错误
+                        print(f"  ⚠️  批次 {i} 执行失败: {str(e)[:100]}")
+        finally:
+            # 重建导入前删除的二级索引
+            for table, definitions in deferred_indexes.items():
+                if definitions:
+                    print(f"  重建 {table} 的 {len(definitions)} 个二级索引...")
+                    rebuild_indexes(cursor, table, definitions)
+            cursor.execute("SET unique_checks = 1")
         
         connection.commit()
+        
+        elapsed = time.perf_counter() - start_time
+        if total_rows:
+            print(f"  共导入 {total_rows:,} 行,耗时 {elapsed:.2f} 秒 ({total_rows / elapsed:,.0f} 行/秒)")
         return success_count, error_count
 
+def load_data_parallel(sql_file_path, db_name, workers=SEED_WORKERS):
+    """
+    并行导入数据文件
+    主线程流式解析文件并按表分发INSERT批次,工作线程各自持有连接并发写入;
+    数据文件已关闭外键检查,各表之间互不依赖。
+    其他语句(如依赖已导入数据的INSERT ... SELECT)作为屏障,等待已分发批次完成后再执行。
+    导入结束后重建二级索引并核对每张表的行数
+    返回 (成功批次数, 失败批次数)
+    """
+    local = threading.local()
+    connections = []
+    connections_lock = threading.Lock()
+    
+    def get_worker_connection():
+        if not hasattr(local, 'connection'):
+            conn = pymysql.connect(**DB_CONFIG, database=db_name, autocommit=True)
+            with conn.cursor() as cursor:
+                cursor.execute("SET FOREIGN_KEY_CHECKS = 0")
+                cursor.execute("SET unique_checks = 0")
+            local.connection = conn
+            with connections_lock:
+                connections.append(conn)
+        return local.connection
+    
+    def insert_batch(statement):
+        with get_worker_connection().cursor() as cursor:
+            cursor.execute(statement)
+    
+    def rebuild_batch(table, definitions):
+        with get_worker_connection().cursor() as cursor:
+            rebuild_indexes(cursor, table, definitions)
+    
+    coordinator = pymysql.connect(**DB_CONFIG, database=db_name, autocommit=True)
+    expected_rows = Counter()
+    deferred_indexes = {}
+    success_count = 0
+    error_count = 0
+    start_time = time.perf_counter()
+    # 限制已分发但未完成的批次数,保证内存占用有界
+    in_flight = threading.BoundedSemaphore(workers * 2)
+    futures = []
+    
+    def collect(wait_all):
+        nonlocal success_count, error_count
+        remaining = []
+        for table, rows, future in futures:
+            if not wait_all and not future.done():
+                remaining.append((table, rows, future))
+                continue
+            try:
+                future.result()
+                success_count += 1
+            except Exception as e:
+                error_count += 1
+                expected_rows[table] -= rows
+                if error_count <= 5:  # 只显示前5个错误
+                    print(f"  ⚠️  {table} 批次执行失败: {str(e)[:100]}")
+        futures[:] = remaining
+    
+    try:
+        with coordinator.cursor() as cursor, ThreadPoolExecutor(max_workers=workers) as executor:
+            cursor.execute("SET FOREIGN_KEY_CHECKS = 0")
+            for batch in iter_load_batches(sql_file_path, max_bytes=PARALLEL_BATCH_BYTES):
+                if batch[0] == 'insert':
+                    _, table, statement, rows, _ = batch
+                    if table not in deferred_indexes:
+                        deferred_indexes[table] = drop_secondary_indexes(cursor, table)
+                    in_flight.acquire()
+                    future = executor.submit(insert_batch, statement)
+                    future.add_done_callback(lambda _: in_flight.release())
+                    futures.append((table, rows, future))
+                    expected_rows[table] += rows
+                    collect(wait_all=False)
+                    continue
+                
+                statement = batch[1]
+                if statement.upper().startswith('SET '):
+                    # 会话级设置已在每个工作连接上统一处理
+                    continue
+                collect(wait_all=True)
+                try:
+                    cursor.execute(statement)
+                    success_count += 1
+                except Exception as e:
+                    error_count += 1
+                    print(f"  ⚠️  语句执行失败: {str(e)[:100]}")
+            
+            collect(wait_all=True)
+            elapsed = time.perf_counter() - start_time
+            total_rows = sum(expected_rows.values())
+            print(f"  共导入 {total_rows:,} 行,耗时 {elapsed:.2f} 秒 ({total_rows / elapsed:,.0f} 行/秒, {workers} 个线程)")
+            
+            # 各表的二级索引同样并行重建
+            rebuild_futures = [
+                executor.submit(rebuild_batch, table, definitions)
+                for table, definitions in deferred_indexes.items()
+                if definitions
+            ]
+            for future in rebuild_futures:
+                future.result()
+            
+            # 核对行数
+            print("  行数核对:")
+            for table, expected in expected_rows.items():
+                cursor.execute(f"SELECT COUNT(*) AS count FROM `{table}`")
+                actual = cursor.fetchone()['count']
+                mark = "✅" if actual == expected else "❌"
+                if actual != expected:
+                    error_count += 1
+                print(f"    {mark} {table:30s}: 预期 {expected:>6,} 行, 实际 {actual:>6,} 行")
+    finally:
+        coordinator.close()
+        for conn in connections:
+            conn.close()
+    
+    return success_count, error_count
+
 try:
     print("\n步骤 1: 连接到MySQL服务器...")
     
@@ -154,7 +433,10 @@ try:
     if not insert_data_file.exists():
         print(f"❌ 文件不存在: {insert_data_file}")
     else:
-        success, errors = execute_sql_file(connection, insert_data_file, 'dormitory_management_system')
+        if SEED_WORKERS > 1:
+            success, errors = load_data_parallel(insert_data_file, 'dormitory_management_system', SEED_WORKERS)
+        else:
+            success, errors = execute_sql_file(connection, insert_data_file, 'dormitory_management_system')
         print(f"✅ 数据导入完成! (成功: {success}, 错误: {errors})")
     
     # 验证数据导入
@@ -168,7 +450,8 @@ try:
             'students',
             'dorm_change_requests',
             'maintenance_requests',
-            'bills'
+            'bills',
+            'dormitory_occupancy'
         ]
         
         print("\n数据统计:")
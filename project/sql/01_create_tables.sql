@@ -7,6 +7,7 @@
 -- ============================================================================
 
 -- 删除已存在的表（如果存在）
+DROP TABLE IF EXISTS dormitory_occupancy;
 DROP TABLE IF EXISTS bills;
 DROP TABLE IF EXISTS maintenance_requests;
 DROP TABLE IF EXISTS dorm_change_requests;
@@ -32,7 +33,8 @@ CREATE TABLE students (
     INDEX idx_gender (gender),
     INDEX idx_college (college),
     INDEX idx_enrollment_year (enrollment_year),
-    INDEX idx_dorm_id (dorm_id)
+    INDEX idx_dorm_id (dorm_id),
+    FULLTEXT INDEX ft_student_name (name) WITH PARSER ngram
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='学生信息表';
 
 -- ============================================================================
@@ -48,9 +50,9 @@ CREATE TABLE dormitories (
     occupied_beds INT NOT NULL DEFAULT 0 COMMENT '已占用床位数',
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP COMMENT '创建时间',
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP COMMENT '更新时间',
-    INDEX idx_building_no (building_no),
-    INDEX idx_gender_type (gender_type),
-    INDEX idx_room_no (room_no),
+    INDEX idx_building_gender (building_no, gender_type),
+    -- 注册分配: gender_type = ? AND occupied_beds < total_beds
+    INDEX idx_gender_occupancy (gender_type, occupied_beds, total_beds),
     CHECK (occupied_beds <= total_beds),
     CHECK (occupied_beds >= 0)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='宿舍信息表';
@@ -69,8 +71,10 @@ CREATE TABLE dorm_change_requests (
     admin_comment TEXT COMMENT '管理员备注',
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP COMMENT '申请时间',
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP COMMENT '更新时间',
-    INDEX idx_student_id (student_id),
-    INDEX idx_status (status),
+    -- 检查学生是否有待处理申请: student_id = ? AND status = 'pending'
+    INDEX idx_student_status (student_id, status),
+    -- 管理员按状态筛选并按申请时间排序
+    INDEX idx_status_created (status, created_at),
     INDEX idx_created_at (created_at),
     FOREIGN KEY (student_id) REFERENCES students(student_id) ON DELETE CASCADE,
     FOREIGN KEY (current_dorm_id) REFERENCES dormitories(dorm_id) ON DELETE CASCADE,
@@ -93,9 +97,11 @@ CREATE TABLE maintenance_requests (
     completed_at TIMESTAMP NULL COMMENT '完成时间',
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP COMMENT '申请时间',
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP COMMENT '更新时间',
-    INDEX idx_student_id (student_id),
+    -- 学生查看自己的维修记录(按时间倒序)
+    INDEX idx_student_created (student_id, created_at),
     INDEX idx_dorm_id (dorm_id),
-    INDEX idx_status (status),
+    -- 管理员按状态筛选并按申请时间排序
+    INDEX idx_status_created (status, created_at),
     INDEX idx_priority (priority),
     INDEX idx_created_at (created_at),
     FOREIGN KEY (student_id) REFERENCES students(student_id) ON DELETE CASCADE,
@@ -116,9 +122,11 @@ CREATE TABLE bills (
     paid_at TIMESTAMP NULL COMMENT '支付时间',
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP COMMENT '创建时间',
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP COMMENT '更新时间',
-    INDEX idx_dorm_id (dorm_id),
+    -- 每间宿舍每月每种类型只有一张账单;同时用于学生查看宿舍账单: dorm_id = ? ORDER BY billing_month
+    UNIQUE KEY uk_dorm_month_type (dorm_id, billing_month, bill_type),
     INDEX idx_billing_month (billing_month),
-    INDEX idx_status (status),
+    -- 管理员按状态筛选并按截止日期排序,逾期账单扫描
+    INDEX idx_status_due (status, due_date),
     INDEX idx_due_date (due_date),
     FOREIGN KEY (dorm_id) REFERENCES dormitories(dorm_id) ON DELETE CASCADE,
     CHECK (amount >= 0)
@@ -144,6 +152,22 @@ CREATE TABLE administrators (
     INDEX idx_is_active (is_active)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='管理员表';
 
+-- ============================================================================
+-- 7. 宿舍入住汇总表 (dormitory_occupancy)
+-- 按(楼栋, 性别)维护床位计数,与dormitories.occupied_beds在同一事务内增量更新
+-- ============================================================================
+CREATE TABLE dormitory_occupancy (
+    building_no VARCHAR(10) NOT NULL COMMENT '楼栋号',
+    gender_type ENUM('男', '女') NOT NULL COMMENT '性别类型',
+    total_rooms INT NOT NULL DEFAULT 0 COMMENT '总房间数',
+    total_beds INT NOT NULL DEFAULT 0 COMMENT '总床位数',
+    occupied_beds INT NOT NULL DEFAULT 0 COMMENT '已占用床位数',
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP COMMENT '更新时间',
+    PRIMARY KEY (building_no, gender_type),
+    CHECK (occupied_beds <= total_beds),
+    CHECK (occupied_beds >= 0)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='宿舍入住汇总表';
+
 -- ============================================================================
 -- 添加外键约束
 -- ============================================================================
@@ -163,20 +187,19 @@ ALTER TABLE maintenance_requests
     ON DELETE SET NULL;
 
 -- ============================================================================
--- 创建视图 - 宿舍使用情况统计
+-- 创建视图 - 宿舍使用情况统计 (读取入住汇总表,无需扫描dormitories)
 -- ============================================================================
 CREATE OR REPLACE VIEW v_dormitory_usage AS
 SELECT 
-    d.building_no AS '楼栋',
-    d.gender_type AS '性别',
-    COUNT(d.dorm_id) AS '总房间数',
-    SUM(d.total_beds) AS '总床位数',
-    SUM(d.occupied_beds) AS '已占用床位',
-    SUM(d.total_beds) - SUM(d.occupied_beds) AS '空余床位',
-    ROUND(SUM(d.occupied_beds) / SUM(d.total_beds) * 100, 2) AS '入住率(%)'
-FROM dormitories d
-GROUP BY d.building_no, d.gender_type
-ORDER BY d.building_no;
+    o.building_no AS '楼栋',
+    o.gender_type AS '性别',
+    o.total_rooms AS '总房间数',
+    o.total_beds AS '总床位数',
+    o.occupied_beds AS '已占用床位',
+    o.total_beds - o.occupied_beds AS '空余床位',
+    ROUND(o.occupied_beds / o.total_beds * 100, 2) AS '入住率(%)'
+FROM dormitory_occupancy o
+ORDER BY o.building_no;
 
 -- ============================================================================
 -- 创建视图 - 学生宿舍详情
@@ -9796,6 +9796,14 @@ INSERT INTO bills (dorm_id, bill_type, amount, billing_month, due_date, status)
     (1350, '水费', 38.49, '2024-11', '2024-12-01', 'paid');
 
 
+-- ============================================================================
+-- 6. 宿舍入住汇总 (由宿舍数据生成)
+-- ============================================================================
+INSERT INTO dormitory_occupancy (building_no, gender_type, total_rooms, total_beds, occupied_beds)
+SELECT building_no, gender_type, COUNT(*), SUM(total_beds), SUM(occupied_beds)
+FROM dormitories
+GROUP BY building_no, gender_type;
+
 SET FOREIGN_KEY_CHECKS = 1;
 
 -- ============================================================================
@@ -0,0 +1,172 @@
+-- ============================================================================
+-- 宿舍管理系统 - 已有数据库升级脚本
+-- 把按旧版 01_create_tables.sql 建立的数据库升级到当前结构,不删除任何数据
+-- 可重复执行: 已存在的表和索引会跳过,入住汇总表每次按宿舍表重新计算
+-- 用法: mysql -u root -p dormitory_management_system < 03_upgrade.sql
+-- ============================================================================
+
+-- ============================================================================
+-- 1. 宿舍入住汇总表 (dormitory_occupancy)
+-- ============================================================================
+CREATE TABLE IF NOT EXISTS dormitory_occupancy (
+    building_no VARCHAR(10) NOT NULL COMMENT '楼栋号',
+    gender_type ENUM('男', '女') NOT NULL COMMENT '性别类型',
+    total_rooms INT NOT NULL DEFAULT 0 COMMENT '总房间数',
+    total_beds INT NOT NULL DEFAULT 0 COMMENT '总床位数',
+    occupied_beds INT NOT NULL DEFAULT 0 COMMENT '已占用床位数',
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP COMMENT '更新时间',
+    PRIMARY KEY (building_no, gender_type),
+    CHECK (occupied_beds <= total_beds),
+    CHECK (occupied_beds >= 0)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='宿舍入住汇总表';
+
+-- 按宿舍表重新计算汇总(已有的行被覆盖,没有宿舍的楼栋/性别组合清零)
+UPDATE dormitory_occupancy SET total_rooms = 0, total_beds = 0, occupied_beds = 0;
+
+INSERT INTO dormitory_occupancy (building_no, gender_type, total_rooms, total_beds, occupied_beds)
+SELECT building_no, gender_type, COUNT(*), SUM(total_beds), SUM(occupied_beds)
+FROM dormitories
+GROUP BY building_no, gender_type
+ON DUPLICATE KEY UPDATE
+    total_rooms = VALUES(total_rooms),
+    total_beds = VALUES(total_beds),
+    occupied_beds = VALUES(occupied_beds);
+
+-- 视图改为读取汇总表
+CREATE OR REPLACE VIEW v_dormitory_usage AS
+SELECT 
+    o.building_no AS '楼栋',
+    o.gender_type AS '性别',
+    o.total_rooms AS '总房间数',
+    o.total_beds AS '总床位数',
+    o.occupied_beds AS '已占用床位',
+    o.total_beds - o.occupied_beds AS '空余床位',
+    ROUND(o.occupied_beds / o.total_beds * 100, 2) AS '入住率(%)'
+FROM dormitory_occupancy o
+ORDER BY o.building_no;
+
+-- ============================================================================
+-- 2. 索引 (先建新索引,再删除被取代的旧索引,外键始终有可用的索引)
+-- MySQL不支持 ADD INDEX IF NOT EXISTS,按information_schema判断后执行
+-- ============================================================================
+-- 学生姓名全文索引
+SET @ddl = IF((SELECT COUNT(*) FROM information_schema.statistics
+    WHERE table_schema = DATABASE() AND table_name = 'students' AND index_name = 'ft_student_name') = 0,
+    'ALTER TABLE students ADD FULLTEXT INDEX ft_student_name (name) WITH PARSER ngram', 'DO 0');
+PREPARE stmt FROM @ddl;
+EXECUTE stmt;
+DEALLOCATE PREPARE stmt;
+
+-- 宿舍
+SET @ddl = IF((SELECT COUNT(*) FROM information_schema.statistics
+    WHERE table_schema = DATABASE() AND table_name = 'dormitories' AND index_name = 'idx_building_gender') = 0,
+    'ALTER TABLE dormitories ADD INDEX idx_building_gender (building_no, gender_type)', 'DO 0');
+PREPARE stmt FROM @ddl;
+EXECUTE stmt;
+DEALLOCATE PREPARE stmt;
+SET @ddl = IF((SELECT COUNT(*) FROM information_schema.statistics
+    WHERE table_schema = DATABASE() AND table_name = 'dormitories' AND index_name = 'idx_gender_occupancy') = 0,
+    'ALTER TABLE dormitories ADD INDEX idx_gender_occupancy (gender_type, occupied_beds, total_beds)', 'DO 0');
+PREPARE stmt FROM @ddl;
+EXECUTE stmt;
+DEALLOCATE PREPARE stmt;
+SET @ddl = IF((SELECT COUNT(*) FROM information_schema.statistics
+    WHERE table_schema = DATABASE() AND table_name = 'dormitories' AND index_name = 'idx_building_no') > 0,
+    'ALTER TABLE dormitories DROP INDEX idx_building_no', 'DO 0');
+PREPARE stmt FROM @ddl;
+EXECUTE stmt;
+DEALLOCATE PREPARE stmt;
+SET @ddl = IF((SELECT COUNT(*) FROM information_schema.statistics
+    WHERE table_schema = DATABASE() AND table_name = 'dormitories' AND index_name = 'idx_gender_type') > 0,
+    'ALTER TABLE dormitories DROP INDEX idx_gender_type', 'DO 0');
+PREPARE stmt FROM @ddl;
+EXECUTE stmt;
+DEALLOCATE PREPARE stmt;
+SET @ddl = IF((SELECT COUNT(*) FROM information_schema.statistics
+    WHERE table_schema = DATABASE() AND table_name = 'dormitories' AND index_name = 'idx_room_no') > 0,
+    'ALTER TABLE dormitories DROP INDEX idx_room_no', 'DO 0');
+PREPARE stmt FROM @ddl;
+EXECUTE stmt;
+DEALLOCATE PREPARE stmt;
+
+-- 宿舍调换申请
+SET @ddl = IF((SELECT COUNT(*) FROM information_schema.statistics
+    WHERE table_schema = DATABASE() AND table_name = 'dorm_change_requests' AND index_name = 'idx_student_status') = 0,
+    'ALTER TABLE dorm_change_requests ADD INDEX idx_student_status (student_id, status)', 'DO 0');
+PREPARE stmt FROM @ddl;
+EXECUTE stmt;
+DEALLOCATE PREPARE stmt;
+SET @ddl = IF((SELECT COUNT(*) FROM information_schema.statistics
+    WHERE table_schema = DATABASE() AND table_name = 'dorm_change_requests' AND index_name = 'idx_status_created') = 0,
+    'ALTER TABLE dorm_change_requests ADD INDEX idx_status_created (status, created_at)', 'DO 0');
+PREPARE stmt FROM @ddl;
+EXECUTE stmt;
+DEALLOCATE PREPARE stmt;
+SET @ddl = IF((SELECT COUNT(*) FROM information_schema.statistics
+    WHERE table_schema = DATABASE() AND table_name = 'dorm_change_requests' AND index_name = 'idx_student_id') > 0,
+    'ALTER TABLE dorm_change_requests DROP INDEX idx_student_id', 'DO 0');
+PREPARE stmt FROM @ddl;
+EXECUTE stmt;
+DEALLOCATE PREPARE stmt;
+SET @ddl = IF((SELECT COUNT(*) FROM information_schema.statistics
+    WHERE table_schema = DATABASE() AND table_name = 'dorm_change_requests' AND index_name = 'idx_status') > 0,
+    'ALTER TABLE dorm_change_requests DROP INDEX idx_status', 'DO 0');
+PREPARE stmt FROM @ddl;
+EXECUTE stmt;
+DEALLOCATE PREPARE stmt;
+
+-- 维修申请
+SET @ddl = IF((SELECT COUNT(*) FROM information_schema.statistics
+    WHERE table_schema = DATABASE() AND table_name = 'maintenance_requests' AND index_name = 'idx_student_created') = 0,
+    'ALTER TABLE maintenance_requests ADD INDEX idx_student_created (student_id, created_at)', 'DO 0');
+PREPARE stmt FROM @ddl;
+EXECUTE stmt;
+DEALLOCATE PREPARE stmt;
+SET @ddl = IF((SELECT COUNT(*) FROM information_schema.statistics
+    WHERE table_schema = DATABASE() AND table_name = 'maintenance_requests' AND index_name = 'idx_status_created') = 0,
+    'ALTER TABLE maintenance_requests ADD INDEX idx_status_created (status, created_at)', 'DO 0');
+PREPARE stmt FROM @ddl;
+EXECUTE stmt;
+DEALLOCATE PREPARE stmt;
+SET @ddl = IF((SELECT COUNT(*) FROM information_schema.statistics
+    WHERE table_schema = DATABASE() AND table_name = 'maintenance_requests' AND index_name = 'idx_student_id') > 0,
+    'ALTER TABLE maintenance_requests DROP INDEX idx_student_id', 'DO 0');
+PREPARE stmt FROM @ddl;
+EXECUTE stmt;
+DEALLOCATE PREPARE stmt;
+SET @ddl = IF((SELECT COUNT(*) FROM information_schema.statistics
+    WHERE table_schema = DATABASE() AND table_name = 'maintenance_requests' AND index_name = 'idx_status') > 0,
+    'ALTER TABLE maintenance_requests DROP INDEX idx_status', 'DO 0');
+PREPARE stmt FROM @ddl;
+EXECUTE stmt;
+DEALLOCATE PREPARE stmt;
+
+-- 账单 (已有重复账单时唯一键创建失败,需先按 README 中的查询清理)
+SET @ddl = IF((SELECT COUNT(*) FROM information_schema.statistics
+    WHERE table_schema = DATABASE() AND table_name = 'bills' AND index_name = 'uk_dorm_month_type') = 0,
+    'ALTER TABLE bills ADD UNIQUE KEY uk_dorm_month_type (dorm_id, billing_month, bill_type)', 'DO 0');
+PREPARE stmt FROM @ddl;
+EXECUTE stmt;
+DEALLOCATE PREPARE stmt;
+SET @ddl = IF((SELECT COUNT(*) FROM information_schema.statistics
+    WHERE table_schema = DATABASE() AND table_name = 'bills' AND index_name = 'idx_status_due') = 0,
+    'ALTER TABLE bills ADD INDEX idx_status_due (status, due_date)', 'DO 0');
+PREPARE stmt FROM @ddl;
+EXECUTE stmt;
+DEALLOCATE PREPARE stmt;
+SET @ddl = IF((SELECT COUNT(*) FROM information_schema.statistics
+    WHERE table_schema = DATABASE() AND table_name = 'bills' AND index_name = 'idx_dorm_id') > 0,
+    'ALTER TABLE bills DROP INDEX idx_dorm_id', 'DO 0');
+PREPARE stmt FROM @ddl;
+EXECUTE stmt;
+DEALLOCATE PREPARE stmt;
+SET @ddl = IF((SELECT COUNT(*) FROM information_schema.statistics
+    WHERE table_schema = DATABASE() AND table_name = 'bills' AND index_name = 'idx_status') > 0,
+    'ALTER TABLE bills DROP INDEX idx_status', 'DO 0');
+PREPARE stmt FROM @ddl;
+EXECUTE stmt;
+DEALLOCATE PREPARE stmt;
+
+-- ============================================================================
+-- 升级完成
+-- ============================================================================